@@ -0,0 +1,314 @@
+"""
+Analytics Rollups
+Keeps per-user content counters and per-business daily series up to date as
+posts are inserted, updated and deleted, so the dashboard summary and charts
+never have to scan generated_content
+
+Backfill / repair the daily rollups:
+    python analytics_service.py backfill [days]
+"""
+import os
+import sys
+from datetime import date, datetime, timedelta
+from sqlalchemy import bindparam, event, func, inspect, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, object_session
+from models import db, BusinessProfile, GeneratedContent, UserContentStats, UserPlatformStats, ContentDailyStats
+
+# Media columns counted in the rollup -> stats column
+MEDIA_COLUMNS = {
+    'image_url': 'with_images',
+    'video_url': 'with_videos',
+    'audio_url': 'with_audio',
+}
+
+# Recorded when GeneratedContent.model is empty (it is part of the daily key)
+UNKNOWN_MODEL = 'unknown'
+
+# Largest range /analytics/timeseries will serve in one call
+MAX_TIMESERIES_DAYS = 366
+
+
+def _upsert_increments(connection, table, key_names, rows):
+    """
+    INSERT each row's deltas for a new key, or add them to the existing row.
+    One executemany statement for all rows.
+    """
+    dialect_insert = pg_insert if connection.dialect.name == 'postgresql' else sqlite_insert
+    stmt = dialect_insert(table)
+    delta_names = [name for name in rows[0] if name not in key_names]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key_names),
+        set_={name: table.c[name] + stmt.excluded[name] for name in delta_names}
+    )
+    connection.execute(stmt, rows)
+
+
+def _collect_content_delta(deltas, row, sign):
+    """Add (sign=+1) or remove (sign=-1) one post from the pending rollup deltas"""
+    platform = row['platform'] or 'Unknown'
+    media = {stats_column: sign if row[column] else 0 for column, stats_column in MEDIA_COLUMNS.items()}
+
+    def add(kind, key, values):
+        totals = deltas.setdefault(kind, {}).setdefault(key, {})
+        for name, value in values.items():
+            totals[name] = totals.get(name, 0) + value
+
+    add('user', row['business_id'], {'total_posts': sign, **media})
+    add('platform', (row['business_id'], platform), {'posts': sign})
+    if row['created_at']:
+        day_key = (row['business_id'], row['created_at'].date(), platform, row['model'] or UNKNOWN_MODEL)
+        add('daily', day_key, {'posts': sign, **media})
+
+
+def _apply_content_deltas(connection, deltas):
+    """Write the deltas collected during a flush: one owner lookup and one upsert per rollup table"""
+    business_ids = {business_id for business_id in deltas.get('user', {})}
+    owners = dict(connection.execute(
+        select(BusinessProfile.id, BusinessProfile.user_id).where(BusinessProfile.id.in_(business_ids))
+    ).all())
+
+    # Per-business deltas become per-user deltas
+    user_rows, platform_rows = {}, {}
+    for business_id, values in deltas.get('user', {}).items():
+        row = user_rows.setdefault(owners.get(business_id), {'user_id': owners.get(business_id)})
+        for name, value in values.items():
+            row[name] = row.get(name, 0) + value
+    for (business_id, platform), values in deltas.get('platform', {}).items():
+        key = (owners.get(business_id), platform)
+        row = platform_rows.setdefault(key, {'user_id': key[0], 'platform': platform, 'posts': 0})
+        row['posts'] += values['posts']
+    daily_rows = [
+        {'business_id': business_id, 'day': day, 'platform': platform, 'model': model, **values}
+        for (business_id, day, platform, model), values in deltas.get('daily', {}).items()
+    ]
+
+    def changed(rows, delta_names):
+        return [row for row in rows if any(row[name] for name in delta_names)]
+
+    media_names = list(MEDIA_COLUMNS.values())
+    user_rows = changed(user_rows.values(), ['total_posts'] + media_names)
+    platform_rows = changed(platform_rows.values(), ['posts'])
+    daily_rows = changed(daily_rows, ['posts'] + media_names)
+
+    if user_rows:
+        _upsert_increments(connection, UserContentStats.__table__, ['user_id'], user_rows)
+    if platform_rows:
+        _upsert_increments(connection, UserPlatformStats.__table__, ['user_id', 'platform'], platform_rows)
+    if daily_rows:
+        _upsert_increments(connection, ContentDailyStats.__table__,
+                           ['business_id', 'day', 'platform', 'model'], daily_rows)
+
+
+def remove_from_rollups(connection, rows):
+    """
+    Take posts that no longer exist as GeneratedContent rows (e.g. archived posts being
+    deleted) out of the rollups. rows are dicts with the ROLLUP_COLUMNS values.
+    """
+    deltas = {}
+    for row in rows:
+        _collect_content_delta(deltas, row, -1)
+    if deltas:
+        _apply_content_deltas(connection, deltas)
+
+
+# Columns whose values place a post in the rollups
+ROLLUP_COLUMNS = ['business_id', 'platform', 'model', 'created_at'] + list(MEDIA_COLUMNS)
+
+# session.info key for deltas collected during the current flush
+_PENDING_DELTAS = 'content_rollup_deltas'
+
+
+def _current_values(target):
+    return {name: getattr(target, name) for name in ROLLUP_COLUMNS}
+
+
+def _pending_deltas(target):
+    return object_session(target).info.setdefault(_PENDING_DELTAS, {})
+
+
+@event.listens_for(GeneratedContent, 'after_insert')
+def _content_inserted(mapper, connection, target):
+    _collect_content_delta(_pending_deltas(target), _current_values(target), 1)
+
+
+@event.listens_for(GeneratedContent, 'after_delete')
+def _content_deleted(mapper, connection, target):
+    _collect_content_delta(_pending_deltas(target), _current_values(target), -1)
+
+
+@event.listens_for(GeneratedContent, 'after_update')
+def _content_updated(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in ROLLUP_COLUMNS):
+        return
+
+    # Re-count the post: take out its old values, add the new ones
+    previous = {}
+    for name in ROLLUP_COLUMNS:
+        history = state.attrs[name].history
+        previous[name] = history.deleted[0] if history.deleted else getattr(target, name)
+
+    deltas = _pending_deltas(target)
+    _collect_content_delta(deltas, previous, -1)
+    _collect_content_delta(deltas, _current_values(target), 1)
+
+
+@event.listens_for(Session, 'after_flush')
+def _flush_content_deltas(session, flush_context):
+    # Bulk inserts/deletes cost a handful of statements per flush instead of several per post
+    deltas = session.info.pop(_PENDING_DELTAS, None)
+    if deltas:
+        _apply_content_deltas(session.connection(), deltas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_content_deltas(session):
+    session.info.pop(_PENDING_DELTAS, None)
+
+
+def rebuild_user_stats(connection):
+    """Recompute every rollup from generated_content (backfill / repair)"""
+    def has_media(column):
+        return f"SUM(CASE WHEN c.{column} IS NOT NULL AND c.{column} != '' THEN 1 ELSE 0 END)"
+
+    connection.execute(text('DELETE FROM user_content_stats'))
+    connection.execute(text('DELETE FROM user_platform_stats'))
+    connection.execute(text(f"""
+        INSERT INTO user_content_stats (user_id, total_posts, with_images, with_videos, with_audio)
+        SELECT b.user_id, COUNT(*), {has_media('image_url')}, {has_media('video_url')}, {has_media('audio_url')}
+        FROM generated_content c JOIN business_profile b ON b.id = c.business_id
+        GROUP BY b.user_id
+    """))
+    connection.execute(text("""
+        INSERT INTO user_platform_stats (user_id, platform, posts)
+        SELECT b.user_id, COALESCE(c.platform, 'Unknown'), COUNT(*)
+        FROM generated_content c JOIN business_profile b ON b.id = c.business_id
+        GROUP BY b.user_id, COALESCE(c.platform, 'Unknown')
+    """))
+
+
+def rebuild_daily_stats(connection, since=None):
+    """
+    Recompute daily rollups from generated_content, for every day >= since
+    (or all history when since is None). Safe to run while the app is live.
+    """
+    def has_media(column):
+        return f"SUM(CASE WHEN {column} IS NOT NULL AND {column} != '' THEN 1 ELSE 0 END)"
+
+    where = 'WHERE created_at IS NOT NULL'
+    params = {}
+    if since:
+        where += ' AND created_at >= :since'
+        params['since'] = datetime.combine(since, datetime.min.time())
+        connection.execute(
+            text('DELETE FROM content_daily_stats WHERE day >= :day').bindparams(bindparam('day', type_=db.Date)),
+            {'day': since}
+        )
+    else:
+        connection.execute(text('DELETE FROM content_daily_stats'))
+
+    model = f"COALESCE(NULLIF(model, ''), '{UNKNOWN_MODEL}')"
+    insert = text(f"""
+        INSERT INTO content_daily_stats (business_id, day, platform, model, posts, with_images, with_videos, with_audio)
+        SELECT business_id, date(created_at), COALESCE(platform, 'Unknown'), {model},
+               COUNT(*), {has_media('image_url')}, {has_media('video_url')}, {has_media('audio_url')}
+        FROM generated_content
+        {where}
+        GROUP BY business_id, date(created_at), COALESCE(platform, 'Unknown'), {model}
+    """)
+    if since:
+        insert = insert.bindparams(bindparam('since', type_=db.DateTime))
+    connection.execute(insert, params)
+
+
+def get_content_stats(user_id):
+    """Read a user's rollups: (totals dict, {platform: posts})"""
+    stats = db.session.get(UserContentStats, user_id)
+    totals = {
+        'total_posts': stats.total_posts if stats else 0,
+        'with_images': stats.with_images if stats else 0,
+        'with_videos': stats.with_videos if stats else 0,
+        'with_audio': stats.with_audio if stats else 0,
+    }
+    platforms = dict(
+        db.session.query(UserPlatformStats.platform, UserPlatformStats.posts)
+        .filter(UserPlatformStats.user_id == user_id, UserPlatformStats.posts > 0)
+        .all()
+    )
+    return totals, platforms
+
+
+def get_recent_posts(business_ids, days=7):
+    """
+    Posts created today and on the days-1 days before (server local time, like created_at),
+    summed from content_daily_stats - at most days x platforms x models rows per business
+    """
+    since = datetime.now().date() - timedelta(days=days - 1)
+    return db.session.query(func.coalesce(func.sum(ContentDailyStats.posts), 0)).filter(
+        ContentDailyStats.business_id.in_(business_ids),
+        ContentDailyStats.day >= since,
+    ).scalar()
+
+
+def get_timeseries(business_ids, start, end):
+    """
+    Daily posts, platform mix, model usage and media mix for [start, end],
+    read from content_daily_stats only. Days without posts are filled with zeros.
+    """
+    rows = db.session.query(
+        ContentDailyStats.day,
+        ContentDailyStats.platform,
+        ContentDailyStats.model,
+        func.sum(ContentDailyStats.posts),
+        func.sum(ContentDailyStats.with_images),
+        func.sum(ContentDailyStats.with_videos),
+        func.sum(ContentDailyStats.with_audio),
+    ).filter(
+        ContentDailyStats.business_id.in_(business_ids),
+        ContentDailyStats.day >= start,
+        ContentDailyStats.day <= end,
+    ).group_by(
+        ContentDailyStats.day, ContentDailyStats.platform, ContentDailyStats.model
+    ).all()
+
+    series = {}
+    day = start
+    while day <= end:
+        series[day] = {
+            'day': day.isoformat(),
+            'posts': 0,
+            'platforms': {},
+            'models': {},
+            'media': {'with_images': 0, 'with_videos': 0, 'with_audio': 0},
+        }
+        day += timedelta(days=1)
+
+    for day, platform, model, posts, images, videos, audio in rows:
+        if not posts:
+            continue
+        point = series[day]
+        point['posts'] += posts
+        point['platforms'][platform] = point['platforms'].get(platform, 0) + posts
+        point['models'][model] = point['models'].get(model, 0) + posts
+        point['media']['with_images'] += images
+        point['media']['with_videos'] += videos
+        point['media']['with_audio'] += audio
+
+    return list(series.values())
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('LEADER_ELECTION_AUTOSTART', 'false')  # one-off run: never lead
+    from app import app
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'backfill':
+        days = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        since = date.today() - timedelta(days=days) if days else None
+        with app.app_context():
+            with db.engine.begin() as conn:
+                rebuild_daily_stats(conn, since)
+        print(f"✅ Daily rollups rebuilt {'since ' + since.isoformat() if since else 'for all history'}")
+    else:
+        print("Usage: python analytics_service.py backfill [days]")
@@ -4,6 +4,17 @@ from flask_jwt_extended import JWTManager
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from models import db
+from db_config import configure_database, get_database_uri, report_database_config
+from write_queue import init_write_queue
+from db_metrics import init_db_metrics
+from dispatcher_service import init_dispatcher
+from scheduler_service import init_automation
+from metrics_service import init_metrics_sync
+from campaign_service import init_asset_renderer
+from peak_model_service import init_peak_models
+from outbox_service import init_outbox_sender
+from leader_service import init_leader_election
+from migrations import run_migrations, warn_if_pending
 from routes import api_bp
 from auth_v2 import auth_bp, bcrypt
 import os
@@ -55,12 +66,20 @@ def handle_404(e):
 
 # Configuration
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'automarketer.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+configure_database(app, get_database_uri(os.path.join(basedir, 'automarketer.db')))
 app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'AutoMarketer_Production_Secret_Key_2025!!')
 
 # Initialize DB
 db.init_app(app)
+init_write_queue(app)
+init_db_metrics(app)
+init_dispatcher(app)
+init_automation(app)
+init_metrics_sync(app)
+init_asset_renderer(app)
+init_peak_models(app)
+init_outbox_sender(app)
+init_leader_election(app)
 
 # Register Blueprints
 app.register_blueprint(api_bp, url_prefix='/api')
@@ -69,10 +88,14 @@ app.register_blueprint(auth_bp, url_prefix='/api/auth')
 jwt = JWTManager(app)
 bcrypt.init_app(app)
 
-# Initialize database tables (works with Gunicorn)
+# Schema changes are applied at deploy time (python migrations.py), not on import
 with app.app_context():
-    db.create_all()
+    report_database_config(db.engine)
+    warn_if_pending(db.engine)
 
 if __name__ == '__main__':
+    # Local development: bring the schema up to date before serving
+    with app.app_context():
+        run_migrations(db.engine)
     port = int(os.environ.get('PORT', 8000))
     app.run(debug=False, host='0.0.0.0', port=port)
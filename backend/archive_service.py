@@ -0,0 +1,182 @@
+"""
+Archive Tier
+Moves generated posts, campaigns and competitor reports older than N days out of
+their live tables into compressed blobs in archived_record, keeping the hot
+tables (and their indexes) small. Reads decompress transparently.
+Archived posts leave /content/sync tombstones, like deleted ones, but stay counted
+in the analytics rollups - they are still part of the business's history - until
+they are deleted from the archive.
+
+Run periodically (e.g. nightly cron):
+    python archive_service.py [days]
+"""
+import os
+import sys
+import json
+import zlib
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import delete, select
+from analytics_service import remove_from_rollups
+from models import db, GeneratedContent, Campaign, CompetitorData, ArchivedRecord, BusinessProfile, ContentTombstone
+
+load_dotenv()
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 365))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 500))
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 10
+
+# Live tables that can be archived
+ARCHIVABLE_MODELS = {
+    'generated_content': GeneratedContent,
+    'campaign': Campaign,
+    'competitor_data': CompetitorData,
+}
+# generated_content.created_at is server local time, the other tables are UTC
+LOCAL_TIME_TABLES = {'generated_content'}
+
+
+def compress_payload(data):
+    """JSON-encode and compress a row dict. Returns (codec, blob); zstd when installed."""
+    raw = json.dumps(data, separators=(',', ':'), default=_json_default).encode('utf-8')
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return 'zlib', zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decompress_payload(codec, blob):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read zstd-archived records')
+        raw = zstandard.ZstdDecompressor().decompress(blob)
+    elif codec == 'zlib':
+        raw = zlib.decompress(blob)
+    else:
+        raise ValueError(f'Unknown archive codec: {codec}')
+    return json.loads(raw)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Cannot archive value of type {type(value).__name__}')
+
+
+def archive_table(source_table, cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Archive rows of one table created before cutoff, one batch per transaction.
+    Uses Core DELETE so analytics rollups keep counting archived posts; archived posts
+    leave tombstones for /content/sync. Returns the number of rows archived.
+    """
+    table = ARCHIVABLE_MODELS[source_table].__table__
+    archived = 0
+    while True:
+        rows = db.session.execute(
+            select(table).where(table.c.created_at < cutoff).order_by(table.c.id).limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            break
+
+        records = []
+        for row in rows:
+            codec, payload = compress_payload(dict(row))
+            records.append({
+                'source_table': source_table,
+                'record_id': row['id'],
+                'business_id': row['business_id'],
+                'created_at': row['created_at'],
+                'archived_at': datetime.utcnow(),
+                'codec': codec,
+                'payload': payload,
+            })
+        db.session.execute(ArchivedRecord.__table__.insert(), records)
+        if source_table == 'generated_content':
+            _add_tombstones(rows)
+        db.session.execute(delete(table).where(table.c.id.in_([row['id'] for row in rows])))
+        db.session.commit()
+        archived += len(rows)
+
+    return archived
+
+
+def _add_tombstones(rows):
+    """Sync clients drop archived posts from their cache, like deleted ones"""
+    business_ids = {row['business_id'] for row in rows}
+    owners = dict(db.session.execute(
+        select(BusinessProfile.id, BusinessProfile.user_id).where(BusinessProfile.id.in_(business_ids))
+    ).all())
+    now = datetime.utcnow()
+    tombstones = [
+        {'content_id': row['id'], 'business_id': row['business_id'], 'user_id': owners[row['business_id']],
+         'deleted_at': now}
+        for row in rows if row['business_id'] in owners
+    ]
+    if tombstones:
+        db.session.execute(ContentTombstone.__table__.insert(), tombstones)
+
+
+def archive_old_records(days=ARCHIVE_AFTER_DAYS):
+    """Archive everything older than `days` from every archivable table"""
+    results = {}
+    for source_table in ARCHIVABLE_MODELS:
+        now = datetime.now() if source_table in LOCAL_TIME_TABLES else datetime.utcnow()
+        cutoff = now - timedelta(days=days)
+        results[source_table] = archive_table(source_table, cutoff)
+        print(f"🗜️ Archived {results[source_table]} {source_table} rows older than {cutoff:%Y-%m-%d}")
+    return results
+
+
+def load_archived(source_table, record_id):
+    """Decompressed row dict for an archived record, or None"""
+    record = ArchivedRecord.query.filter_by(source_table=source_table, record_id=record_id).first()
+    if not record:
+        return None
+    return unpack_record(record)
+
+
+def delete_archived_content(records):
+    """
+    Delete archived posts (ArchivedRecord rows) in the current transaction and take them
+    out of the analytics rollups. Their tombstones were left when they were archived.
+    """
+    if not records:
+        return
+    rows = []
+    for record in records:
+        row = unpack_record(record)
+        row['created_at'] = datetime.fromisoformat(row['created_at']) if row.get('created_at') else None
+        rows.append(row)
+    remove_from_rollups(db.session.connection(), rows)
+    db.session.execute(delete(ArchivedRecord).where(ArchivedRecord.id.in_([record.id for record in records])))
+
+
+def iter_archived(source_table, business_ids, batch_size=ARCHIVE_BATCH_SIZE):
+    """Yield decompressed row dicts for the given businesses, oldest first"""
+    query = ArchivedRecord.query.filter(
+        ArchivedRecord.source_table == source_table,
+        ArchivedRecord.business_id.in_(business_ids)
+    ).order_by(ArchivedRecord.created_at, ArchivedRecord.record_id)
+    for record in query.yield_per(batch_size):
+        yield unpack_record(record)
+
+
+def unpack_record(record):
+    """Decompress an ArchivedRecord into its original row dict"""
+    row = decompress_payload(record.codec, record.payload)
+    row['archived'] = True
+    return row
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('LEADER_ELECTION_AUTOSTART', 'false')  # one-off run: never lead
+    from app import app
+
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else ARCHIVE_AFTER_DAYS
+    with app.app_context():
+        archive_old_records(days)
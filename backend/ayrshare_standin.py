@@ -0,0 +1,220 @@
+"""
+Local Ayrshare Stand-in
+A small HTTP server that answers the Ayrshare calls the app makes (POST /api/post
+and POST /api/analytics/post) with deterministic data, so publishing and the
+engagement sync (metrics_service) can be exercised without an Ayrshare account.
+
+    python ayrshare_standin.py [port]     # serve; point AYRSHARE_BASE_URL at http://127.0.0.1:<port>/api
+    python ayrshare_standin.py check      # run the engagement sync against it on a throwaway SQLite database
+
+The check seeds published posts, then verifies the per-post fan-out of a batch
+(exactly one analytics call per Ayrshare post - the endpoint takes a single id -
+with at most METRICS_SYNC_CONCURRENCY in flight), that a rate-limited batch
+holds the cursor and the next run resumes from it, and that each batch stores
+its samples with a single bulk INSERT.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+import itertools
+import zlib
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+API_KEY = 'stand-in-key'
+
+
+class StandInState:
+    """Counters and fault injection shared by the handler threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.analytics_requests = 0
+        self.inflight = 0
+        self.max_inflight = 0
+        self.rate_limit_at = set()  # analytics request numbers answered with 429
+        self.ids = itertools.count(1)
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests = self.analytics_requests = self.max_inflight = 0
+
+
+def analytics_for(post_id, platform):
+    """Deterministic per-platform analytics in the shapes Ayrshare reports them"""
+    seed = zlib.crc32(f'{post_id}{platform}'.encode())
+    if platform == 'facebook':
+        return {'impressionsUnique': seed % 800, 'reactions': {'like': seed % 50, 'total': seed % 50 + 3},
+                'sharesCount': seed % 5, 'clicksUnique': seed % 11}
+    if platform == 'twitter':
+        return {'impressionCount': seed % 5000, 'likeCount': seed % 97, 'retweetCount': seed % 13,
+                'urlLinkClicks': seed % 31}
+    return {'impressionCount': seed % 3000, 'likeCount': seed % 61, 'shareCount': seed % 7, 'clickCount': seed % 19}
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if self.headers.get('Authorization') != f'Bearer {API_KEY}':
+                return self._send(403, {'status': 'error', 'code': 102, 'message': 'API Key not valid'})
+            with state.lock:
+                state.requests += 1
+                state.inflight += 1
+                state.max_inflight = max(state.max_inflight, state.inflight)
+            try:
+                time.sleep(0.005)  # Long enough for concurrent calls to overlap
+                if self.path.endswith('/analytics/post'):
+                    with state.lock:
+                        state.analytics_requests += 1
+                        number = state.analytics_requests
+                    if number in state.rate_limit_at:
+                        return self._send(429, {'status': 'error', 'message': 'Too many requests'}, {'Retry-After': '7'})
+                    if str(body.get('id')).startswith('gone'):
+                        return self._send(404, {'status': 'error', 'message': 'Post not found'})
+                    return self._send(200, {'status': 'success', 'id': body['id'], **{
+                        p: {'id': f"{p}-{body['id']}", 'analytics': analytics_for(body['id'], p)}
+                        for p in body.get('platforms', [])}})
+                if self.path.endswith('/api/post'):
+                    post_id = f'SI{next(state.ids)}'
+                    return self._send(200, {'status': 'success', 'id': post_id, 'postIds': [
+                        {'platform': p, 'id': f'{p}-{post_id}', 'postUrl': f'https://{p}.example/{post_id}',
+                         'status': 'success'} for p in body.get('platforms', [])]})
+                self._send(404, {'status': 'error', 'message': 'Unknown endpoint'})
+            finally:
+                with state.lock:
+                    state.inflight -= 1
+
+    return Handler
+
+
+def start_stand_in(port=0):
+    """Serve in a daemon thread. Returns (server, state, base URL for AYRSHARE_BASE_URL)."""
+    state = StandInState()
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    threading.Thread(target=server.serve_forever, name='ayrshare-stand-in', daemon=True).start()
+    return server, state, f'http://127.0.0.1:{server.server_port}/api'
+
+
+def run_check(posts=250, batch_size=40):
+    """Engagement sync against the stand-in on a temporary database. Returns True if every check passed."""
+    server, state, base_url = start_stand_in()
+    workdir = tempfile.mkdtemp(prefix='automarketer-standin-')
+    # Must be set before the app (and its engine) is imported
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'standin.db')
+    os.environ['AYRSHARE_API_KEY'] = API_KEY
+    os.environ['AYRSHARE_BASE_URL'] = base_url
+    os.environ['LEADER_ELECTION_AUTOSTART'] = 'false'  # no dispatcher or syncer running alongside the checks
+
+    from sqlalchemy import event, func
+    from app import app
+    from models import db, User, BusinessProfile, PublishedPost, PostMetric, MetricsSyncCursor
+    from migrations import run_migrations
+    import metrics_service
+
+    failures = []
+
+    def check(name, ok, detail=''):
+        print(f"   {'✓' if ok else '❌'} {name}{f' ({detail})' if detail else ''}")
+        if not ok:
+            failures.append(name)
+
+    metric_inserts = []
+
+    def _count_inserts(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('INSERT INTO POST_METRIC'):
+            metric_inserts.append(statement)
+
+    try:
+        with app.app_context():
+            run_migrations(db.engine)
+            now = datetime.utcnow()
+            with db.engine.begin() as conn:
+                conn.execute(User.__table__.insert(), [{'id': 1, 'username': 'standin', 'email': 'standin@example.com'}])
+                conn.execute(BusinessProfile.__table__.insert(), [{'id': 1, 'name': 'Stand-in', 'user_id': 1}])
+                # Two platforms of one Ayrshare post share an analytics call; every 50th post was deleted
+                rows = []
+                for i in range(1, posts + 1):
+                    provider_post_id = f'gone-{i}' if i % 50 == 0 else f'AYR{i}'
+                    for platform in (['twitter', 'linkedin'] if i % 3 else ['facebook']):
+                        rows.append({'business_id': 1, 'platform': platform, 'provider': 'ayrshare',
+                                     'provider_post_id': provider_post_id,
+                                     'published_at': now - timedelta(hours=i % 200)})
+                conn.execute(PublishedPost.__table__.insert(), rows)
+            total_rows = len(rows)
+            deleted_rows = sum(1 for row in rows if row['provider_post_id'].startswith('gone'))
+            event.listen(db.engine, 'before_cursor_execute', _count_inserts)
+            print(f"⏳ {posts} Ayrshare posts ({total_rows} published_post rows), batches of {batch_size}")
+
+            # Per-post fan-out: one call per Ayrshare post, bounded concurrency, one bulk INSERT
+            state.reset_counters()
+            first = metrics_service.sync_batch(batch_size=batch_size)
+            groups = len({row['provider_post_id'] for row in rows[:batch_size]})
+            check('batch reads batch_size rows', first['posts'] == batch_size, f"{first['posts']} rows")
+            check('one analytics call per Ayrshare post', state.analytics_requests == groups,
+                  f'{state.analytics_requests} calls for {groups} posts')
+            check('concurrency bounded', state.max_inflight <= metrics_service.METRICS_SYNC_CONCURRENCY,
+                  f'max {state.max_inflight} in flight')
+            check('samples stored with one bulk INSERT', first['measured'] and len(metric_inserts) == 1,
+                  f'{len(metric_inserts)} statement(s) for {first["measured"]} samples')
+
+            # Cursor resume: the 3rd call of the next batch is rate limited
+            state.rate_limit_at = {state.analytics_requests + 3}
+            before = db.session.get(MetricsSyncCursor, metrics_service.AYRSHARE_ACCOUNT).position
+            held = metrics_service.sync_batch(batch_size=batch_size)
+            position = db.session.get(MetricsSyncCursor, metrics_service.AYRSHARE_ACCOUNT).position
+            check('rate limit holds the cursor', not held['success'] and held['done'] and before <= position,
+                  f"cursor {before} -> {position}, retry_after={held['retry_after']}")
+            state.rate_limit_at = set()
+            batches = 0
+            while True:
+                result = metrics_service.sync_batch(batch_size=batch_size)
+                batches += 1
+                if result['done'] or batches > total_rows:
+                    break
+            db.session.expire_all()
+            cursor = db.session.get(MetricsSyncCursor, metrics_service.AYRSHARE_ACCOUNT)
+            measured = PublishedPost.query.filter(PublishedPost.metrics_updated_at.isnot(None)).count()
+            check('resumed run measures every post', measured == total_rows - deleted_rows,
+                  f'{measured} of {total_rows - deleted_rows} in {batches} more batch(es)')
+            per_post = db.session.query(func.count()).select_from(PostMetric) \
+                .group_by(PostMetric.published_post_id).all()
+            check('no post measured twice in a lap', all(count == 1 for count, in per_post),
+                  f'{len(per_post)} series')
+            check('cursor wrapped', cursor.position == 0 and cursor.laps == 1, f'laps={cursor.laps}')
+            check('nothing due right after a lap', metrics_service.sync_batch(batch_size=batch_size)['posts'] == 0)
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print('✅ All checks passed' if not failures else f"❌ {len(failures)} check(s) failed: {', '.join(failures)}")
+    return not failures
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'check':
+        sys.exit(0 if run_check() else 1)
+    server, state, base_url = start_stand_in(int(sys.argv[1]) if len(sys.argv) > 1 else 8765)
+    print(f"🧪 Ayrshare stand-in on {base_url} (AYRSHARE_API_KEY={API_KEY}) - Ctrl+C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,386 @@
+"""
+Scale Benchmark for the DB-backed Endpoints
+Generates synthetic users, businesses, products and posts into a throwaway
+database, then drives every DB-backed route - reads first, then writes - through
+the Flask test client and reports latency (p50/p95/max), SQL query count per
+request and peak Python memory. Results are written as JSON so schema and index
+changes can be compared run to run. Publishing goes to a local Ayrshare stand-in
+(ayrshare_standin.py), so the publish and scheduling routes run their full path -
+key checks, outbox and provider round trip - without posting anything. AI and
+background workers are switched off.
+
+    python benchmark.py                                   # 200 users, 1k businesses, 100k posts
+    python benchmark.py --users 2000 --businesses 10000 --posts 1000000
+    python benchmark.py --output after.json --compare before.json
+    python benchmark.py --database-url postgresql://localhost/automarketer_bench
+
+The default database is a temporary SQLite file. A --database-url must point at
+an empty, disposable database.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+PLATFORMS = ['Instagram', 'LinkedIn', 'Twitter', 'Facebook', 'TikTok']
+MODELS = ['gemini', 'groq', 'huggingface', None]
+INDUSTRIES = ['retail', 'food', 'tech', 'fitness', 'education']
+WORDS = ('launch sale summer coffee fitness offer weekend festival healthy deal new '
+         'collection discount organic local premium style fresh community').split()
+
+INSERT_CHUNK = 10000
+IMPORT_ROWS = 200
+PLAN_POSTS = 10
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='AutoMarketer DB scale benchmark')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--businesses', type=int, default=1000)
+    parser.add_argument('--products', type=int, default=5, help='products per business')
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=730, help='spread posts over this many days')
+    parser.add_argument('--archive-days', type=int, default=0,
+                        help='archive posts older than this many days before measuring (0 = off)')
+    parser.add_argument('--repeat', type=int, default=20, help='requests per route')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database-url', help='empty, disposable database (default: temporary SQLite file)')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--compare', help='earlier results JSON to diff against')
+    return parser.parse_args()
+
+
+def _insert_chunks(conn, table, rows):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        conn.execute(table.insert(), rows[start:start + INSERT_CHUNK])
+
+
+def generate_data(args, rng):
+    """Bulk-load synthetic data with Core inserts, then rebuild the derived tables once"""
+    from sqlalchemy import text
+    from models import db, User, BusinessProfile, Product, GeneratedContent
+    from analytics_service import rebuild_user_stats, rebuild_daily_stats
+
+    started = time.perf_counter()
+    now = datetime.now()
+    with db.engine.begin() as conn:
+        _insert_chunks(conn, User.__table__, [{
+            'id': i, 'username': f'bench_user_{i}', 'email': f'bench_user_{i}@example.com',
+            'created_at': now, 'updated_at': now
+        } for i in range(1, args.users + 1)])
+
+        # Skewed ownership: a few agency accounts own many businesses
+        owners = [min(args.users, int(rng.paretovariate(1.2))) for _ in range(args.businesses)]
+        _insert_chunks(conn, BusinessProfile.__table__, [{
+            'id': i, 'name': f'Business {i}', 'industry': rng.choice(INDUSTRIES),
+            'description': 'Synthetic benchmark business', 'target_audience': 'Everyone',
+            'user_id': owners[i - 1] if i > args.users else i
+        } for i in range(1, args.businesses + 1)])
+
+        _insert_chunks(conn, Product.__table__, [{
+            'name': f'Product {i}', 'price': round(rng.uniform(1, 500), 2),
+            'description': 'Synthetic product', 'business_id': rng.randint(1, args.businesses)
+        } for i in range(args.businesses * args.products)])
+
+        for start in range(0, args.posts, INSERT_CHUNK):
+            rows = []
+            for _ in range(min(INSERT_CHUNK, args.posts - start)):
+                created_at = now - timedelta(seconds=rng.randint(0, args.days * 86400))
+                rows.append({
+                    'platform': rng.choice(PLATFORMS),
+                    'content': ' '.join(rng.choices(WORDS, k=40)),
+                    'image_url': 'https://example.com/image.png' if rng.random() < 0.5 else None,
+                    'video_url': 'https://example.com/video.mp4' if rng.random() < 0.1 else None,
+                    'model': rng.choice(MODELS),
+                    'created_at': created_at,
+                    'updated_at': created_at,
+                    'business_id': rng.randint(1, args.businesses),
+                })
+            conn.execute(GeneratedContent.__table__.insert(), rows)
+            print(f"   … {start + len(rows):,} / {args.posts:,} posts")
+
+        rebuild_user_stats(conn)
+        rebuild_daily_stats(conn)
+        if conn.dialect.name == 'postgresql':
+            # Core inserts bypass the ORM sequences' knowledge of the explicit ids
+            for table in ('user', 'business_profile'):
+                conn.execute(text(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                                  f"(SELECT MAX(id) FROM \"{table}\"))"))
+        conn.execute(text('ANALYZE'))
+
+    if args.archive_days:
+        from archive_service import archive_old_records
+        archive_old_records(args.archive_days)
+
+    print(f"✅ Generated data in {time.perf_counter() - started:.1f}s")
+
+
+def build_routes(args, rng, tokens, ownership):
+    """Route name -> callable(client) issuing one request against random data"""
+    users = list(ownership)
+
+    def pick():
+        user_id = rng.choice(users)
+        return user_id, {'Authorization': f'Bearer {tokens[user_id]}'}
+
+    def pick_business():
+        user_id, headers = pick()
+        return rng.choice(ownership[user_id]), headers
+
+    def other_business():
+        # Ownership check failure path: a business owned by someone else
+        user_id, headers = pick()
+        business_id = rng.randint(1, args.businesses)
+        while business_id in ownership[user_id] and len(ownership[user_id]) < args.businesses:
+            business_id = rng.randint(1, args.businesses)
+        return business_id, headers
+
+    # Two-step routes: (untimed setup -> args, timed request)
+    def first_page(client):
+        _, headers = pick()
+        first = client.get('/api/content?limit=50', headers=headers).get_json()
+        return first.get('next_cursor') or '', headers
+
+    def latest_post(client):
+        _, headers = pick()
+        items = client.get('/api/content?limit=1&fields=id', headers=headers).get_json()['items']
+        return items[0]['id'] if items else 0, headers
+
+    def export(client):
+        business_id, headers = pick_business()
+        response = client.get(f'/api/business/{business_id}/export?type=content', headers=headers)
+        response.get_data()  # drain the stream
+        return response
+
+    today = datetime.now().date()
+    return {
+        'GET /profile': lambda c: c.get('/api/profile', headers=pick()[1]),
+        'GET /businesses': lambda c: c.get('/api/businesses', headers=pick()[1]),
+        'GET /business/<id>': lambda c: (lambda b, h: c.get(f'/api/business/{b}', headers=h))(*pick_business()),
+        'GET /business/<id> (403)': lambda c: (lambda b, h: c.get(f'/api/business/{b}', headers=h))(*other_business()),
+        'GET /business/<id>/products': lambda c: (lambda b, h: c.get(f'/api/business/{b}/products', headers=h))(*pick_business()),
+        'GET /content (legacy full list)': lambda c: c.get('/api/content', headers=pick()[1]),
+        'GET /content?limit=50': lambda c: c.get('/api/content?limit=50', headers=pick()[1]),
+        'GET /content?limit=50 (page 2)': (
+            first_page, lambda c, cursor, h: c.get(f'/api/content?limit=50&cursor={cursor}', headers=h)),
+        'GET /content?fields=id,platform,preview': lambda c: c.get('/api/content?limit=50&fields=id,platform,preview',
+                                                                  headers=pick()[1]),
+        'GET /content/<id>': (latest_post, lambda c, content_id, h: c.get(f'/api/content/{content_id}', headers=h)),
+        'GET /content/sync': lambda c: c.get('/api/content/sync', headers=pick()[1]),
+        'GET /content/search': lambda c: c.get(f'/api/content/search?q={rng.choice(WORDS)}', headers=pick()[1]),
+        'GET /content/archive': lambda c: c.get('/api/content/archive?limit=50', headers=pick()[1]),
+        'GET /analytics/summary': lambda c: c.get('/api/analytics/summary', headers=pick()[1]),
+        'GET /analytics/timeseries': lambda c: c.get(
+            f'/api/analytics/timeseries?from={today - timedelta(days=90)}&to={today}', headers=pick()[1]),
+        # Query counts only cover the request itself - rows streamed after the headers are not counted
+        'GET /business/<id>/export': export,
+        **build_write_routes(args, rng, pick, pick_business, latest_post),
+    }
+
+
+def build_write_routes(args, rng, pick, pick_business, latest_post):
+    """Write routes, measured after the reads so the reads see the generated data as-is"""
+    def words(k=20):
+        return ' '.join(rng.choices(WORDS, k=k))
+
+    def owned(client):
+        return pick_business()
+
+    def latest_ids(client, count):
+        _, headers = pick()
+        items = client.get(f'/api/content?limit={count}&fields=id', headers=headers).get_json()['items']
+        return [item['id'] for item in items], headers
+
+    def import_body(client):
+        business_id, headers = pick_business()
+        body = '\n'.join(json.dumps({'name': f'Product {rng.randint(1, IMPORT_ROWS * 2)}', 'description': words(8),
+                                      'price': round(rng.uniform(1, 500), 2)}) for _ in range(IMPORT_ROWS))
+        return business_id, body, headers
+
+    def plan_body(client):
+        business_id, headers = pick_business()
+        return {'business_id': business_id, 'platforms': ['twitter'],
+                'posts': [{'content': words()} for _ in range(PLAN_POSTS)]}, headers
+
+    def new_campaign(client):
+        from app import app
+        from models import db, Campaign
+
+        business_id, headers = pick_business()
+        with app.app_context():
+            campaign = Campaign(title='Benchmark campaign', business_id=business_id, strategy={
+                f'Day_{day}': {'Platform': 'Twitter', 'Post_Content': words(), 'Image_Prompt': words(6)}
+                for day in range(1, 8)})
+            db.session.add(campaign)
+            db.session.commit()
+            return campaign.id, headers
+
+    return {
+        'PUT /profile': lambda c: c.put('/api/profile', json={'bio': words(10)}, headers=pick()[1]),
+        'POST /business': lambda c: c.post('/api/business', json={'name': f'Business {words(2)}', 'industry': 'retail'},
+                                           headers=pick()[1]),
+        'PATCH /content/<id>': (latest_post, lambda c, content_id, h: c.patch(
+            f'/api/content/{content_id}', json={'model': 'benchmark'}, headers=h)),
+        'DELETE /content/<id>': (latest_post, lambda c, content_id, h: c.delete(f'/api/content/{content_id}', headers=h)),
+        'POST /content/bulk (update 100 ids)': (lambda c: latest_ids(c, 100), lambda c, ids, h: c.post(
+            '/api/content/bulk', json={'action': 'update', 'ids': ids, 'fields': {'model': 'benchmark'}}, headers=h)),
+        'POST /content/bulk (update by filter)': (owned, lambda c, b, h: c.post(
+            '/api/content/bulk', json={'action': 'update', 'filter': {'business_id': b},
+                                       'fields': {'image_url': 'https://example.com/bulk.png'}}, headers=h)),
+        f'POST /business/<id>/products/import ({IMPORT_ROWS} rows)': (import_body, lambda c, b, body, h: c.post(
+            f'/api/business/{b}/products/import?format=ndjson', data=body, headers=h)),
+        'POST /publish (outbox)': lambda c: c.post('/api/publish', json={'platform': 'twitter', 'content': words()},
+                                                   headers=pick()[1]),
+        'POST /scheduler/post-now (outbox)': lambda c: c.post('/api/scheduler/post-now', json={'content': words()},
+                                                              headers=pick()[1]),
+        'POST /scheduler/schedule': (owned, lambda c, b, h: c.post(
+            '/api/scheduler/schedule', json={'business_id': b, 'content': words(), 'hours_from_now': 2}, headers=h)),
+        f'POST /scheduler/plan ({PLAN_POSTS} posts)': (plan_body, lambda c, body, h: c.post(
+            '/api/scheduler/plan', json=body, headers=h)),
+        'POST /scheduler/start/<id>': (owned, lambda c, b, h: c.post(
+            f'/api/scheduler/start/{b}', json={'interval_hours': 4, 'platforms': ['twitter']}, headers=h)),
+        'POST /scheduler/stop': lambda c: c.post('/api/scheduler/stop', json={}, headers=pick()[1]),
+        'POST /campaign/<id>/launch': (new_campaign, lambda c, campaign_id, h: c.post(
+            f'/api/campaign/{campaign_id}/launch', json={'video': False}, headers=h)),
+    }
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure(client, route, repeat):
+    """Latency and query count over `repeat` calls, then peak memory of one traced call"""
+    setup, request = route if isinstance(route, tuple) else (None, route)
+
+    def call():
+        args = setup(client) if setup else ()
+        started = time.perf_counter()
+        response = request(client, *args)
+        return response, (time.perf_counter() - started) * 1000
+
+    latencies, queries, statuses = [], [], set()
+    call()  # warm-up (connection, statement caches)
+    for _ in range(repeat):
+        response, elapsed_ms = call()
+        latencies.append(elapsed_ms)
+        queries.append(int(response.headers.get('X-DB-Query-Count', 0)))
+        statuses.add(response.status_code)
+
+    args = setup(client) if setup else ()
+    tracemalloc.start()
+    request(client, *args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'p50_ms': round(_percentile(latencies, 0.5), 2),
+        'p95_ms': round(_percentile(latencies, 0.95), 2),
+        'max_ms': round(max(latencies), 2),
+        'queries_avg': round(sum(queries) / len(queries), 1),
+        'queries_max': max(queries),
+        'peak_kb': round(peak / 1024, 1),
+        'statuses': sorted(statuses),
+    }
+
+
+def print_results(results, previous=None):
+    header = f"{'route':44} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'queries':>8} {'peak KB':>9}"
+    print('\n' + header)
+    print('-' * len(header))
+    for name, r in results['routes'].items():
+        line = (f"{name:44} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['max_ms']:9.2f} "
+                f"{r['queries_avg']:8.1f} {r['peak_kb']:9.1f}")
+        before = (previous or {}).get('routes', {}).get(name)
+        if before:
+            change = (r['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            line += f"   p50 {change:+.0f}%, queries {before['queries_avg']:.1f} → {r['queries_avg']:.1f}"
+        if any(status >= 500 for status in r['statuses']):
+            line += f"   ❌ {r['statuses']}"
+        print(line)
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    # Must be set before the app (and its engine) is imported
+    workdir = None
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        workdir = tempfile.mkdtemp(prefix='automarketer-bench-')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['DB_METRICS_HEADERS'] = 'true'
+    os.environ.setdefault('DB_QUERY_BUDGET', '1000000')   # the report shows the counts
+    os.environ.setdefault('DB_SLOW_QUERY_MS', '1000000')
+    # Write routes publish to the stand-in, never for real (load_dotenv doesn't override these)
+    from ayrshare_standin import start_stand_in, API_KEY
+    stand_in, _, stand_in_url = start_stand_in()
+    os.environ['AYRSHARE_API_KEY'] = API_KEY
+    os.environ['AYRSHARE_BASE_URL'] = stand_in_url
+    # The stand-in has no limits - without this the publish timings would measure token bucket waits
+    os.environ.setdefault('PUBLISH_RATE_PER_MINUTE', '1000000')
+    os.environ.setdefault('PUBLISH_BURST', '1000000')
+    os.environ['GOOGLE_API_KEY'] = ''
+    os.environ['LEADER_ELECTION_AUTOSTART'] = 'false'
+
+    from flask_jwt_extended import create_access_token
+    from app import app
+    import leader_service
+
+    # Never lead: no automation, dispatching or outbox sending while measuring
+    leader_service.elector.ensure_started = lambda: None
+    from models import db, BusinessProfile
+    from migrations import run_migrations
+
+    with app.app_context():
+        run_migrations(db.engine)
+        print(f"⏳ Generating {args.users:,} users, {args.businesses:,} businesses, "
+              f"{args.businesses * args.products:,} products, {args.posts:,} posts...")
+        generate_data(args, rng)
+
+        ownership = {}
+        for business_id, user_id in db.session.query(BusinessProfile.id, BusinessProfile.user_id):
+            ownership.setdefault(user_id, []).append(business_id)
+        tokens = {user_id: create_access_token(identity=str(user_id)) for user_id in ownership}
+        dialect = db.engine.dialect.name
+
+    client = app.test_client()
+    results = {
+        'generated_at': datetime.utcnow().isoformat(),
+        'database': dialect,
+        'scale': {'users': args.users, 'businesses': args.businesses,
+                  'products': args.businesses * args.products, 'posts': args.posts,
+                  'archive_days': args.archive_days},
+        'repeat': args.repeat,
+        'routes': {},
+    }
+    for name, route in build_routes(args, rng, tokens, ownership).items():
+        results['routes'][name] = measure(client, route, args.repeat)
+        print(f"   ✓ {name}")
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_results(results, previous)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+    stand_in.shutdown()
+    if workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,356 @@
+"""
+Campaign Launcher & Asset Pre-rendering
+Turns a stored 7-day strategy (Campaign.strategy: "Day 1".."Day 7", each with
+Topic, Post_Content, Image_Prompt and Platform) into scheduled posts - day N is
+planned into the N-th day after the start by the bulk slot planner, and the
+whole campaign is queued in one transaction.
+
+Images, narration (TTS) and videos are rendered by a background pipeline
+CAMPAIGN_RENDER_LEAD_MINUTES before each post's slot, so at post time the
+dispatcher only hands the provider prebuilt asset URLs. Render jobs live on the
+scheduled_post row and are claimed atomically, like dispatches. Only the leader
+runs the renderer (see leader_service).
+"""
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from sqlalchemy import insert, select, update
+from models import db, ScheduledPost
+from planner_service import plan_posts, plan_locked
+
+load_dotenv()
+
+CAMPAIGN_RENDER_ENABLED = os.getenv('CAMPAIGN_RENDER_ENABLED', 'true').lower() == 'true'
+CAMPAIGN_RENDER_LEAD_MINUTES = int(os.getenv('CAMPAIGN_RENDER_LEAD_MINUTES', 120))
+CAMPAIGN_RENDER_POLL_SECONDS = int(os.getenv('CAMPAIGN_RENDER_POLL_SECONDS', 30))
+CAMPAIGN_RENDER_MAX_ATTEMPTS = int(os.getenv('CAMPAIGN_RENDER_MAX_ATTEMPTS', 3))
+CAMPAIGN_RENDER_STALE_SECONDS = int(os.getenv('CAMPAIGN_RENDER_STALE_SECONDS', 1800))
+CAMPAIGN_RENDER_VIDEO = os.getenv('CAMPAIGN_RENDER_VIDEO', 'true').lower() == 'true'
+# Public address of this backend - providers fetch rendered audio/video from it
+PUBLIC_BASE_URL = os.getenv('PUBLIC_BASE_URL', '').rstrip('/')
+
+# Rendering is CPU-heavy (moviepy), so claim a couple of posts at a time
+RENDER_BATCH_SIZE = 2
+# A failed render is retried after this many minutes times the attempts so far
+RENDER_RETRY_MINUTES = 5
+
+PLATFORM_ALIASES = {
+    'twitter': 'twitter', 'x': 'twitter', 'tweet': 'twitter',
+    'linkedin': 'linkedin',
+    'instagram': 'instagram', 'ig': 'instagram', 'insta': 'instagram',
+    'facebook': 'facebook', 'fb': 'facebook',
+    'tiktok': 'tiktok',
+    'youtube': 'youtube',
+    'pinterest': 'pinterest',
+    'threads': 'threads',
+    'blog': 'blog', 'blogger': 'blog',
+}
+# Blogger embeds an image, it can't take a video
+VIDEO_PLATFORMS = {'twitter', 'linkedin', 'instagram', 'facebook', 'tiktok', 'youtube', 'pinterest', 'threads'}
+
+
+def parse_platforms(value):
+    """'LinkedIn & Twitter/X', ['Instagram'] ... -> ['linkedin', 'twitter']; unknown names are dropped"""
+    parts = value if isinstance(value, list) else re.split(r'[/,&+;|]|\band\b', str(value or ''), flags=re.I)
+    platforms = []
+    for part in parts:
+        name = PLATFORM_ALIASES.get(re.sub(r'[^a-z]', '', str(part).lower()))
+        if name and name not in platforms:
+            platforms.append(name)
+    return platforms
+
+
+def campaign_days(strategy):
+    """[(day number, entry)] of a strategy, in day order"""
+    days = []
+    for key, entry in (strategy or {}).items():
+        match = re.search(r'\d+', key)
+        if match and isinstance(entry, dict):
+            days.append((int(match.group()), entry))
+    return sorted(days, key=lambda day: day[0])
+
+
+def _narration(text):
+    """Post text without hashtags and links, for TTS"""
+    return re.sub(r'\s+', ' ', re.sub(r'#\w+|https?://\S+', '', text)).strip()
+
+
+def launch_campaign(campaign, user_id, constraints, platforms=None, video=None, tts=None, dry_run=False):
+    """
+    Queue one post per strategy day. Day N lands in [start + N-1 days, start + N days),
+    on the business's best free slot. All days are queued or none.
+    tts pre-renders narration for every post; videos are always narrated.
+    """
+    from ai_service import generate_image_from_text
+    from scheduler_service import check_publish_config
+    import dispatcher_service
+
+    if video is None:
+        video = CAMPAIGN_RENDER_VIDEO and bool(PUBLIC_BASE_URL)
+    elif video and not PUBLIC_BASE_URL:
+        return {'success': False, 'error': 'Set PUBLIC_BASE_URL so platforms can fetch rendered videos'}
+
+    days = campaign_days(campaign.strategy)
+    if not days:
+        return {'success': False, 'error': 'Campaign has no days to schedule'}
+    posts = []
+    for number, entry in days:
+        content = (entry.get('Post_Content') or entry.get('Topic') or '').strip()
+        post_platforms = platforms or parse_platforms(entry.get('Platform'))
+        if not content:
+            return {'success': False, 'error': f'Day {number} has no post content'}
+        if not post_platforms:
+            return {'success': False, 'error': f"Day {number} names no supported platform "
+                                               f"({entry.get('Platform')!r}) - pass platforms"}
+        prompt = (entry.get('Image_Prompt') or '').strip() or None
+        render_video = bool(video and prompt and set(post_platforms) <= VIDEO_PLATFORMS)
+        posts.append({'day': number, 'topic': entry.get('Topic'), 'content': content, 'platforms': post_platforms,
+                      'image_prompt': prompt, 'video': render_video, 'tts': bool(tts) or render_video})
+
+    error = check_publish_config([p for post in posts for p in post['platforms']])
+    if error:
+        return {'success': False, 'error': error}
+
+    now = datetime.utcnow()
+    start = constraints['start'] or now
+    tz = constraints['timezone']
+
+    def plan():
+        # Plan every day before queueing anything; earlier days' slots are passed on as reserved
+        slots = []
+        for post in posts:
+            window = {**constraints, 'start': start + timedelta(days=post['day'] - 1), 'days': 1}
+            slots.append(plan_posts(campaign.business_id, [post], window, now=now,
+                                    reserved=[s['due_at'] for s in slots if s])[0])
+        return slots
+
+    slots = plan() if dry_run else plan_locked(campaign.business_id, plan)
+    launched = db.session.query(ScheduledPost.id).filter(
+        ScheduledPost.campaign_id == campaign.id,
+        ScheduledPost.status.in_(['pending', 'dispatching'])
+    ).first()
+    if launched:
+        db.session.rollback()
+        return {'success': False, 'error': 'Campaign is already scheduled'}
+    unplaced = [post['day'] for post, slot in zip(posts, slots) if slot is None]
+
+    if unplaced:
+        db.session.rollback()
+        return {'success': False, 'error': f"No free slot on day(s) {', '.join(map(str, unplaced))} - allow "
+                                           f"shorter spacing or a higher per_day_cap", 'unplaced': unplaced}
+    planned = []
+    for post, slot in zip(posts, slots):
+        local = slot['due_at'].replace(tzinfo=timezone.utc).astimezone(tz)
+        render = {'image_prompt': post['image_prompt'], 'tts': post['tts'], 'video': post['video']} \
+            if post['image_prompt'] or post['tts'] else None
+        planned.append({'day': post['day'], 'topic': post['topic'], 'platforms': post['platforms'],
+                        'scheduled_time': local.strftime('%Y-%m-%d %H:%M'), 'due_at': slot['due_at'].isoformat() + 'Z',
+                        'peak': slot['peak'], 'render': render})
+    if dry_run:
+        db.session.rollback()
+        return {'success': True, 'dry_run': True, 'plan': planned}
+
+    rows = [{
+        'user_id': user_id, 'business_id': campaign.business_id, 'content': post['content'],
+        'platforms': post['platforms'], 'due_at': slot['due_at'],
+        # The plain image URL is also the fallback if pre-rendering fails
+        'image_url': generate_image_from_text(post['image_prompt']) if post['image_prompt'] else None,
+        'campaign_id': campaign.id, 'campaign_day': post['day'],
+        'render_status': 'pending' if entry['render'] else None,
+        'render_after': slot['due_at'] - timedelta(minutes=CAMPAIGN_RENDER_LEAD_MINUTES) if entry['render'] else None,
+        'render_spec': entry['render'],
+    } for post, slot, entry in zip(posts, slots, planned)]
+    ids = db.session.execute(
+        insert(ScheduledPost).returning(ScheduledPost.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    for entry, post_id in zip(planned, ids):
+        entry['id'] = post_id
+    db.session.commit()
+    if asset_renderer:
+        asset_renderer.wake()
+    dispatcher_service.wake_if_due(min(row['due_at'] for row in rows))
+    print(f"🚀 Campaign {campaign.id} launched: {len(planned)} post(s) queued")
+    return {'success': True, 'queued': len(planned), 'plan': planned}
+
+
+def get_campaign_schedule(campaign_id):
+    """Queued and finished posts of a campaign, in day order"""
+    posts = ScheduledPost.query.filter_by(campaign_id=campaign_id).order_by(
+        ScheduledPost.campaign_day, ScheduledPost.due_at).all()
+    return [post.to_dict() for post in posts]
+
+
+def media_url(post):
+    """URL the provider should fetch for a post: the prebuilt video if there is one, else the image"""
+    video_url = (post.assets or {}).get('video_url')
+    if video_url and PUBLIC_BASE_URL:
+        return PUBLIC_BASE_URL + video_url if video_url.startswith('/') else video_url
+    return (post.assets or {}).get('image_url') or post.image_url
+
+
+# ==================== RENDERER ====================
+
+def claim_due_renders(limit=RENDER_BATCH_SIZE, now=None):
+    """Atomically mark up to `limit` posts whose render window opened as rendering. Returns their ids."""
+    table = ScheduledPost.__table__
+    now = now or datetime.utcnow()
+
+    due = select(table.c.id).where(
+        table.c.render_status == 'pending', table.c.render_after <= now, table.c.status == 'pending'
+    ).order_by(table.c.due_at).limit(limit)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        due = due.with_for_update(skip_locked=True)
+
+    claimed = db.session.execute(
+        update(table)
+        .where(table.c.id.in_(due.scalar_subquery()), table.c.render_status == 'pending')
+        .values(render_status='rendering', render_claimed_at=now,
+                render_attempts=table.c.render_attempts + 1, updated_at=now)
+        .returning(table.c.id)
+    ).scalars().all()
+    db.session.commit()
+    return claimed
+
+
+def release_stale_renders(now=None):
+    """Put renders claimed by a worker that never finished back in the queue"""
+    table = ScheduledPost.__table__
+    now = now or datetime.utcnow()
+    released = db.session.execute(
+        update(table)
+        .where(table.c.render_status == 'rendering',
+               table.c.render_claimed_at < now - timedelta(seconds=CAMPAIGN_RENDER_STALE_SECONDS))
+        .values(render_status='pending', render_claimed_at=None, updated_at=now)
+    ).rowcount
+    db.session.commit()
+    if released:
+        print(f"⚠️ Released {released} stale asset render claim(s)")
+    return released
+
+
+def render_assets(post):
+    """Build a post's image, narration and video. Returns the asset URLs; raises on failure."""
+    from ai_service import text_to_speech
+    from video_service import download_image, generate_video_from_image_and_audio, AUDIO_DIR
+
+    spec = post.render_spec or {}
+    assets = dict(post.assets or {})
+    image_path = None
+    try:
+        if spec.get('image_prompt'):
+            # The image renders when first fetched - do it now, not while the provider waits
+            image_path = download_image(post.image_url)
+            if not image_path:
+                raise RuntimeError('Image could not be rendered')
+            assets['image_url'] = post.image_url
+
+        if spec.get('tts') and not assets.get('audio_url'):
+            filename = text_to_speech(_narration(post.content)[:5000], f'campaign_{post.id}.mp3')
+            if not filename:
+                raise RuntimeError('Narration could not be generated')
+            assets['audio_url'] = f'/api/audio/{filename}'
+
+        if spec.get('video'):
+            if not image_path:
+                raise RuntimeError('Video needs an image')
+            audio_path = os.path.join(AUDIO_DIR, assets['audio_url'].rsplit('/', 1)[-1])
+            result = generate_video_from_image_and_audio(image_path, audio_path, f'campaign_{post.id}.mp4')
+            if not result.get('success'):
+                raise RuntimeError(result.get('error') or 'Video could not be rendered')
+            assets['video_url'] = f"/api/video/{result['filename']}"
+    finally:
+        if image_path and os.path.exists(image_path):
+            os.remove(image_path)
+    return assets
+
+
+def render_post(post):
+    """Render one claimed post and record the outcome"""
+    try:
+        post.assets = render_assets(post)
+        post.render_status = 'ready'
+        post.render_error = None
+    except Exception as e:
+        post.render_error = str(e)
+        if post.render_attempts < CAMPAIGN_RENDER_MAX_ATTEMPTS:
+            post.render_status = 'pending'
+            post.render_after = datetime.utcnow() + timedelta(minutes=RENDER_RETRY_MINUTES * post.render_attempts)
+        else:
+            # The dispatcher posts with the plain image URL instead
+            post.render_status = 'failed'
+    post.render_claimed_at = None
+    db.session.commit()
+    return post.render_status
+
+
+def render_due_assets():
+    """Claim and render everything whose render window opened. Returns the number of posts rendered."""
+    release_stale_renders()
+    rendered = 0
+    while True:
+        ids = claim_due_renders()
+        if not ids:
+            break
+        for post in ScheduledPost.query.filter(ScheduledPost.id.in_(ids)).order_by(ScheduledPost.due_at):
+            status = render_post(post)
+            print(f"🎬 Campaign post {post.id} assets → {status}"
+                  + (f" ({post.render_error})" if post.render_error else ''))
+            rendered += 1
+    return rendered
+
+
+class AssetRenderer:
+    """Background thread rendering campaign assets every CAMPAIGN_RENDER_POLL_SECONDS"""
+
+    def __init__(self, app, poll_seconds=CAMPAIGN_RENDER_POLL_SECONDS):
+        self.app = app
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='asset-renderer', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        """Poll now instead of waiting for the next interval (e.g. a campaign was just launched)"""
+        self._wake.set()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    render_due_assets()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"❌ Asset renderer error: {e}")
+                finally:
+                    db.session.remove()
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+
+asset_renderer = None
+
+
+def init_asset_renderer(app):
+    """Create the renderer - started and stopped by leader election (leader_service)"""
+    global asset_renderer
+    if CAMPAIGN_RENDER_ENABLED and asset_renderer is None:
+        asset_renderer = AssetRenderer(app)
+    return asset_renderer
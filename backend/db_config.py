@@ -0,0 +1,129 @@
+"""
+Database Engine Configuration
+Selects the database from DATABASE_URL (SQLite file by default, Postgres for
+multi-node deployments), applies SQLite pragmas (WAL, synchronous, busy_timeout,
+mmap) or the Postgres statement timeout, sets pool options from environment
+variables, and reports the effective values at startup
+"""
+import os
+from dotenv import load_dotenv
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+load_dotenv()
+
+# SQLite pragmas - WAL lets readers continue while a single writer commits
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),  # 256 MB
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -20000)),  # negative = KiB, ~20 MB
+}
+
+# Connection pool settings (applied per gunicorn worker process)
+POOL_SETTINGS = {
+    'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+    'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+    'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+}
+
+# Postgres only: abort statements that run longer than this (0 = no limit)
+STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))
+
+# Values SQLite reports back for PRAGMA synchronous
+SYNCHRONOUS_LEVELS = {0: 'OFF', 1: 'NORMAL', 2: 'FULL', 3: 'EXTRA'}
+
+
+@event.listens_for(Engine, 'connect')
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Set pragmas on every new SQLite connection (no-op for other drivers)"""
+    if type(dbapi_connection).__module__.split('.')[0] not in ('sqlite3', 'pysqlite2'):
+        return
+
+    cursor = dbapi_connection.cursor()
+    try:
+        # busy_timeout first, so switching journal mode waits instead of failing
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_PRAGMAS['busy_timeout']}")
+        cursor.execute(f"PRAGMA journal_mode = {SQLITE_PRAGMAS['journal_mode']}")
+        cursor.execute(f"PRAGMA synchronous = {SQLITE_PRAGMAS['synchronous']}")
+        cursor.execute(f"PRAGMA mmap_size = {SQLITE_PRAGMAS['mmap_size']}")
+        cursor.execute(f"PRAGMA cache_size = {SQLITE_PRAGMAS['cache_size']}")
+    finally:
+        cursor.close()
+
+
+def get_database_uri(default_sqlite_path):
+    """DATABASE_URL from the environment, or the local SQLite file"""
+    uri = os.getenv('DATABASE_URL')
+    if not uri:
+        return 'sqlite:///' + default_sqlite_path
+    # Render/Heroku hand out postgres://, which SQLAlchemy no longer accepts;
+    # pin the psycopg (v3) driver when the URL doesn't name one
+    for prefix in ('postgres://', 'postgresql://'):
+        if uri.startswith(prefix):
+            uri = 'postgresql+psycopg://' + uri[len(prefix):]
+    return uri
+
+
+def get_engine_options(database_uri):
+    """Build SQLALCHEMY_ENGINE_OPTIONS for the configured database"""
+    options = dict(POOL_SETTINGS)
+    if database_uri.startswith('postgresql') and STATEMENT_TIMEOUT_MS:
+        options['connect_args'] = {'options': f'-c statement_timeout={STATEMENT_TIMEOUT_MS}'}
+    if database_uri.startswith('sqlite'):
+        # Connections are handed between threads by the pool
+        options['connect_args'] = {'check_same_thread': False}
+        if ':memory:' in database_uri or database_uri.rstrip('/') == 'sqlite:':
+            # In-memory databases use a single shared connection
+            options = {'connect_args': options['connect_args']}
+    return options
+
+
+def configure_database(app, database_uri):
+    """Apply database URI and engine options to the Flask app config"""
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = get_engine_options(database_uri)
+
+
+def get_effective_pragmas(engine):
+    """Read back the pragmas SQLite (or settings Postgres) is actually using on a pooled connection"""
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as conn:
+            return {'statement_timeout': int(conn.execute(
+                text("SELECT setting FROM pg_settings WHERE name = 'statement_timeout'")).scalar())}
+    if engine.dialect.name != 'sqlite':
+        return {}
+
+    with engine.connect() as conn:
+        synchronous = conn.execute(text('PRAGMA synchronous')).scalar()
+        return {
+            'journal_mode': conn.execute(text('PRAGMA journal_mode')).scalar(),
+            'synchronous': SYNCHRONOUS_LEVELS.get(synchronous, synchronous),
+            'busy_timeout': conn.execute(text('PRAGMA busy_timeout')).scalar(),
+            'mmap_size': conn.execute(text('PRAGMA mmap_size')).scalar(),
+            'cache_size': conn.execute(text('PRAGMA cache_size')).scalar(),
+        }
+
+
+def report_database_config(engine):
+    """
+    Startup check: log effective pragmas and pool settings.
+    Warns when SQLite silently ignored a setting (e.g. WAL on a network filesystem).
+    Returns the effective pragma dict.
+    """
+    effective = get_effective_pragmas(engine)
+    print(f"🗄️ Database: {engine.dialect.name}, {engine.pool.status()}")
+
+    expected_settings = dict(SQLITE_PRAGMAS, statement_timeout=STATEMENT_TIMEOUT_MS)
+    for name, value in effective.items():
+        expected = expected_settings[name]
+        if str(value).lower() != str(expected).lower():
+            print(f"⚠️ {name} = {value} (requested {expected})")
+        else:
+            print(f"✅ {name} = {value}")
+
+    return effective
@@ -0,0 +1,89 @@
+"""
+Per-Request Database Metrics
+Counts SQL statements and total DB time for each request, logs slow statements
+(with bound parameters redacted) and warns when a request blows its query budget,
+which is how N+1 patterns show up in production logs.
+In debug mode (or with DB_METRICS_HEADERS=true) the counts are also returned as
+X-DB-Query-Count / X-DB-Time-Ms response headers.
+"""
+import os
+import time
+from dotenv import load_dotenv
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+load_dotenv()
+
+SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', 200))
+QUERY_BUDGET = int(os.getenv('DB_QUERY_BUDGET', 25))
+METRICS_HEADERS = os.getenv('DB_METRICS_HEADERS', 'false').lower() == 'true'
+
+# Longest statement text kept in the slow-query log
+MAX_LOGGED_SQL = 500
+
+
+def redact_params(parameters):
+    """Replace bound values with their type, so logs never carry user data"""
+    def redact(value):
+        if value is None:
+            return None
+        if isinstance(value, (str, bytes)):
+            return f'<{type(value).__name__}:{len(value)}>'
+        return f'<{type(value).__name__}>'
+
+    if isinstance(parameters, dict):
+        return {key: redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        # executemany passes a list of parameter sets - summarize instead of listing
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f'<{len(parameters)} parameter sets>'
+        return [redact(value) for value in parameters]
+    return redact(parameters)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info['query_start'].pop()) * 1000
+
+    if has_request_context():
+        g.db_query_count = g.get('db_query_count', 0) + 1
+        g.db_time_ms = g.get('db_time_ms', 0.0) + elapsed_ms
+
+    if elapsed_ms >= SLOW_QUERY_MS:
+        where = f" [{request.method} {request.path}]" if has_request_context() else ''
+        sql = ' '.join(statement.split())[:MAX_LOGGED_SQL]
+        print(f"🐢 Slow query ({elapsed_ms:.1f} ms){where}: {sql} params={redact_params(parameters)}")
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+    # A statement that raised never reaches after_cursor_execute - drop its start time
+    conn = exception_context.connection
+    if conn is not None and exception_context.execution_context is not None and conn.info.get('query_start'):
+        conn.info['query_start'].pop()
+
+
+def get_request_db_stats():
+    """(query count, DB time in ms) for the current request so far"""
+    return g.get('db_query_count', 0), g.get('db_time_ms', 0.0)
+
+
+def init_db_metrics(app):
+    """Register the per-request budget check and debug headers"""
+
+    @app.after_request
+    def _report_db_metrics(response):
+        count, db_time_ms = get_request_db_stats()
+        if count > QUERY_BUDGET:
+            print(f"⚠️ Query budget exceeded: {request.method} {request.path} ran {count} queries "
+                  f"({db_time_ms:.1f} ms DB time, budget {QUERY_BUDGET})")
+        if app.debug or METRICS_HEADERS:
+            response.headers['X-DB-Query-Count'] = str(count)
+            response.headers['X-DB-Time-Ms'] = f'{db_time_ms:.1f}'
+        return response
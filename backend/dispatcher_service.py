@@ -0,0 +1,333 @@
+"""
+Scheduled Post Dispatcher
+Publishes rows from the scheduled_post table when they fall due. Rows are claimed
+with a single atomic UPDATE (FOR UPDATE SKIP LOCKED on Postgres), so even if two
+workers briefly both dispatch (e.g. during a leader handover) a post goes out once.
+Normally only the leader runs the dispatcher - see leader_service.
+A claim left behind by a worker that died mid-dispatch is released after
+DISPATCH_STALE_SECONDS. A dispatcher that is stopped (leader stepping down)
+finishes the post it is publishing and puts its other claimed posts back. Finished rows are purged after SCHEDULED_POST_RETENTION_DAYS.
+Posts with assets still being pre-rendered (campaign_service) wait for them for up
+to DISPATCH_RENDER_WAIT_SECONDS past their due time, then go out with the plain image.
+Posts staged ahead of a peak slot by automation are re-checked before publishing and
+skipped if they expired or their automation was stopped. The poll sleeps no longer
+than until the next due post, so a staged post goes out right at its slot.
+Posts publish in the bulk lane of the rate limiter (rate_limit_service), behind
+interactive "post now" requests. Each platform goes through the publish outbox
+(outbox_service) under the key scheduled:<post id>, so a post whose platform is
+rate limited or failed transiently is re-queued for the outbox's retry time, and
+publishing it again never repeats a platform that already went out.
+"""
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, or_, select, update
+from models import db, ScheduledPost, PublishedPost, AutomationJob
+from rate_limit_service import publish_lane, BULK
+
+load_dotenv()
+
+DISPATCHER_ENABLED = os.getenv('SCHEDULER_DISPATCHER_ENABLED', 'true').lower() == 'true'
+DISPATCH_POLL_SECONDS = int(os.getenv('DISPATCH_POLL_SECONDS', 15))
+DISPATCH_BATCH_SIZE = int(os.getenv('DISPATCH_BATCH_SIZE', 20))
+DISPATCH_STALE_SECONDS = int(os.getenv('DISPATCH_STALE_SECONDS', 600))
+SCHEDULED_POST_RETENTION_DAYS = int(os.getenv('SCHEDULED_POST_RETENTION_DAYS', 30))
+DISPATCH_RENDER_WAIT_SECONDS = int(os.getenv('DISPATCH_RENDER_WAIT_SECONDS', 600))
+
+# How often the dispatcher purges finished rows
+PURGE_INTERVAL = timedelta(hours=1)
+
+
+def worker_id():
+    """host:pid - computed on use, since gunicorn forks after import"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_due_posts(limit=DISPATCH_BATCH_SIZE, now=None):
+    """Atomically mark up to `limit` due posts as dispatching by this worker. Returns their ids."""
+    table = ScheduledPost.__table__
+    now = now or datetime.utcnow()
+
+    due = select(table.c.id).where(
+        table.c.status == 'pending', table.c.due_at <= now,
+        or_(table.c.render_status.is_(None), table.c.render_status.in_(['ready', 'failed']),
+            table.c.due_at <= now - timedelta(seconds=DISPATCH_RENDER_WAIT_SECONDS))
+    ).order_by(table.c.due_at).limit(limit)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # Concurrent dispatchers skip each other's rows instead of waiting on them
+        due = due.with_for_update(skip_locked=True)
+
+    claimed = db.session.execute(
+        update(table)
+        .where(table.c.id.in_(due.scalar_subquery()), table.c.status == 'pending')
+        .values(status='dispatching', claimed_by=worker_id(), claimed_at=now, updated_at=now)
+        .returning(table.c.id)
+    ).scalars().all()
+    db.session.commit()
+    return claimed
+
+
+def release_stale_claims(now=None):
+    """Put posts claimed by a worker that never finished back in the queue"""
+    table = ScheduledPost.__table__
+    now = now or datetime.utcnow()
+    released = db.session.execute(
+        update(table)
+        .where(table.c.status == 'dispatching',
+               table.c.claimed_at < now - timedelta(seconds=DISPATCH_STALE_SECONDS))
+        .values(status='pending', claimed_by=None, claimed_at=None, updated_at=now)
+    ).rowcount
+    db.session.commit()
+    if released:
+        print(f"⚠️ Released {released} stale scheduled post claim(s)")
+    return released
+
+
+def release_claims(ids):
+    """Put posts this worker claimed but did not start publishing back in the queue"""
+    table = ScheduledPost.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.id.in_(ids), table.c.status == 'dispatching', table.c.claimed_by == worker_id())
+        .values(status='pending', claimed_by=None, claimed_at=None, updated_at=datetime.utcnow())
+    )
+    db.session.commit()
+
+
+def _platform_results(platforms, result):
+    """Split a post_immediately result into (platform, result) pairs"""
+    if len(platforms) == 1:
+        return [(platforms[0], result)]
+    data = result.get('data')
+    if isinstance(data, list):
+        return [(item.get('platform'), item.get('result') or {}) for item in data]
+    return []
+
+
+def record_published_posts(post, result, published_at):
+    """Store one published_post row per platform the post went out on - the engagement history"""
+    if not post.business_id:
+        return
+    for platform, platform_result in _platform_results(post.platforms, result):
+        if not platform or not platform_result.get('success'):
+            continue
+        data = platform_result.get('data') or {}
+        platform = platform.lower()
+        row = PublishedPost(business_id=post.business_id, scheduled_post_id=post.id, platform=platform,
+                            published_at=published_at)
+        if platform == 'blog':
+            row.provider, row.provider_post_id, row.url = 'blogger', data.get('id'), data.get('url')
+        else:
+            row.provider, row.provider_post_id = 'ayrshare', data.get('id')
+            for platform_post in data.get('postIds') or []:
+                if str(platform_post.get('platform', '')).lower() == platform:
+                    row.platform_post_id = platform_post.get('id')
+                    row.url = platform_post.get('postUrl')
+        db.session.add(row)
+
+
+def stale_reason(post, now=None):
+    """Why a claimed post should no longer go out, or None if it is still fresh"""
+    now = now or datetime.utcnow()
+    if post.expires_at and now > post.expires_at:
+        return f"Expired at {post.expires_at:%Y-%m-%d %H:%M} UTC - its peak slot has passed"
+    if post.source == 'automation':
+        job = db.session.get(AutomationJob, post.business_id)
+        if job is None:
+            return 'Automation was stopped after the post was staged'
+        if not {p.lower() for p in post.platforms} & {p.lower() for p in job.platforms}:
+            return 'Platform was removed from the automation after the post was staged'
+    return None
+
+
+def outbox_key(post):
+    """Idempotency key of the post in the publish outbox"""
+    return f'scheduled:{post.id}'
+
+
+def _retry_after(post, result):
+    """Seconds until the outbox retries a platform that is still queued there, else None"""
+    results = [r for _, r in _platform_results(post.platforms, result)] or [result]
+    queued = [r for r in results if r.get('queued')]
+    if queued:
+        return max(r.get('retry_after') or 0 for r in queued)
+    return None
+
+
+def dispatch_post(post):
+    """Publish one claimed post and record the outcome"""
+    from scheduler_service import post_immediately
+    from campaign_service import media_url
+
+    reason = stale_reason(post)
+    if reason:
+        from outbox_service import cancel_pending
+
+        post.status = 'skipped'
+        post.last_error = reason
+        db.session.commit()
+        # Platforms still waiting for an outbox retry must not go out either
+        cancel_pending(outbox_key(post))
+        return {'success': False, 'skipped': True, 'error': reason}
+
+    post.attempts += 1
+    try:
+        # Prebuilt campaign assets are already rendered, so this is only an upload
+        with publish_lane(BULK):
+            result = post_immediately(post.content, post.platforms, media_url(post), post.title,
+                                      idempotency_key=outbox_key(post), user_id=post.user_id,
+                                      business_id=post.business_id)
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+
+    retry_after = _retry_after(post, result)
+    if retry_after is not None:
+        # Back in the queue for the outbox's retry - platforms that went out are not repeated
+        post.status = 'pending'
+        post.claimed_by = None
+        post.claimed_at = None
+        post.due_at = datetime.utcnow() + timedelta(seconds=retry_after + 1)
+        post.last_error = str(result.get('error'))
+        db.session.commit()
+        return result
+
+    if result.get('success'):
+        post.status = 'sent'
+        post.sent_at = datetime.utcnow()
+        post.last_error = None
+    else:
+        post.status = 'failed'
+        post.last_error = str(result.get('error') or result.get('message') or 'Publishing failed')
+    post.result = result
+    # Partially failed multi-platform posts still count for the platforms that went out
+    record_published_posts(post, result, post.sent_at or datetime.utcnow())
+    db.session.commit()
+    return result
+
+
+def dispatch_due_posts(should_stop=None):
+    """
+    Claim and publish everything that is due. Returns the number of posts dispatched.
+    should_stop is checked before each post: once it returns True the claimed posts
+    not started yet are released and the run ends.
+    """
+    release_stale_claims()
+    dispatched = 0
+    while True:
+        if should_stop and should_stop():
+            break
+        ids = claim_due_posts()
+        if not ids:
+            break
+        posts = ScheduledPost.query.filter(ScheduledPost.id.in_(ids)).order_by(ScheduledPost.due_at).all()
+        for index, post in enumerate(posts):
+            if should_stop and should_stop():
+                release_claims([p.id for p in posts[index:]])
+                return dispatched
+            dispatch_post(post)
+            print(f"📤 Scheduled post {post.id} → {post.status} ({', '.join(post.platforms)})")
+            dispatched += 1
+    return dispatched
+
+
+def seconds_until_next_due(now=None):
+    """Seconds until the next pending post falls due, or None if nothing is queued"""
+    now = now or datetime.utcnow()
+    next_due = db.session.query(func.min(ScheduledPost.due_at)).filter(
+        ScheduledPost.status == 'pending', ScheduledPost.due_at > now
+    ).scalar()
+    db.session.commit()
+    return (next_due - now).total_seconds() if next_due else None
+
+
+def purge_finished_posts(days=SCHEDULED_POST_RETENTION_DAYS):
+    """Delete sent/failed/skipped posts older than `days`"""
+    table = ScheduledPost.__table__
+    purged = db.session.execute(
+        delete(table).where(
+            table.c.status.in_(['sent', 'failed', 'skipped']),
+            table.c.updated_at < datetime.utcnow() - timedelta(days=days)
+        )
+    ).rowcount
+    db.session.commit()
+    if purged:
+        print(f"🧹 Purged {purged} finished scheduled post(s)")
+    return purged
+
+
+class Dispatcher:
+    """Background thread polling the queue every DISPATCH_POLL_SECONDS"""
+
+    def __init__(self, app, poll_seconds=DISPATCH_POLL_SECONDS):
+        self.app = app
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._last_purge = None
+
+    def ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='post-dispatcher', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        """Poll now instead of waiting for the next interval (e.g. a post was just queued)"""
+        self._wake.set()
+
+    def stop(self, timeout=DISPATCH_STALE_SECONDS):
+        """
+        Stop after the post being published, if any. Waits for it, so a new leader never
+        finds it half-sent; past DISPATCH_STALE_SECONDS its claim is released as stale anyway.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def run_once(self):
+        """Dispatch and purge. Returns how long to sleep before the next poll."""
+        dispatch_due_posts(should_stop=self._stop.is_set)
+        if not self._last_purge or datetime.utcnow() - self._last_purge > PURGE_INTERVAL:
+            purge_finished_posts()
+            self._last_purge = datetime.utcnow()
+        next_due = seconds_until_next_due()
+        return self.poll_seconds if next_due is None else min(self.poll_seconds, next_due)
+
+    def _run(self):
+        while not self._stop.is_set():
+            wait = self.poll_seconds
+            with self.app.app_context():
+                try:
+                    wait = self.run_once()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"❌ Dispatcher error: {e}")
+                finally:
+                    db.session.remove()
+            self._wake.wait(wait)
+            self._wake.clear()
+
+
+dispatcher = None
+
+
+def wake_if_due(due_at):
+    """Wake the dispatcher if a post just queued falls due before its next poll"""
+    if dispatcher and due_at <= datetime.utcnow() + timedelta(seconds=DISPATCH_POLL_SECONDS):
+        dispatcher.wake()
+
+
+def init_dispatcher(app):
+    """Create the dispatcher - started and stopped by leader election (leader_service)"""
+    global dispatcher
+    if DISPATCHER_ENABLED and dispatcher is None:
+        dispatcher = Dispatcher(app)
+    return dispatcher
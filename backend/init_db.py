@@ -1,10 +1,14 @@
+import os
+
+os.environ.setdefault('LEADER_ELECTION_AUTOSTART', 'false')  # one-off run: never lead
 from app import app, db
+from migrations import run_migrations
 
 def init_db():
     with app.app_context():
-        print("Creating database tables...")
-        db.create_all()
-        print("Tables created successfully!")
+        print("Applying database migrations...")
+        run_migrations(db.engine)
+        print("Database is ready!")
 
 if __name__ == "__main__":
     init_db()
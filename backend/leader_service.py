@@ -0,0 +1,224 @@
+"""
+Leader Election
+Every gunicorn worker campaigns for a lease row in scheduler_lease. The holder
+renews it every LEADER_HEARTBEAT_SECONDS and is the only process that runs the
+automation engine, the scheduled-post dispatcher, the engagement sync, the campaign
+asset renderer and the publish outbox sender. If the leader dies its
+lease expires after LEADER_LEASE_SECONDS and another worker takes over on its
+next heartbeat. A leader shutting down cleanly keeps renewing the lease until
+its services have finished their in-flight work, then releases it immediately.
+
+Each process campaigns from startup. Scripts that import the app for one-off work
+(migrations, CLI tools) set LEADER_ELECTION_AUTOSTART=false; the process then only
+campaigns once it serves a request. Set LEADER_ELECTION_ENABLED=false for a
+single-process setup (the process then always leads without touching the database).
+"""
+import os
+import atexit
+import threading
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import case, or_, update
+from sqlalchemy.exc import IntegrityError
+from models import db, SchedulerLease
+from dispatcher_service import worker_id
+
+load_dotenv()
+
+LEADER_ELECTION_ENABLED = os.getenv('LEADER_ELECTION_ENABLED', 'true').lower() == 'true'
+LEADER_LEASE_SECONDS = int(os.getenv('LEADER_LEASE_SECONDS', 10))
+LEADER_HEARTBEAT_SECONDS = int(os.getenv('LEADER_HEARTBEAT_SECONDS', 3))
+LEADER_ELECTION_AUTOSTART = os.getenv('LEADER_ELECTION_AUTOSTART', 'true').lower() == 'true'
+
+LEASE_NAME = 'scheduler'
+
+
+def try_acquire_lease(name=LEASE_NAME, holder=None, ttl=LEADER_LEASE_SECONDS):
+    """
+    Take or renew the lease in one atomic UPDATE: succeeds if we already hold it
+    or the current holder let it expire. Returns True while we are the leader.
+    """
+    holder = holder or worker_id()
+    now = datetime.utcnow()
+    table = SchedulerLease.__table__
+
+    renewed = db.session.execute(
+        update(table)
+        .where(table.c.name == name, or_(table.c.holder == holder, table.c.expires_at < now))
+        .values(
+            holder=holder,
+            # acquired_at only moves when leadership changes hands
+            acquired_at=case((table.c.holder == holder, table.c.acquired_at), else_=now),
+            heartbeat_at=now,
+            expires_at=now + timedelta(seconds=ttl)
+        )
+    ).rowcount
+    if renewed:
+        db.session.commit()
+        return True
+
+    if db.session.get(SchedulerLease, name) is None:
+        try:
+            db.session.add(SchedulerLease(name=name, holder=holder, acquired_at=now, heartbeat_at=now,
+                                          expires_at=now + timedelta(seconds=ttl)))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            # Another worker created the row first
+            db.session.rollback()
+            return False
+    db.session.rollback()
+    return False
+
+
+def release_lease(name=LEASE_NAME, holder=None):
+    """Give the lease up so another worker can take over without waiting for expiry"""
+    holder = holder or worker_id()
+    table = SchedulerLease.__table__
+    db.session.execute(
+        update(table).where(table.c.name == name, table.c.holder == holder)
+        .values(holder=None, expires_at=datetime.utcnow())
+    )
+    db.session.commit()
+
+
+def get_lease(name=LEASE_NAME):
+    lease = db.session.get(SchedulerLease, name)
+    if not lease:
+        return None
+    return {
+        'holder': lease.holder,
+        'acquired_at': lease.acquired_at.isoformat() + 'Z' if lease.acquired_at else None,
+        'heartbeat_at': lease.heartbeat_at.isoformat() + 'Z' if lease.heartbeat_at else None,
+        'expires_at': lease.expires_at.isoformat() + 'Z',
+        'active': lease.holder is not None and lease.expires_at > datetime.utcnow()
+    }
+
+
+class LeaderElector:
+    """Heartbeat thread that campaigns for the lease and starts/stops the leader-only services"""
+
+    def __init__(self, app, on_elected, on_demoted, heartbeat_seconds=LEADER_HEARTBEAT_SECONDS):
+        self.app = app
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.heartbeat_seconds = heartbeat_seconds
+        self.is_leader = False
+        self._stop = threading.Event()
+        # Set while a leader shuts its services down - the heartbeat renews but never re-elects
+        self._resigning = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        # A thread started before a fork is dead in the child, which then campaigns from its own
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._stop.clear()
+                self._resigning.clear()
+                self._thread = threading.Thread(target=self._run, name='leader-elector', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=5):
+        """
+        Stop campaigning. A leader first stops its services - waiting for in-flight work,
+        e.g. a post being published - while the heartbeat keeps the lease, so no other
+        worker takes over mid-publish; then it hands the lease back.
+        """
+        self._resigning.set()
+        if self.is_leader:
+            with self.app.app_context():
+                self.on_demoted()
+                db.session.remove()
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+        if self.is_leader:
+            self.is_leader = False
+            if LEADER_ELECTION_ENABLED:
+                with self.app.app_context():
+                    release_lease()
+                    db.session.remove()
+            print(f"👋 {worker_id()} released the scheduler lease")
+
+    def _heartbeat(self):
+        if not LEADER_ELECTION_ENABLED:
+            return True
+        try:
+            return try_acquire_lease()
+        except Exception as e:
+            # Can't renew - step down rather than risk two leaders
+            db.session.rollback()
+            print(f"⚠️ Leader heartbeat failed: {e}")
+            return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    leader = self._heartbeat()
+                    if leader and not self.is_leader and not self._resigning.is_set():
+                        self.is_leader = True
+                        print(f"👑 {worker_id()} is now the scheduler leader")
+                        self.on_elected()
+                    elif not leader and self.is_leader:
+                        self.is_leader = False
+                        print(f"⚠️ {worker_id()} lost the scheduler lease")
+                        self.on_demoted()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"❌ Leader election error: {e}")
+                finally:
+                    db.session.remove()
+            self._stop.wait(self.heartbeat_seconds)
+
+
+elector = None
+
+
+def init_leader_election(app):
+    """Run the automation engine and dispatcher only in the process holding the lease"""
+    global elector
+    if elector is not None:
+        return elector
+    import dispatcher_service
+    import scheduler_service
+    import metrics_service
+    import campaign_service
+    import outbox_service
+
+    def on_elected():
+        if dispatcher_service.dispatcher:
+            dispatcher_service.dispatcher.ensure_started()
+        scheduler_service.automation_engine.activate()
+        if metrics_service.metrics_syncer:
+            metrics_service.metrics_syncer.ensure_started()
+        if campaign_service.asset_renderer:
+            campaign_service.asset_renderer.ensure_started()
+        if outbox_service.outbox_sender:
+            outbox_service.outbox_sender.ensure_started()
+
+    def on_demoted():
+        if dispatcher_service.dispatcher:
+            dispatcher_service.dispatcher.stop()
+        scheduler_service.automation_engine.deactivate()
+        if metrics_service.metrics_syncer:
+            metrics_service.metrics_syncer.stop()
+        if campaign_service.asset_renderer:
+            campaign_service.asset_renderer.stop()
+        if outbox_service.outbox_sender:
+            outbox_service.outbox_sender.stop()
+
+    elector = LeaderElector(app, on_elected, on_demoted)
+    atexit.register(elector.stop)
+    if LEADER_ELECTION_AUTOSTART:
+        elector.ensure_started()
+
+    @app.before_request
+    def _start_campaigning():
+        # Forked workers (gunicorn --preload) and non-autostarted processes start here
+        elector.ensure_started()
+
+    return elector
@@ -0,0 +1,274 @@
+"""
+Engagement Metrics Sync
+Pulls analytics for published posts from Ayrshare and stores them as a compact
+time series (post_metric: one row of counters per post per sync) plus the latest
+counters on published_post, which the learned peak hours are built from.
+
+Ayrshare's post analytics endpoint takes a single post id, so a batch is a
+per-post fan-out: one call per Ayrshare post (its platforms share the call),
+at most METRICS_SYNC_CONCURRENCY in flight, with the results stored in one
+bulk INSERT. Batching bounds the calls per pass - it does not merge them.
+
+Every provider account keeps a cursor in metrics_sync_cursor. A pass continues
+after the last post it handled, so the work per pass is bounded, and wraps
+around once it reaches the newest post. Posts are re-measured every
+METRICS_SYNC_INTERVAL_HOURS for METRICS_SYNC_WINDOW_DAYS after publishing.
+Only the leader runs the syncer (see leader_service).
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import requests
+from sqlalchemy import insert, or_, select, update
+from models import db, PublishedPost, PostMetric, MetricsSyncCursor
+
+load_dotenv()
+
+METRICS_SYNC_ENABLED = os.getenv('METRICS_SYNC_ENABLED', 'true').lower() == 'true'
+METRICS_SYNC_SECONDS = int(os.getenv('METRICS_SYNC_SECONDS', 900))
+METRICS_SYNC_BATCH_SIZE = int(os.getenv('METRICS_SYNC_BATCH_SIZE', 100))
+METRICS_SYNC_CONCURRENCY = int(os.getenv('METRICS_SYNC_CONCURRENCY', 4))
+METRICS_SYNC_INTERVAL_HOURS = float(os.getenv('METRICS_SYNC_INTERVAL_HOURS', 6))
+METRICS_SYNC_WINDOW_DAYS = int(os.getenv('METRICS_SYNC_WINDOW_DAYS', 30))
+
+# Cursor name of the Ayrshare account behind AYRSHARE_API_KEY
+AYRSHARE_ACCOUNT = 'ayrshare'
+# Batches per syncer run, so one run can't monopolise the API quota
+MAX_BATCHES_PER_RUN = 10
+REQUEST_TIMEOUT = 30
+
+# Counter -> analytics keys the platforms report it under, first match wins
+METRIC_KEYS = {
+    'impressions': ('impressionCount', 'impressionsCount', 'impressions', 'impressionsUnique', 'viewCount', 'views'),
+    'likes': ('likeCount', 'likesCount', 'likes', 'favoriteCount', 'reactions'),
+    'shares': ('shareCount', 'sharesCount', 'shares', 'retweetCount', 'repostCount'),
+    'clicks': ('clickCount', 'clicksCount', 'clicks', 'urlLinkClicks', 'linkClicks', 'clicksUnique'),
+}
+
+
+def extract_metrics(analytics):
+    """Map one platform's analytics block onto impressions/likes/shares/clicks"""
+    metrics = {}
+    for metric, keys in METRIC_KEYS.items():
+        value = 0
+        for key in keys:
+            if analytics.get(key) is not None:
+                value = analytics[key]
+                break
+        if isinstance(value, dict):
+            # Facebook reports reactions per type plus a total
+            value = value.get('total', sum(v for v in value.values() if isinstance(v, (int, float))))
+        try:
+            metrics[metric] = max(int(value), 0)
+        except (TypeError, ValueError):
+            metrics[metric] = 0
+    return metrics
+
+
+def fetch_post_analytics(session, base_url, provider_post_id, platforms):
+    """One Ayrshare analytics call for every platform of a post. Returns (status code, body or error)."""
+    try:
+        response = session.post(
+            f'{base_url}/analytics/post',
+            json={'id': provider_post_id, 'platforms': platforms},
+            timeout=REQUEST_TIMEOUT
+        )
+    except requests.RequestException as e:
+        return None, str(e)
+    try:
+        body = response.json()
+    except ValueError:
+        body = {'message': response.text[:200]}
+    if response.status_code == 429:
+        body = {**body, 'retry_after': response.headers.get('Retry-After')} if isinstance(body, dict) else body
+    return response.status_code, body
+
+
+def _due_posts(cursor, batch_size, now):
+    table = PublishedPost.__table__
+    return db.session.execute(
+        select(table.c.id, table.c.provider_post_id, table.c.platform).where(
+            table.c.provider == 'ayrshare',
+            table.c.provider_post_id.isnot(None),
+            table.c.id > cursor.position,
+            table.c.published_at >= now - timedelta(days=METRICS_SYNC_WINDOW_DAYS),
+            or_(table.c.metrics_checked_at.is_(None),
+                table.c.metrics_checked_at < now - timedelta(hours=METRICS_SYNC_INTERVAL_HOURS))
+        ).order_by(table.c.id).limit(batch_size)
+    ).all()
+
+
+def sync_batch(account=AYRSHARE_ACCOUNT, batch_size=METRICS_SYNC_BATCH_SIZE, now=None):
+    """
+    Measure the next batch of due posts after the account's cursor - one analytics
+    call per Ayrshare post, fanned out over METRICS_SYNC_CONCURRENCY threads - and
+    store the results in one transaction. Returns a summary; 'done' is True once the cursor wrapped.
+    """
+    from scheduler_service import AYRSHARE_API_KEY, AYRSHARE_BASE_URL
+
+    if not AYRSHARE_API_KEY:
+        return {'success': False, 'error': 'Ayrshare API key not configured', 'done': True}
+
+    now = now or datetime.utcnow()
+    cursor = db.session.get(MetricsSyncCursor, account)
+    if cursor is None:
+        cursor = MetricsSyncCursor(account=account, position=0, laps=0)
+        db.session.add(cursor)
+
+    posts = _due_posts(cursor, batch_size, now)
+    # Don't hold a transaction open across the API calls
+    db.session.commit()
+    # Platforms of one Ayrshare post share a single analytics call
+    groups = {}
+    for post in posts:
+        groups.setdefault(post.provider_post_id, []).append(post)
+
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=METRICS_SYNC_CONCURRENCY) as pool:
+        session.headers['Authorization'] = f'Bearer {AYRSHARE_API_KEY}'
+        responses = dict(zip(groups, pool.map(
+            lambda item: fetch_post_analytics(session, AYRSHARE_BASE_URL, item[0], sorted({p.platform for p in item[1]})),
+            groups.items()
+        )))
+
+    samples, latest, checked = [], [], []
+    held_at, retry_after, error = None, None, None
+    for provider_post_id, group in groups.items():
+        status, body = responses[provider_post_id]
+        if status is None or status == 429:
+            # Transient: hold the cursor before this post and try again next run
+            held_at = min(held_at or group[0].id, group[0].id)
+            error = body if status is None else 'Rate limited by Ayrshare'
+            if status == 429 and isinstance(body, dict) and str(body.get('retry_after') or '').isdigit():
+                retry_after = max(retry_after or 0, int(body['retry_after']))
+            continue
+        if status != 200 or not isinstance(body, dict):
+            # Deleted posts, platform errors... try again after the sync interval
+            checked.extend({'id': post.id, 'metrics_checked_at': now} for post in group)
+            error = body.get('message', str(body)) if isinstance(body, dict) else str(body)
+            continue
+        for post in group:
+            analytics = (body.get(post.platform) or {}).get('analytics')
+            if not isinstance(analytics, dict):
+                checked.append({'id': post.id, 'metrics_checked_at': now})
+                continue
+            metrics = extract_metrics(analytics)
+            samples.append({'published_post_id': post.id, 'captured_at': now, **metrics})
+            latest.append({'id': post.id, 'metrics_updated_at': now, 'metrics_checked_at': now,
+                           'updated_at': now, **metrics})
+
+    if samples:
+        db.session.execute(insert(PostMetric), samples)
+        db.session.execute(update(PublishedPost), latest)
+    if checked:
+        db.session.execute(update(PublishedPost), checked)
+
+    # Posts answered beyond a held post are skipped next time by the interval filter
+    done = held_at is None and len(posts) < batch_size
+    if held_at is not None:
+        cursor.position = held_at - 1
+    elif done:
+        cursor.position = 0
+        cursor.laps += 1
+        cursor.last_lap_at = now
+    else:
+        cursor.position = posts[-1].id
+    cursor.last_synced_at = now
+    cursor.last_error = error
+    db.session.commit()
+
+    return {
+        'success': held_at is None,
+        'posts': len(posts),
+        'measured': len(samples),
+        'failed': len(checked),
+        'position': cursor.position,
+        'done': done or held_at is not None,
+        'retry_after': retry_after,
+        'error': error
+    }
+
+
+def sync_metrics(account=AYRSHARE_ACCOUNT, max_batches=MAX_BATCHES_PER_RUN):
+    """Run batches until every due post is measured, the API pushes back or max_batches is reached"""
+    totals = {'success': True, 'batches': 0, 'posts': 0, 'measured': 0, 'failed': 0, 'retry_after': None}
+    for _ in range(max_batches):
+        result = sync_batch(account)
+        totals['batches'] += 1
+        for key in ('posts', 'measured', 'failed'):
+            totals[key] += result.get(key, 0)
+        if not result['success']:
+            totals.update(success=False, error=result['error'], retry_after=result.get('retry_after'))
+        if result['done']:
+            break
+    if totals['measured'] or totals['failed']:
+        print(f"📊 Engagement sync ({account}): {totals['measured']} measured, {totals['failed']} failed "
+              f"in {totals['batches']} batch(es)")
+    return totals
+
+
+def get_engagement(business_id, days=30, limit=100):
+    """A business's recently published posts with their latest counters, newest first"""
+    posts = PublishedPost.query.filter(
+        PublishedPost.business_id == business_id,
+        PublishedPost.published_at >= datetime.utcnow() - timedelta(days=days)
+    ).order_by(PublishedPost.published_at.desc()).limit(limit).all()
+    return [post.to_dict() for post in posts]
+
+
+def get_post_metrics(published_post_id):
+    """Time series of one published post, oldest first"""
+    samples = PostMetric.query.filter_by(published_post_id=published_post_id).order_by(PostMetric.captured_at).all()
+    return [sample.to_dict() for sample in samples]
+
+
+class MetricsSyncer:
+    """Background thread syncing engagement every METRICS_SYNC_SECONDS"""
+
+    def __init__(self, app, poll_seconds=METRICS_SYNC_SECONDS):
+        self.app = app
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='metrics-sync', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            wait = self.poll_seconds
+            with self.app.app_context():
+                try:
+                    result = sync_metrics()
+                    # Respect the provider's Retry-After when it is longer than our interval
+                    wait = max(wait, result.get('retry_after') or 0)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"❌ Engagement sync error: {e}")
+                finally:
+                    db.session.remove()
+            self._stop.wait(wait)
+
+
+metrics_syncer = None
+
+
+def init_metrics_sync(app):
+    """Create the syncer - started and stopped by leader election (leader_service)"""
+    global metrics_syncer
+    if METRICS_SYNC_ENABLED and metrics_syncer is None:
+        metrics_syncer = MetricsSyncer(app)
+    return metrics_syncer
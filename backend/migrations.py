@@ -0,0 +1,411 @@
+"""
+Versioned Schema Migrations
+Replaces the ad-hoc upgrade scripts and the create_all() call at import time.
+Each migration runs once, in its own transaction, and is recorded in the
+schema_migrations table together with how long it took.
+
+Run at deploy time (before starting gunicorn):
+    python migrations.py            # apply pending migrations
+    python migrations.py status     # list applied / pending migrations
+"""
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from sqlalchemy import bindparam, inspect, select, text, update
+from models import db
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    """Register a migration function(conn) under a version number"""
+    def decorator(fn):
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return decorator
+
+
+# ==================== HELPERS ====================
+
+def _column_names(conn, table):
+    return [col['name'] for col in inspect(conn).get_columns(table)]
+
+
+def _add_column_if_missing(conn, table, column, ddl_type):
+    if column not in _column_names(conn, table):
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl_type}'))
+        print(f"   + {table}.{column}")
+
+
+def _create_index(conn, name, table, columns):
+    conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({columns})'))
+    print(f"   + index {name}")
+
+
+def _backfill_updated_at_from_created_at(conn, condition):
+    """
+    updated_at (UTC) from created_at (server local time) for the rows matching `condition`.
+    Converted in Python so each row gets the UTC offset (DST included) it was created under.
+    """
+    from models import GeneratedContent
+
+    table = GeneratedContent.__table__
+    rows = conn.execute(select(table.c.id, table.c.created_at).where(condition)).all()
+    params = [{'row_id': row_id, 'utc': datetime.fromtimestamp(created_at.timestamp(), timezone.utc).replace(tzinfo=None)}
+              for row_id, created_at in rows if created_at is not None]
+    if params:
+        conn.execute(update(table).where(table.c.id == bindparam('row_id')).values(updated_at=bindparam('utc')), params)
+    return len(params)
+
+
+def _baseline_schema():
+    """
+    The schema as it was before migrations existed, frozen here rather than read from
+    models.py, so fresh databases run every later migration just like upgraded ones.
+    """
+    from sqlalchemy import (MetaData, Table, Column, Integer, String, Text, Float, DateTime,
+                            ForeignKey, JSON)
+    from sqlalchemy.dialects.postgresql import JSONB
+
+    json_type = JSON().with_variant(JSONB(), 'postgresql')
+    metadata = MetaData()
+    Table('user', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('username', String(80), unique=True, nullable=False),
+          Column('email', String(120), unique=True, nullable=False),
+          Column('password_hash', String(128)),
+          Column('full_name', String(120)),
+          Column('mobile', String(20)),
+          Column('bio', Text),
+          Column('company', String(100)),
+          Column('location', String(100)),
+          Column('created_at', DateTime),
+          Column('updated_at', DateTime))
+    Table('business_profile', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('name', String(100), nullable=False),
+          Column('description', Text),
+          Column('industry', String(50)),
+          Column('target_audience', String(100)),
+          Column('user_id', Integer, ForeignKey('user.id'), nullable=False))
+    Table('generated_content', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('platform', String(50), nullable=False),
+          Column('content', Text, nullable=False),
+          Column('image_url', String(500)),
+          Column('video_url', String(500)),
+          Column('audio_url', String(500)),
+          Column('model', String(50)),
+          Column('created_at', DateTime),
+          Column('business_id', Integer, ForeignKey('business_profile.id'), nullable=False))
+    Table('product', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('name', String(100), nullable=False),
+          Column('description', Text),
+          Column('offers', Text),
+          Column('price', Float),
+          Column('business_id', Integer, ForeignKey('business_profile.id'), nullable=False))
+    Table('campaign', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('title', String(100), nullable=False),
+          Column('description', Text),
+          Column('strategy', json_type, nullable=False),
+          Column('created_at', DateTime),
+          Column('business_id', Integer, ForeignKey('business_profile.id'), nullable=False))
+    Table('competitor_data', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('competitor_name', String(100), nullable=False),
+          Column('swot_analysis', json_type, nullable=False),
+          Column('latest_news', json_type),
+          Column('created_at', DateTime),
+          Column('business_id', Integer, ForeignKey('business_profile.id'), nullable=False))
+    Table('audio_file', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('filename', String(255), nullable=False),
+          Column('original_text', Text, nullable=False),
+          Column('created_at', DateTime),
+          Column('business_id', Integer, ForeignKey('business_profile.id')))
+    return metadata
+
+
+# ==================== MIGRATIONS ====================
+
+@migration(1, 'baseline_tables')
+def _baseline_tables(conn):
+    # Creates any missing baseline table (no-op on existing databases); later changes are later migrations
+    _baseline_schema().create_all(bind=conn)
+
+
+@migration(2, 'product_offers_column')
+def _product_offers_column(conn):
+    _add_column_if_missing(conn, 'product', 'offers', 'TEXT')
+
+
+@migration(3, 'user_profile_columns')
+def _user_profile_columns(conn):
+    for column, ddl_type in [
+        ('full_name', 'VARCHAR(120)'),
+        ('mobile', 'VARCHAR(20)'),
+        ('bio', 'TEXT'),
+        ('company', 'VARCHAR(100)'),
+        ('location', 'VARCHAR(100)'),
+        ('created_at', 'TIMESTAMP'),
+        ('updated_at', 'TIMESTAMP'),
+    ]:
+        _add_column_if_missing(conn, 'user', column, ddl_type)
+
+
+@migration(4, 'audio_file_optional_business')
+def _audio_file_optional_business(conn):
+    # SQLite can't ALTER COLUMN, so rebuild the table if business_id is still NOT NULL
+    if conn.dialect.name != 'sqlite':
+        return
+    columns = {row[1]: row for row in conn.execute(text('PRAGMA table_info(audio_file)'))}
+    if not columns or not columns['business_id'][3]:
+        return
+
+    conn.execute(text("""
+        CREATE TABLE audio_file_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename VARCHAR(255) NOT NULL,
+            original_text TEXT NOT NULL,
+            created_at DATETIME,
+            business_id INTEGER,
+            FOREIGN KEY (business_id) REFERENCES business_profile(id)
+        )
+    """))
+    conn.execute(text("""
+        INSERT INTO audio_file_new (id, filename, original_text, created_at, business_id)
+        SELECT id, filename, original_text, created_at, business_id FROM audio_file
+    """))
+    conn.execute(text('DROP TABLE audio_file'))
+    conn.execute(text('ALTER TABLE audio_file_new RENAME TO audio_file'))
+    print("   ~ audio_file.business_id is now nullable")
+
+
+@migration(5, 'hot_query_indexes')
+def _hot_query_indexes(conn):
+    # /content and /analytics/summary: newest-first content per business
+    _create_index(conn, 'ix_generated_content_business_created', 'generated_content', 'business_id, created_at DESC')
+    # Every ownership check and the /businesses list
+    _create_index(conn, 'ix_business_profile_user', 'business_profile', 'user_id')
+    _create_index(conn, 'ix_product_business', 'product', 'business_id')
+    _create_index(conn, 'ix_campaign_business_created', 'campaign', 'business_id, created_at')
+    _create_index(conn, 'ix_competitor_data_business_created', 'competitor_data', 'business_id, created_at')
+    _create_index(conn, 'ix_audio_file_business_created', 'audio_file', 'business_id, created_at')
+    # Refresh planner statistics so the new indexes get picked
+    conn.execute(text('ANALYZE'))
+
+
+@migration(6, 'content_platform_index')
+def _content_platform_index(conn):
+    # /content?platform=... filters within a business without scanning other platforms
+    _create_index(conn, 'ix_generated_content_business_platform_created', 'generated_content',
+                  'business_id, platform, created_at DESC')
+
+
+@migration(7, 'content_sync')
+def _content_sync(conn):
+    from models import ContentTombstone, GeneratedContent
+
+    _add_column_if_missing(conn, 'generated_content', 'updated_at', 'TIMESTAMP')
+    _backfill_updated_at_from_created_at(conn, GeneratedContent.__table__.c.updated_at.is_(None))
+    _create_index(conn, 'ix_generated_content_business_updated', 'generated_content', 'business_id, updated_at')
+    db.metadata.create_all(bind=conn, tables=[ContentTombstone.__table__])
+
+
+@migration(8, 'user_content_rollups')
+def _user_content_rollups(conn):
+    from models import UserContentStats, UserPlatformStats
+    from analytics_service import rebuild_user_stats
+
+    db.metadata.create_all(bind=conn, tables=[UserContentStats.__table__, UserPlatformStats.__table__])
+    rebuild_user_stats(conn)
+
+
+@migration(9, 'content_daily_rollups')
+def _content_daily_rollups(conn):
+    from models import ContentDailyStats
+    from analytics_service import rebuild_daily_stats
+
+    db.metadata.create_all(bind=conn, tables=[ContentDailyStats.__table__])
+    rebuild_daily_stats(conn)
+
+
+@migration(10, 'full_text_search')
+def _full_text_search(conn):
+    from search_service import create_search_index
+
+    if conn.dialect.name == 'sqlite':
+        create_search_index(conn)
+
+
+@migration(11, 'archive_tier')
+def _archive_tier(conn):
+    from models import ArchivedRecord
+
+    db.metadata.create_all(bind=conn, tables=[ArchivedRecord.__table__])
+
+
+@migration(12, 'postgres_search_indexes')
+def _postgres_search_indexes(conn):
+    from search_service import create_search_index
+
+    if conn.dialect.name == 'postgresql':
+        create_search_index(conn)
+
+
+@migration(13, 'scheduled_post_queue')
+def _scheduled_post_queue(conn):
+    from models import ScheduledPost
+
+    db.metadata.create_all(bind=conn, tables=[ScheduledPost.__table__])
+
+
+@migration(14, 'automation_jobs_and_leader_lease')
+def _automation_jobs_and_leader_lease(conn):
+    from models import AutomationJob, SchedulerLease
+
+    db.metadata.create_all(bind=conn, tables=[AutomationJob.__table__, SchedulerLease.__table__])
+
+
+@migration(15, 'published_post')
+def _published_post(conn):
+    from models import PublishedPost
+
+    db.metadata.create_all(bind=conn, tables=[PublishedPost.__table__])
+
+
+@migration(16, 'post_metrics_and_sync_cursor')
+def _post_metrics_and_sync_cursor(conn):
+    from models import PostMetric, MetricsSyncCursor
+
+    _add_column_if_missing(conn, 'published_post', 'metrics_checked_at', 'TIMESTAMP')
+    db.metadata.create_all(bind=conn, tables=[PostMetric.__table__, MetricsSyncCursor.__table__])
+
+
+@migration(17, 'campaign_posts_and_asset_rendering')
+def _campaign_posts_and_asset_rendering(conn):
+    json_type = 'JSONB' if conn.dialect.name == 'postgresql' else 'JSON'
+    for column, ddl_type in [
+        ('campaign_id', 'INTEGER'),
+        ('campaign_day', 'INTEGER'),
+        ('render_status', 'VARCHAR(20)'),
+        ('render_after', 'TIMESTAMP'),
+        ('render_spec', json_type),
+        ('assets', json_type),
+        ('render_attempts', 'INTEGER NOT NULL DEFAULT 0'),
+        ('render_claimed_at', 'TIMESTAMP'),
+        ('render_error', 'TEXT'),
+    ]:
+        _add_column_if_missing(conn, 'scheduled_post', column, ddl_type)
+    _create_index(conn, 'ix_scheduled_post_render', 'scheduled_post', 'render_status, render_after')
+    _create_index(conn, 'ix_scheduled_post_campaign', 'scheduled_post', 'campaign_id, campaign_day')
+
+
+@migration(18, 'staged_automation_posts')
+def _staged_automation_posts(conn):
+    _add_column_if_missing(conn, 'scheduled_post', 'source', 'VARCHAR(20)')
+    _add_column_if_missing(conn, 'scheduled_post', 'expires_at', 'TIMESTAMP')
+
+
+@migration(19, 'publish_outbox')
+def _publish_outbox(conn):
+    from models import PublishOutbox
+
+    db.metadata.create_all(bind=conn, tables=[PublishOutbox.__table__])
+
+
+@migration(20, 'campaign_search_values')
+def _campaign_search_values(conn):
+    from search_service import create_search_index, drop_campaign_search_index
+
+    # The campaign index covered the raw strategy JSON, keys included
+    drop_campaign_search_index(conn)
+    create_search_index(conn)
+
+
+@migration(21, 'publish_outbox_provider_post_id')
+def _publish_outbox_provider_post_id(conn):
+    _add_column_if_missing(conn, 'publish_outbox', 'provider_post_id', 'VARCHAR(100)')
+
+
+# ==================== RUNNER ====================
+
+def _ensure_migrations_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                applied_at TIMESTAMP NOT NULL,
+                duration_ms FLOAT NOT NULL
+            )
+        """))
+
+
+def get_applied_versions(engine):
+    _ensure_migrations_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text('SELECT version FROM schema_migrations'))}
+
+
+def get_pending_migrations(engine):
+    applied = get_applied_versions(engine)
+    return [(v, name, fn) for v, name, fn in sorted(MIGRATIONS, key=lambda m: m[0]) if v not in applied]
+
+
+def run_migrations(engine):
+    """Apply all pending migrations in version order. Returns [(version, name, duration_ms)]."""
+    results = []
+    for version, name, fn in get_pending_migrations(engine):
+        print(f"⏳ Applying migration {version:04d}_{name}...")
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            fn(conn)
+            duration_ms = (time.perf_counter() - started) * 1000
+            conn.execute(
+                text('INSERT INTO schema_migrations (version, name, applied_at, duration_ms) '
+                     'VALUES (:version, :name, :applied_at, :duration_ms)'),
+                {'version': version, 'name': name, 'applied_at': datetime.utcnow(), 'duration_ms': duration_ms}
+            )
+        print(f"✅ {version:04d}_{name} applied in {duration_ms:.1f} ms")
+        results.append((version, name, duration_ms))
+
+    if not results:
+        print("✅ Database schema is up to date")
+    return results
+
+
+def warn_if_pending(engine):
+    """Startup check - migrations are applied at deploy time, not on import"""
+    pending = get_pending_migrations(engine)
+    if pending:
+        names = ', '.join(f"{v:04d}_{name}" for v, name, _ in pending)
+        print(f"⚠️ {len(pending)} pending migration(s): {names}. Run 'python migrations.py'.")
+    return pending
+
+
+def print_status(engine):
+    _ensure_migrations_table(engine)
+    with engine.connect() as conn:
+        applied = {row[0]: row for row in conn.execute(
+            text('SELECT version, name, applied_at, duration_ms FROM schema_migrations'))}
+    for version, name, _ in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            row = applied[version]
+            print(f"  ✅ {version:04d}_{name}  applied {row[2]}  ({row[3]:.1f} ms)")
+        else:
+            print(f"  ⏳ {version:04d}_{name}  pending")
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('LEADER_ELECTION_AUTOSTART', 'false')  # one-off run: never lead
+    from app import app
+
+    with app.app_context():
+        if len(sys.argv) > 1 and sys.argv[1] == 'status':
+            print_status(db.engine)
+        else:
+            run_migrations(db.engine)
@@ -1,8 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy.dialects.postgresql import JSONB
+from datetime import datetime, timezone
 
 db = SQLAlchemy()
 
+# Plain JSON on SQLite, binary JSONB (comparable, indexable) on Postgres
+JSONType = db.JSON().with_variant(JSONB(), 'postgresql')
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -39,6 +43,8 @@ class BusinessProfile(db.Model):
     target_audience = db.Column(db.String(100), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    __table_args__ = (db.Index('ix_business_profile_user', 'user_id'),)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -58,6 +64,8 @@ class GeneratedContent(db.Model):
     model = db.Column(db.String(50), nullable=True)  # Which AI model generated this
     # Use local timezone for proper display
     created_at = db.Column(db.DateTime, default=lambda: datetime.now())
+    # UTC change time, drives /content/sync
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=False)
 
 
@@ -71,10 +79,36 @@ class GeneratedContent(db.Model):
             'audio_url': self.audio_url,
             'model': self.model,
             'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'business_id': self.business_id
         }
 
 
+# History and analytics read newest-first per business
+db.Index('ix_generated_content_business_created', GeneratedContent.business_id, GeneratedContent.created_at.desc())
+db.Index('ix_generated_content_business_platform_created', GeneratedContent.business_id,
+         GeneratedContent.platform, GeneratedContent.created_at.desc())
+db.Index('ix_generated_content_business_updated', GeneratedContent.business_id, GeneratedContent.updated_at)
+
+
+class ContentTombstone(db.Model):
+    """Marker left behind by a deleted post so sync clients can drop it from their cache"""
+    id = db.Column(db.Integer, primary_key=True)
+    content_id = db.Column(db.Integer, nullable=False)
+    business_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (db.Index('ix_content_tombstone_user_deleted', 'user_id', 'deleted_at'),)
+
+    def to_dict(self):
+        return {
+            'id': self.content_id,
+            'business_id': self.business_id,
+            'deleted_at': self.deleted_at.isoformat()
+        }
+
+
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -83,6 +117,8 @@ class Product(db.Model):
     price = db.Column(db.Float, nullable=True)
     business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=False)
 
+    __table_args__ = (db.Index('ix_product_business', 'business_id'),)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -96,10 +132,12 @@ class Campaign(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    strategy = db.Column(db.JSON, nullable=False)  # 7-day plan
+    strategy = db.Column(JSONType, nullable=False)  # 7-day plan
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=False)
 
+    __table_args__ = (db.Index('ix_campaign_business_created', 'business_id', 'created_at'),)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -113,11 +151,13 @@ class Campaign(db.Model):
 class CompetitorData(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     competitor_name = db.Column(db.String(100), nullable=False)
-    swot_analysis = db.Column(db.JSON, nullable=False)
-    latest_news = db.Column(db.JSON, nullable=True)
+    swot_analysis = db.Column(JSONType, nullable=False)
+    latest_news = db.Column(JSONType, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=False)
 
+    __table_args__ = (db.Index('ix_competitor_data_business_created', 'business_id', 'created_at'),)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -135,6 +175,8 @@ class AudioFile(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=True)  # Made optional
 
+    __table_args__ = (db.Index('ix_audio_file_business_created', 'business_id', 'created_at'),)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -143,3 +185,270 @@ class AudioFile(db.Model):
             'created_at': self.created_at.isoformat(),
             'business_id': self.business_id
         }
+
+
+class UserContentStats(db.Model):
+    """Per-user content totals, maintained incrementally by analytics_service"""
+    user_id = db.Column(db.Integer, primary_key=True)
+    total_posts = db.Column(db.Integer, nullable=False, default=0)
+    with_images = db.Column(db.Integer, nullable=False, default=0)
+    with_videos = db.Column(db.Integer, nullable=False, default=0)
+    with_audio = db.Column(db.Integer, nullable=False, default=0)
+
+
+class UserPlatformStats(db.Model):
+    """Per-user post count for each platform, maintained incrementally by analytics_service"""
+    user_id = db.Column(db.Integer, primary_key=True)
+    platform = db.Column(db.String(50), primary_key=True)
+    posts = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ContentDailyStats(db.Model):
+    """Posts per business, day, platform and model - the source for analytics time series"""
+    business_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    platform = db.Column(db.String(50), primary_key=True)
+    model = db.Column(db.String(50), primary_key=True)  # 'unknown' when not recorded
+    posts = db.Column(db.Integer, nullable=False, default=0)
+    with_images = db.Column(db.Integer, nullable=False, default=0)
+    with_videos = db.Column(db.Integer, nullable=False, default=0)
+    with_audio = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.Index('ix_content_daily_stats_day', 'day'),)
+
+
+class ArchivedRecord(db.Model):
+    """Compressed copy of an old row moved out of its live table by archive_service"""
+    id = db.Column(db.Integer, primary_key=True)
+    source_table = db.Column(db.String(50), nullable=False)  # generated_content, campaign, competitor_data
+    record_id = db.Column(db.Integer, nullable=False)  # id the row had in its live table
+    business_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    codec = db.Column(db.String(10), nullable=False)  # zlib or zstd
+    payload = db.Column(db.LargeBinary, nullable=False)  # compressed JSON of the full row
+
+    __table_args__ = (
+        db.UniqueConstraint('source_table', 'record_id', name='uq_archived_record_source'),
+        db.Index('ix_archived_record_business_created', 'source_table', 'business_id', 'created_at'),
+    )
+
+
+class ScheduledPost(db.Model):
+    """A post waiting to be published - the durable queue shared by every worker"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=True)
+    content = db.Column(db.Text, nullable=False)
+    platforms = db.Column(JSONType, nullable=False)  # ['twitter', 'linkedin']
+    image_url = db.Column(db.String(500), nullable=True)
+    title = db.Column(db.String(200), nullable=True)  # Blog posts
+    due_at = db.Column(db.DateTime, nullable=False)  # UTC
+    # pending -> dispatching -> sent | failed | skipped (no longer fresh at dispatch)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    claimed_by = db.Column(db.String(100), nullable=True)  # host:pid of the dispatching worker
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    result = db.Column(JSONType, nullable=True)
+    # None = queued by a user, 'automation' = staged ahead of a peak slot by the automation engine
+    source = db.Column(db.String(20), nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)  # UTC - not published after this
+    # Campaign posts (campaign_service) - no FK, campaigns get archived
+    campaign_id = db.Column(db.Integer, nullable=True)
+    campaign_day = db.Column(db.Integer, nullable=True)
+    # Assets rendered ahead of the slot: None (nothing to render) | pending -> rendering -> ready | failed
+    render_status = db.Column(db.String(20), nullable=True)
+    render_after = db.Column(db.DateTime, nullable=True)  # UTC
+    render_spec = db.Column(JSONType, nullable=True)  # {'image_prompt', 'tts', 'video'}
+    assets = db.Column(JSONType, nullable=True)  # {'image_url', 'audio_url', 'video_url'}
+    render_attempts = db.Column(db.Integer, nullable=False, default=0)
+    render_claimed_at = db.Column(db.DateTime, nullable=True)
+    render_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_scheduled_post_status_due', 'status', 'due_at'),
+        db.Index('ix_scheduled_post_user_due', 'user_id', 'due_at'),
+        db.Index('ix_scheduled_post_render', 'render_status', 'render_after'),
+        db.Index('ix_scheduled_post_campaign', 'campaign_id', 'campaign_day'),
+    )
+
+    def to_dict(self):
+        # Due time is shown in server local time, like the rest of the scheduler
+        local_due = self.due_at.replace(tzinfo=timezone.utc).astimezone()
+        return {
+            'id': self.id,
+            'business_id': self.business_id,
+            'content': self.content[:100] + '...' if len(self.content) > 100 else self.content,
+            'platforms': self.platforms,
+            'image_url': self.image_url,
+            'scheduled_time': local_due.strftime('%Y-%m-%d %H:%M'),
+            'due_at': self.due_at.isoformat() + 'Z',
+            'status': self.status,
+            'attempts': self.attempts,
+            'sent_at': self.sent_at.isoformat() + 'Z' if self.sent_at else None,
+            'error': self.last_error,
+            'source': self.source,
+            'expires_at': self.expires_at.isoformat() + 'Z' if self.expires_at else None,
+            'campaign_id': self.campaign_id,
+            'campaign_day': self.campaign_day,
+            'render_status': self.render_status,
+            'assets': self.assets
+        }
+
+
+class AutomationJob(db.Model):
+    """Auto-posting settings for a business - run by whichever process holds the scheduler lease"""
+    business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), primary_key=True)
+    platforms = db.Column(JSONType, nullable=False)
+    interval_hours = db.Column(db.Float, nullable=False, default=4)
+    # Run times are server local time, like the peak hours they are planned from
+    next_run_at = db.Column(db.DateTime, nullable=True)
+    last_run_at = db.Column(db.DateTime, nullable=True)
+    runs = db.Column(db.Integer, nullable=False, default=0)
+    last_result = db.Column(JSONType, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'business_id': self.business_id,
+            'platforms': self.platforms,
+            'interval_hours': self.interval_hours,
+            'next_run': self.next_run_at.strftime('%Y-%m-%d %H:%M') if self.next_run_at else None,
+            'last_run': self.last_run_at.strftime('%Y-%m-%d %H:%M') if self.last_run_at else None,
+            'runs': self.runs,
+            'last_result': self.last_result
+        }
+
+
+class SchedulerLease(db.Model):
+    """Leader lease: the holder runs the automation engine and post dispatcher"""
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(100), nullable=True)  # host:pid
+    acquired_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False)  # UTC
+
+
+class PublishedPost(db.Model):
+    """One post live on one platform, with its latest engagement counters"""
+    id = db.Column(db.Integer, primary_key=True)
+    business_id = db.Column(db.Integer, db.ForeignKey('business_profile.id'), nullable=False)
+    scheduled_post_id = db.Column(db.Integer, nullable=True)  # Queue rows are purged, so no FK
+    platform = db.Column(db.String(50), nullable=False)
+    provider = db.Column(db.String(20), nullable=False)  # ayrshare | blogger
+    provider_post_id = db.Column(db.String(100), nullable=True)  # Id to fetch analytics with
+    platform_post_id = db.Column(db.String(100), nullable=True)
+    url = db.Column(db.String(500), nullable=True)
+    published_at = db.Column(db.DateTime, nullable=False)  # UTC
+    impressions = db.Column(db.Integer, nullable=False, default=0)
+    likes = db.Column(db.Integer, nullable=False, default=0)
+    shares = db.Column(db.Integer, nullable=False, default=0)
+    clicks = db.Column(db.Integer, nullable=False, default=0)
+    metrics_updated_at = db.Column(db.DateTime, nullable=True)  # Last successful measurement
+    metrics_checked_at = db.Column(db.DateTime, nullable=True)  # Last attempt the provider answered
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_published_post_business_platform', 'business_id', 'platform', 'published_at'),
+        # Peak-hour models refresh from the rows changed since their last pass
+        db.Index('ix_published_post_updated', 'updated_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'business_id': self.business_id,
+            'platform': self.platform,
+            'url': self.url,
+            'published_at': self.published_at.isoformat() + 'Z',
+            'impressions': self.impressions,
+            'likes': self.likes,
+            'shares': self.shares,
+            'clicks': self.clicks
+        }
+
+
+class PostMetric(db.Model):
+    """Engagement counters of a published post at one sync - a compact time series"""
+    published_post_id = db.Column(db.Integer, db.ForeignKey('published_post.id', ondelete='CASCADE'), primary_key=True)
+    captured_at = db.Column(db.DateTime, primary_key=True)  # UTC
+    impressions = db.Column(db.Integer, nullable=False, default=0)
+    likes = db.Column(db.Integer, nullable=False, default=0)
+    shares = db.Column(db.Integer, nullable=False, default=0)
+    clicks = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'captured_at': self.captured_at.isoformat() + 'Z',
+            'impressions': self.impressions,
+            'likes': self.likes,
+            'shares': self.shares,
+            'clicks': self.clicks
+        }
+
+
+class MetricsSyncCursor(db.Model):
+    """Where the engagement sync of a provider account continues from"""
+    account = db.Column(db.String(100), primary_key=True)
+    position = db.Column(db.Integer, nullable=False, default=0)  # Last published_post.id handled
+    laps = db.Column(db.Integer, nullable=False, default=0)  # Completed passes over every post
+    last_synced_at = db.Column(db.DateTime, nullable=True)
+    last_lap_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class PublishOutbox(db.Model):
+    """One publish of one piece of content to one platform - sent and retried by outbox_service"""
+    id = db.Column(db.Integer, primary_key=True)
+    # Per (content, platform): a retried publish finds its earlier row instead of posting again
+    idempotency_key = db.Column(db.String(200), nullable=False, unique=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    business_id = db.Column(db.Integer, nullable=True)
+    content_id = db.Column(db.Integer, nullable=True)  # generated_content.id - no FK, content gets deleted
+    platform = db.Column(db.String(50), nullable=False)
+    # Delivery path: 'publish_content' (social_service) or 'post_immediately' (scheduler_service)
+    via = db.Column(db.String(30), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    image_url = db.Column(db.String(500), nullable=True)
+    video_url = db.Column(db.String(500), nullable=True)
+    title = db.Column(db.String(200), nullable=True)
+    extra = db.Column(JSONType, nullable=True)  # Email recipient/subject
+    # pending -> sending -> sent | failed (pending again while retries are left)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # UTC
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    result = db.Column(JSONType, nullable=True)
+    # Ayrshare post id, from the answer or (after a lost answer) found in the post history
+    provider_post_id = db.Column(db.String(100), nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_publish_outbox_status_next', 'status', 'next_attempt_at'),
+        db.Index('ix_publish_outbox_user_created', 'user_id', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'platform': self.platform,
+            'content_id': self.content_id,
+            'content': self.content[:100] + '...' if len(self.content) > 100 else self.content,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() + 'Z' if self.status == 'pending' else None,
+            'sent_at': self.sent_at.isoformat() + 'Z' if self.sent_at else None,
+            'provider_post_id': self.provider_post_id,
+            'error': self.last_error,
+            'created_at': self.created_at.isoformat() + 'Z'
+        }
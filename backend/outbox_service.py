@@ -0,0 +1,423 @@
+"""
+Publish Outbox
+Every publish (publish_content via /publish, post_immediately for "post now" and
+the dispatcher) is first written to publish_outbox - in the same transaction as
+the content record it belongs to - and then sent. Each row is keyed by an
+idempotency key per (content, platform), so publishing the same thing again finds
+the earlier row: a post that already went out is reported, not sent twice. Without
+a caller key the content is the payload itself (text, media, title, email recipient
+and subject), so an edited post or another recipient is a new publish.
+
+Transient failures (timeouts, 5xx, rate limits) stay in the outbox and a
+background sender retries them with exponential backoff and jitter, up to
+OUTBOX_MAX_ATTEMPTS. If a retry is answered with Ayrshare's duplicate-content
+error (code 137), the row counts as sent only once the earlier attempt is found
+in the account's post history (its post id is recorded); otherwise it fails as
+possibly delivered. Brevo email and Blogger have no such check, so for them only failures
+that surely didn't go out (no connection, 429/503) are retried; a read timeout
+or a 5xx after the request was sent fails the row instead of sending it twice. Rows are claimed atomically, like scheduled posts. Only the leader runs
+the sender (see leader_service).
+"""
+import os
+import json
+import random
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import requests
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from models import db, PublishOutbox
+from rate_limit_service import publish_lane, BULK
+
+load_dotenv()
+
+OUTBOX_SENDER_ENABLED = os.getenv('OUTBOX_SENDER_ENABLED', 'true').lower() == 'true'
+OUTBOX_POLL_SECONDS = int(os.getenv('OUTBOX_POLL_SECONDS', 10))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 6))
+OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv('OUTBOX_BACKOFF_BASE_SECONDS', 30))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv('OUTBOX_BACKOFF_MAX_SECONDS', 3600))
+OUTBOX_STALE_SECONDS = int(os.getenv('OUTBOX_STALE_SECONDS', 300))
+# Finished rows (and so their idempotency keys) are kept this long - Ayrshare rejects
+# the same content as a duplicate for two days anyway
+OUTBOX_RETENTION_HOURS = int(os.getenv('OUTBOX_RETENTION_HOURS', 48))
+
+OUTBOX_BATCH_SIZE = 20
+PURGE_INTERVAL = timedelta(hours=1)
+# Ayrshare: "Duplicate or similar content posted within the same two day period"
+DUPLICATE_CONTENT_CODE = 137
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+# Answers that mean the request was not processed
+NOT_PROCESSED_STATUS_CODES = {408, 425, 429, 503}
+# Providers without a duplicate check (Brevo, Blogger) - a retry after a send that may
+# have gone through would post twice
+NO_DEDUPE_PLATFORMS = {'email', 'blog'}
+# Caller's retry hint while another worker is sending the same row
+IN_FLIGHT_RETRY_SECONDS = 10
+
+
+def payload_digest(content, image_url=None, video_url=None, title=None, extra=None):
+    """Hash of everything that is sent: text, media, title and extras (email recipient and subject)"""
+    payload = '\n'.join([content or '', image_url or '', video_url or '', title or '',
+                          json.dumps(extra or {}, sort_keys=True, default=str)])
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def payload_key(user_id, content, image_url=None, video_url=None, title=None, extra=None):
+    """Caller key of a post that has neither a key nor a content record: a hash of the post itself"""
+    return f'hash:{user_id}:{payload_digest(content, image_url, video_url, title, extra)}'
+
+
+def content_key(content_id, platform, digest):
+    """
+    Caller key a content record was first published under on a platform with this payload (its
+    payload key if the record was saved by that publish), else content:<id>:<digest>
+    """
+    suffix = f':{platform.lower()}'
+    first = db.session.query(PublishOutbox.idempotency_key).filter(
+        PublishOutbox.content_id == content_id, PublishOutbox.idempotency_key.like(f'%:{digest}{suffix}')
+    ).order_by(PublishOutbox.id).limit(1).scalar()
+    return first[:-len(suffix)] if first else f'content:{content_id}:{digest}'
+
+
+def idempotency_key(platform, key=None, content_id=None, user_id=None, content='', image_url=None,
+                    video_url=None, title=None, extra=None):
+    """
+    (content, platform) -> key. The content is the caller's key if it has one (an Idempotency-Key
+    header, a scheduled post), else the stored content record with a hash of what is sent,
+    else that hash alone.
+    """
+    if key:
+        scope = str(key)
+    elif content_id:
+        scope = f'content:{content_id}:{payload_digest(content, image_url, video_url, title, extra)}'
+    else:
+        scope = payload_key(user_id, content, image_url, video_url, title, extra)
+    return f'{scope}:{platform.lower()}'[:200]
+
+
+def enqueue(via, platform, content, image_url=None, video_url=None, title=None, extra=None,
+            key=None, content_id=None, user_id=None, business_id=None):
+    """
+    Add an outbox row to the session - or find the one with the same idempotency key.
+    Does not commit, so the row lands in the caller's transaction.
+    """
+    now = datetime.utcnow()
+    idem = idempotency_key(platform, key, content_id, user_id, content, image_url, video_url, title, extra)
+    dialect_insert = pg_insert if db.session.get_bind().dialect.name == 'postgresql' else sqlite_insert
+    db.session.execute(dialect_insert(PublishOutbox).values(
+        idempotency_key=idem, user_id=user_id, business_id=business_id, content_id=content_id,
+        platform=platform, via=via, content=content, image_url=image_url, video_url=video_url, title=title,
+        extra=extra, status='pending', attempts=0, next_attempt_at=now
+    ).on_conflict_do_nothing(index_elements=['idempotency_key']))
+    row = PublishOutbox.query.filter_by(idempotency_key=idem).one()
+    if row.status == 'failed':
+        # Publishing again after a permanent failure is a fresh start - nothing went out
+        row.status, row.attempts, row.next_attempt_at, row.last_error = 'pending', 0, now, None
+    return row
+
+
+def _claim(row_id, now):
+    table = PublishOutbox.__table__
+    claimed = db.session.execute(
+        update(table).where(table.c.id == row_id, table.c.status == 'pending')
+        .values(status='sending', claimed_at=now, attempts=table.c.attempts + 1, updated_at=now)
+    ).rowcount
+    db.session.commit()
+    return claimed == 1
+
+
+def claim_due_rows(limit=OUTBOX_BATCH_SIZE, now=None):
+    """Atomically mark up to `limit` rows whose retry is due as sending. Returns their ids."""
+    table = PublishOutbox.__table__
+    now = now or datetime.utcnow()
+
+    due = select(table.c.id).where(
+        table.c.status == 'pending', table.c.next_attempt_at <= now
+    ).order_by(table.c.next_attempt_at).limit(limit)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        due = due.with_for_update(skip_locked=True)
+
+    claimed = db.session.execute(
+        update(table)
+        .where(table.c.id.in_(due.scalar_subquery()), table.c.status == 'pending')
+        .values(status='sending', claimed_at=now, attempts=table.c.attempts + 1, updated_at=now)
+        .returning(table.c.id)
+    ).scalars().all()
+    db.session.commit()
+    return claimed
+
+
+def release_stale_claims(now=None):
+    """Rows left 'sending' by a worker that died are retried (a 137 on the retry means it got through)"""
+    table = PublishOutbox.__table__
+    now = now or datetime.utcnow()
+    released = db.session.execute(
+        update(table)
+        .where(table.c.status == 'sending', table.c.claimed_at < now - timedelta(seconds=OUTBOX_STALE_SECONDS))
+        .values(status='pending', claimed_at=None, next_attempt_at=now, updated_at=now)
+    ).rowcount
+    db.session.commit()
+    if released:
+        print(f"⚠️ Released {released} stale publish outbox claim(s)")
+    return released
+
+
+def cancel_pending(key):
+    """Give up on the retries of everything published under a caller key (e.g. a skipped scheduled post)"""
+    table = PublishOutbox.__table__
+    cancelled = db.session.execute(
+        update(table).where(table.c.idempotency_key.like(f'{key}:%'), table.c.status == 'pending')
+        .values(status='failed', last_error='Cancelled', updated_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return cancelled
+
+
+def maybe_delivered(error):
+    """Could the provider have received the request before `error`? Not if no connection was made."""
+    if isinstance(error, requests.ConnectTimeout):
+        return False
+    if isinstance(error, requests.ConnectionError):
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return not isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+    return True
+
+
+def _deliver(row):
+    """The provider call itself"""
+    try:
+        if row.via == 'publish_content':
+            from social_service import publish_content
+            return publish_content(row.platform, row.content, row.image_url, row.video_url, row.extra)
+        from scheduler_service import post_to_platform
+        return post_to_platform(row.platform, row.content, row.image_url, row.title)
+    except Exception as e:
+        return {'success': False, 'error': str(e), 'transient': True, 'maybe_delivered': maybe_delivered(e)}
+
+
+def classify(row, result):
+    """
+    'sent', 'retry', 'failed', 'unconfirmed' (may have gone out, not retried) or 'duplicate'
+    (a retry Ayrshare rejected as a duplicate - maybe of the earlier attempt) for a delivery result
+    """
+    if result.get('success'):
+        return 'sent'
+    if result.get('code') == DUPLICATE_CONTENT_CODE:
+        return 'duplicate' if row.attempts > 1 else 'failed'
+    status_code = result.get('status_code') or 0
+    if row.platform.lower() in NO_DEDUPE_PLATFORMS:
+        # Nothing would catch a second copy: retry only what surely didn't go out
+        if result.get('rate_limited') or status_code in NOT_PROCESSED_STATUS_CODES \
+                or (result.get('transient') and not result.get('maybe_delivered', True)):
+            return 'retry'
+        return 'unconfirmed' if result.get('transient') or status_code >= 500 else 'failed'
+    if result.get('rate_limited') or result.get('transient') or status_code in TRANSIENT_STATUS_CODES \
+            or status_code >= 500:
+        return 'retry'
+    return 'failed'
+
+
+def backoff_seconds(attempts):
+    """Exponential backoff with jitter: half the step fixed, half random, so retries spread out"""
+    step = min(OUTBOX_BACKOFF_MAX_SECONDS, OUTBOX_BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+    return step / 2 + random.uniform(0, step / 2)
+
+
+def _error_message(result):
+    from ai_model_router import ERROR_TRANSLATIONS, translate_error
+
+    code = result.get('code')
+    return translate_error(code) if code in ERROR_TRANSLATIONS else (result.get('error') or 'Publish failed')
+
+
+def _confirm_earlier_attempt(row):
+    """Id of the post an earlier attempt of the row published, from the Ayrshare post history"""
+    if row.provider_post_id:
+        return row.provider_post_id
+    from social_service import find_ayrshare_post
+    return find_ayrshare_post(row.platform, row.content, row.created_at)
+
+
+def send_row(row_id):
+    """Deliver a claimed ('sending') row and record the outcome. Returns the caller's result."""
+    row = db.session.get(PublishOutbox, row_id)
+    result = _deliver(row)
+    outcome = classify(row, result)
+    if outcome == 'sent':
+        data = result.get('data') if isinstance(result.get('data'), dict) else {}
+        post_id = result.get('id') or data.get('id')
+        row.provider_post_id = str(post_id)[:100] if post_id else row.provider_post_id
+    elif outcome == 'duplicate':
+        # The earlier attempt's answer never arrived - it counts only if its post can be found
+        row.provider_post_id = _confirm_earlier_attempt(row)
+        outcome = 'sent' if row.provider_post_id else 'unconfirmed'
+        if outcome == 'sent':
+            print(f"ℹ️ Outbox {row.id} ({row.platform}): duplicate on retry - the earlier attempt went out as {row.provider_post_id}")
+            result = {'success': True, 'duplicate': True, 'platform': row.platform, 'id': row.provider_post_id}
+    now = datetime.utcnow()
+
+    row.claimed_at = None
+    row.updated_at = now
+    if outcome == 'sent':
+        row.status, row.sent_at, row.result, row.last_error = 'sent', now, result, None
+    elif outcome == 'retry' and row.attempts < OUTBOX_MAX_ATTEMPTS:
+        delay = result.get('retry_after') if result.get('rate_limited') else backoff_seconds(row.attempts)
+        row.status, row.next_attempt_at, row.last_error = 'pending', now + timedelta(seconds=delay), result.get('error')
+        print(f"🔁 Outbox {row.id} ({row.platform}) attempt {row.attempts} failed, retrying in {delay:.0f}s: {row.last_error}")
+    else:
+        row.status, row.last_error, row.result = 'failed', _error_message(result), result
+        if outcome == 'unconfirmed':
+            row.last_error += ' - it may have been delivered, so it was not retried; check before publishing again'
+        print(f"❌ Outbox {row.id} ({row.platform}) failed after {row.attempts} attempt(s): {row.last_error}")
+    db.session.commit()
+    return caller_result(row, result)
+
+
+def caller_result(row, result=None):
+    """What publish() returns for the row's current state"""
+    if row.status == 'sent':
+        stored = dict(row.result or {'success': True})
+        if result is None:
+            stored['already_sent'] = True
+        return {**stored, 'outbox_id': row.id}
+    if row.status == 'failed':
+        return {'success': False, 'error': row.last_error, 'code': (row.result or {}).get('code'), 'outbox_id': row.id}
+
+    # Still in the outbox: the sender retries it, the caller only needs to know when
+    if row.status == 'sending':
+        retry_after = IN_FLIGHT_RETRY_SECONDS
+    else:
+        retry_after = max(int((row.next_attempt_at - datetime.utcnow()).total_seconds() + 0.999), 1)
+    queued = {'success': False, 'queued': True, 'outbox_id': row.id, 'retry_after': retry_after,
+              'error': row.last_error or 'Publish in progress'}
+    if result and result.get('rate_limited'):
+        queued['rate_limited'] = True
+    return queued
+
+
+def publish(via, platform, content, image_url=None, video_url=None, title=None, extra=None,
+            key=None, content_id=None, user_id=None, business_id=None):
+    """
+    Publish through the outbox: write the row (committing whatever the caller added to the
+    session with it, e.g. the content record), then send it right away in the current lane.
+    A key that was already sent returns the stored result without calling the provider again.
+    """
+    row = enqueue(via, platform, content, image_url, video_url, title, extra,
+                  key, content_id, user_id, business_id)
+    db.session.commit()
+    if row.status == 'pending' and _claim(row.id, datetime.utcnow()):
+        return send_row(row.id)
+    db.session.refresh(row)
+    return caller_result(row)
+
+
+def send_due():
+    """Retry every row whose backoff has passed"""
+    release_stale_claims()
+    sent = 0
+    with publish_lane(BULK):
+        for row_id in claim_due_rows():
+            try:
+                sent += send_row(row_id).get('success', False)
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Outbox {row_id} send error: {e}")
+                table = PublishOutbox.__table__
+                db.session.execute(update(table).where(table.c.id == row_id).values(
+                    status='pending', claimed_at=None, last_error=str(e),
+                    next_attempt_at=datetime.utcnow() + timedelta(seconds=OUTBOX_BACKOFF_BASE_SECONDS)))
+                db.session.commit()
+    return sent
+
+
+def seconds_until_next_retry():
+    """Seconds until the earliest pending row is due (0 if overdue), None if there is none"""
+    next_at = db.session.query(db.func.min(PublishOutbox.next_attempt_at)).filter(
+        PublishOutbox.status == 'pending').scalar()
+    if next_at is None:
+        return None
+    return max((next_at - datetime.utcnow()).total_seconds(), 0)
+
+
+def purge_finished(hours=OUTBOX_RETENTION_HOURS):
+    """Delete sent/failed rows older than `hours` - their keys no longer dedupe after that"""
+    table = PublishOutbox.__table__
+    purged = db.session.execute(
+        delete(table).where(
+            table.c.status.in_(['sent', 'failed']),
+            table.c.updated_at < datetime.utcnow() - timedelta(hours=hours)
+        )
+    ).rowcount
+    db.session.commit()
+    if purged:
+        print(f"🧹 Purged {purged} finished publish outbox row(s)")
+    return purged
+
+
+class OutboxSender:
+    """Background thread retrying due outbox rows every OUTBOX_POLL_SECONDS (sooner if one is due)"""
+
+    def __init__(self, app, poll_seconds=OUTBOX_POLL_SECONDS):
+        self.app = app
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._last_purge = None
+
+    def ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='outbox-sender', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def run_once(self):
+        """One pass; returns seconds to wait before the next"""
+        send_due()
+        if not self._last_purge or datetime.utcnow() - self._last_purge > PURGE_INTERVAL:
+            purge_finished()
+            self._last_purge = datetime.utcnow()
+        next_due = seconds_until_next_retry()
+        return self.poll_seconds if next_due is None else min(self.poll_seconds, next_due)
+
+    def _run(self):
+        while not self._stop.is_set():
+            wait = self.poll_seconds
+            with self.app.app_context():
+                try:
+                    wait = self.run_once()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"❌ Outbox sender error: {e}")
+                finally:
+                    db.session.remove()
+            self._wake.wait(wait)
+            self._wake.clear()
+
+
+outbox_sender = None
+
+
+def init_outbox_sender(app):
+    """Create the sender - started and stopped by leader election (leader_service)"""
+    global outbox_sender
+    if OUTBOX_SENDER_ENABLED and outbox_sender is None:
+        outbox_sender = OutboxSender(app)
+    return outbox_sender
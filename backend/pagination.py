@@ -0,0 +1,93 @@
+"""
+Keyset Pagination Helpers
+Opaque cursors over (created_at, id) so history pages are served straight from
+the (business_id, created_at DESC) index instead of OFFSET scans
+"""
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at, row_id):
+    """Encode the last row's sort key as an opaque, URL-safe cursor"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor back into (created_at, id). Raises ValueError if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def encode_token(payload):
+    """Encode a small JSON-serializable dict as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Decode a cursor produced by encode_token. Raises ValueError if malformed."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parse a page size, clamped to [1, maximum]. Raises ValueError if not an integer."""
+    if value in (None, ''):
+        return default
+    return max(1, min(parse_id(value, 'limit'), maximum))
+
+
+def parse_id(value, name='id'):
+    """Parse an integer id from a query parameter or JSON body (None passes through)"""
+    if value in (None, ''):
+        return None
+    # JSON bodies can carry any type: only integers and integer strings are ids
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f'Invalid {name}: {value}')
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'Invalid {name}: {value}')
+
+
+def parse_datetime(value):
+    """
+    Parse an ISO date or datetime (None passes through). A value with an offset is
+    converted to naive server local time, the clock generated_content.created_at uses.
+    """
+    if value in (None, ''):
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'Invalid date: {value}')
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'Invalid date: {value}')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def keyset_filter(created_col, id_col, cursor):
+    """Rows strictly after the cursor in (created_at DESC, id DESC) order"""
+    created_at, row_id = decode_cursor(cursor)
+    return or_(created_col < created_at, and_(created_col == created_at, id_col < row_id))
+
+
+def keyset_after(ts_col, id_col, ts, row_id=None):
+    """Rows strictly after (ts, row_id) in ascending order; row_id=None means after ts entirely"""
+    if row_id is None:
+        return ts_col > ts
+    return or_(ts_col > ts, and_(ts_col == ts, id_col > row_id))
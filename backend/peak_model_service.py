@@ -0,0 +1,331 @@
+"""
+Learned Peak Hours
+Per-business, per-platform posting-time models. Each model is a 7x24 table
+(local weekday x hour) of expected engagement, aggregated from published_post
+with NumPy in one pass over every business: recency-weighted log engagement,
+smoothed into neighbouring hours and shrunk towards the configured peak hours
+where a business has little data. Each weekday's best hours are its peak slots.
+
+Models are kept in memory. A background thread in every process runs
+refresh_peak_models() every PEAK_MODEL_REFRESH_SECONDS on its own connection; it
+only rebuilds businesses whose posts changed since the last pass. Every model
+carries a next-peak-slot table, so lookups are in-memory reads that cost O(1)
+and never touch the database (or the caller's transaction). Businesses without
+engagement history use the configured hours (peak_hours_config.json).
+"""
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import func, select
+
+load_dotenv()
+
+PEAK_MODEL_REFRESH_SECONDS = int(os.getenv('PEAK_MODEL_REFRESH_SECONDS', 300))
+PEAK_MODEL_LOOKBACK_DAYS = int(os.getenv('PEAK_MODEL_LOOKBACK_DAYS', 180))
+PEAK_MODEL_HALF_LIFE_DAYS = float(os.getenv('PEAK_MODEL_HALF_LIFE_DAYS', 60))
+# How strongly the configured hours count, in posts per slot
+PEAK_MODEL_PRIOR_WEIGHT = float(os.getenv('PEAK_MODEL_PRIOR_WEIGHT', 2))
+
+SLOTS = 7 * 24
+WEEKDAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+# Peak hours for platforms without a configured list
+FALLBACK_PEAK_HOURS = [9, 12, 18]
+# Weights for the previous hour, the hour and the next hour (wraps Sunday night into Monday)
+SMOOTHING = (0.25, 0.5, 0.25)
+# Recency weights and the lookback window move with time, so rebuild everything daily
+FULL_REFRESH_INTERVAL = timedelta(hours=24)
+# Incremental passes re-read a little before the watermark to catch late commits
+WATERMARK_OVERLAP = timedelta(minutes=1)
+QUERY_CHUNK_SIZE = 500
+
+
+def slot_index(when):
+    return when.weekday() * 24 + when.hour
+
+
+class PeakModel:
+    """Peak slots of one business on one platform; slot = weekday * 24 + hour, local time"""
+    __slots__ = ('peak', 'next_offset', 'scores', 'posts')
+
+    def __init__(self, peak, next_offset, scores, posts=0):
+        self.peak = peak                # bool[168]
+        self.next_offset = next_offset  # uint8[168]: hours from each slot to the next peak slot
+        self.scores = scores            # float32[168]: smoothed expected engagement
+        self.posts = posts              # Posts the model was learned from (0 = configured hours)
+
+    @property
+    def learned(self):
+        return self.posts > 0
+
+    def is_peak(self, when):
+        return bool(self.peak[slot_index(when)])
+
+    def next_slot(self, after):
+        """Earliest time >= after inside a peak slot (after itself if it already is)"""
+        offset = int(self.next_offset[slot_index(after)])
+        if offset == 0:
+            return after
+        return after.replace(minute=0, second=0, microsecond=0) + timedelta(hours=offset)
+
+    def peak_hours_by_day(self):
+        table = self.peak.reshape(7, 24)
+        return {day: np.flatnonzero(table[i]).tolist() for i, day in enumerate(WEEKDAYS)}
+
+
+def _smooth(values):
+    before, here, after = SMOOTHING
+    return before * np.roll(values, 1, axis=1) + here * values + after * np.roll(values, -1, axis=1)
+
+
+def _prior(config, platform):
+    """(168 row with 1 in every configured peak hour, number of peak hours per day)"""
+    hours = sorted({h for h in config.get(platform) or [] if 0 <= h <= 23}) or FALLBACK_PEAK_HOURS
+    day = np.zeros(24)
+    day[hours] = 1
+    return np.tile(day, 7), len(hours)
+
+
+def build_models(pair_platforms, pair_index, slots, values, weights, config):
+    """
+    Build a model for every (business, platform) pair at once.
+    pair_platforms has one entry per pair; pair_index, slots, values and weights
+    have one entry per post. Returns one PeakModel per pair.
+    """
+    n = len(pair_platforms)
+    if n == 0:
+        return []
+
+    flat = pair_index * SLOTS + slots
+    engagement = np.bincount(flat, weights=values * weights, minlength=n * SLOTS).reshape(n, SLOTS)
+    weight = np.bincount(flat, weights=weights, minlength=n * SLOTS).reshape(n, SLOTS)
+    posts = np.bincount(pair_index, minlength=n)
+    engagement, weight = _smooth(engagement), _smooth(weight)
+
+    priors = {platform: _prior(config, platform) for platform in set(pair_platforms)}
+    prior = np.stack([priors[platform][0] for platform in pair_platforms])
+    per_day = np.array([priors[platform][1] for platform in pair_platforms])
+
+    # Slots without data fall back to the configured hours at the pair's average engagement
+    total = weight.sum(axis=1)
+    level = np.divide(engagement.sum(axis=1), total, out=np.ones(n), where=total > 0)
+    level = np.maximum(level, 1e-6)
+    scores = (engagement + PEAK_MODEL_PRIOR_WEIGHT * level[:, None] * prior) / (weight + PEAK_MODEL_PRIOR_WEIGHT)
+
+    # Each weekday keeps as many peak hours as the platform has configured
+    daily = scores.reshape(n, 7, 24)
+    rank = np.argsort(np.argsort(-daily, axis=2, kind='stable'), axis=2, kind='stable')
+    peak = (rank < per_day[:, None, None]).reshape(n, SLOTS)
+
+    # Distance to the next peak slot, wrapping from Sunday into Monday
+    position = np.where(np.concatenate([peak, peak], axis=1), np.arange(2 * SLOTS), 2 * SLOTS)
+    following = np.minimum.accumulate(position[:, ::-1], axis=1)[:, ::-1][:, :SLOTS]
+    next_offset = (following - np.arange(SLOTS)).astype(np.uint8)
+
+    scores = scores.astype(np.float32)
+    return [PeakModel(peak[i].copy(), next_offset[i].copy(), scores[i].copy(), int(posts[i])) for i in range(n)]
+
+
+_models = {}    # (business_id, platform) -> model learned from engagement data
+_defaults = {}  # platform -> model of the configured hours
+_state = {'config': None, 'default_config': None, 'watermark': None, 'refreshed_at': None, 'full_at': None}
+_refresh_lock = threading.Lock()
+_defaults_lock = threading.Lock()
+
+
+def _load_posts(conn, since, business_ids=None):
+    from models import PublishedPost
+
+    table = PublishedPost.__table__
+    query = select(table.c.business_id, table.c.platform, table.c.published_at,
+                   table.c.likes, table.c.shares, table.c.clicks).where(
+        table.c.published_at >= since,
+        table.c.metrics_updated_at.isnot(None)  # Not yet measured is not the same as no engagement
+    )
+    if business_ids is None:
+        return conn.execute(query).all()
+    business_ids = sorted(business_ids)
+    rows = []
+    for start in range(0, len(business_ids), QUERY_CHUNK_SIZE):
+        chunk = business_ids[start:start + QUERY_CHUNK_SIZE]
+        rows.extend(conn.execute(query.where(table.c.business_id.in_(chunk))).all())
+    return rows
+
+
+def _models_from_rows(rows, config, now):
+    """Group post rows by (business, platform) and build their models"""
+    pairs = {}
+    pair_index, slots, interactions, published = [], [], [], []
+    for business_id, platform, published_at, likes, shares, clicks in rows:
+        pair_index.append(pairs.setdefault((business_id, platform.lower()), len(pairs)))
+        # published_at is UTC; peak hours are server local time
+        slots.append(slot_index(published_at.replace(tzinfo=timezone.utc).astimezone()))
+        interactions.append(likes + 2 * shares + clicks)
+        published.append(published_at)
+
+    age_days = (np.datetime64(now) - np.array(published, dtype='datetime64[s]')) / np.timedelta64(1, 'D')
+    weights = 0.5 ** (np.maximum(age_days, 0) / PEAK_MODEL_HALF_LIFE_DAYS)
+    # log1p keeps one viral post from defining the whole week
+    values = np.log1p(np.array(interactions, dtype=float))
+
+    models = build_models([platform for _, platform in pairs], np.array(pair_index, dtype=np.int64),
+                          np.array(slots, dtype=np.int64), values, weights, config)
+    return dict(zip(pairs, models))
+
+
+def refresh_peak_models(force=False):
+    """
+    Rebuild the models whose engagement data changed (needs an app context). Reads on its
+    own connection, so it never commits or rolls back anyone's session.
+    Runs at most every PEAK_MODEL_REFRESH_SECONDS unless forced. Returns the number of models rebuilt.
+    """
+    global _models
+    from models import db, PublishedPost
+    import scheduler_service
+
+    now = datetime.utcnow()
+    refreshed_at = _state['refreshed_at']
+    if not force and refreshed_at and now - refreshed_at < timedelta(seconds=PEAK_MODEL_REFRESH_SECONDS):
+        return 0
+    if not _refresh_lock.acquire(blocking=False):
+        return 0  # Another thread is already refreshing
+
+    try:
+        table = PublishedPost.__table__
+        config = scheduler_service.load_peak_hours()
+        full = (force or config != _state['config'] or _state['watermark'] is None
+                or now - _state['full_at'] > FULL_REFRESH_INTERVAL)
+        with db.engine.connect() as conn:
+            # Read the watermark first so rows written during the rebuild are seen next time
+            watermark = conn.execute(select(func.max(table.c.updated_at))).scalar()
+            since = now - timedelta(days=PEAK_MODEL_LOOKBACK_DAYS)
+
+            if full:
+                models = _models_from_rows(_load_posts(conn, since), config, now)
+                _models = models
+                _state.update(config=config, full_at=now)
+            elif watermark is not None and watermark != _state['watermark']:
+                changed = set(conn.execute(
+                    select(table.c.business_id).distinct()
+                    .where(table.c.updated_at > _state['watermark'] - WATERMARK_OVERLAP)
+                ).scalars())
+                models = _models_from_rows(_load_posts(conn, since, changed), config, now)
+                merged = {key: model for key, model in _models.items() if key[0] not in changed}
+                merged.update(models)
+                _models = merged
+            else:
+                models = {}
+
+        _state.update(watermark=watermark, refreshed_at=now)
+        if models:
+            print(f"📈 Rebuilt {len(models)} peak-hour model(s) ({'full' if full else 'incremental'})")
+        return len(models)
+    except Exception as e:
+        # Retry on the next pass instead of hammering a failing database
+        _state['refreshed_at'] = now
+        print(f"⚠️ Peak-hour model refresh failed: {e}")
+        return 0
+    finally:
+        _refresh_lock.release()
+
+
+class PeakModelRefresher:
+    """Background thread refreshing this process's models every PEAK_MODEL_REFRESH_SECONDS"""
+
+    def __init__(self, app, interval=PEAK_MODEL_REFRESH_SECONDS):
+        self.app = app
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='peak-model-refresher', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                refresh_peak_models()
+            self._stop.wait(max(self.interval, 1))
+
+
+peak_model_refresher = None
+
+
+def init_peak_models(app):
+    """Every process keeps its own models fresh - started lazily so each gunicorn worker gets its thread after fork"""
+    global peak_model_refresher
+    if peak_model_refresher is None:
+        peak_model_refresher = PeakModelRefresher(app)
+
+        @app.before_request
+        def _start_peak_model_refresher():
+            peak_model_refresher.ensure_started()
+    return peak_model_refresher
+
+
+def _default_model(platform):
+    import scheduler_service
+
+    config = scheduler_service.load_peak_hours()
+    if config is not _state['default_config']:
+        with _defaults_lock:
+            _defaults.clear()
+            _state['default_config'] = config
+    model = _defaults.get(platform)
+    if model is None:
+        empty = np.zeros(0, dtype=np.int64)
+        model = _defaults[platform] = build_models([platform], empty, empty, np.zeros(0), np.zeros(0), config)[0]
+    return model
+
+
+def get_peak_model(business_id, platform):
+    """The business's learned model for a platform, else the configured hours (in memory, no database)"""
+    platform = platform.lower()
+    model = _models.get((business_id, platform)) if business_id else None
+    return model or _default_model(platform)
+
+
+def next_peak_slot(platforms, after, business_id=None):
+    """
+    Earliest time >= after that falls in a peak slot of any of the platforms
+    (after itself if it is already inside one). Local time, like the peak hours.
+    """
+    return min(get_peak_model(business_id, platform).next_slot(after) for platform in platforms or ['default'])
+
+
+def is_peak_slot(platform, when, business_id=None):
+    return get_peak_model(business_id, platform).is_peak(when)
+
+
+def describe_peak_models(business_id, platforms=None):
+    """Peak hours per weekday for each platform of a business, and where they came from"""
+    import scheduler_service
+
+    if not platforms:
+        learned = {platform for owner, platform in list(_models) if owner == business_id}
+        platforms = sorted(set(scheduler_service.load_peak_hours()) | learned)
+
+    now = datetime.now()
+    described = {}
+    for platform in platforms:
+        model = get_peak_model(business_id, platform)
+        described[platform.lower()] = {
+            'learned': model.learned,
+            'posts': model.posts,
+            'peak_hours': model.peak_hours_by_day(),
+            'next_slot': model.next_slot(now).strftime('%Y-%m-%d %H:%M')
+        }
+    return described
@@ -0,0 +1,290 @@
+"""
+Bulk Slot Planner
+Spreads a batch of posts over the coming days in one vectorized pass. Candidate
+times form a grid min_spacing_minutes apart, so no two planned posts can collide.
+Candidates too close to the business's queued posts, inside a blackout window or
+on a day that already hit its cap are masked out, and the rest are ranked by the
+business's peak-hour models: peak slots soonest first, then the best off-peak
+slots. A plan is enqueued in one transaction - every post or none.
+Planning runs outside the write transaction; the business's schedule is locked
+only to insert, and the plan is redone under the lock if the queue changed meanwhile.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import func, insert, text
+from models import db, BusinessProfile, ScheduledPost
+from peak_model_service import get_peak_model
+
+load_dotenv()
+
+PLANNER_MIN_SPACING_MINUTES = int(os.getenv('PLANNER_MIN_SPACING_MINUTES', 60))
+PLANNER_DEFAULT_DAYS = int(os.getenv('PLANNER_DEFAULT_DAYS', 7))
+PLANNER_MAX_DAYS = 30
+PLANNER_MAX_POSTS = int(os.getenv('PLANNER_MAX_POSTS', 500))
+# Nothing is planned sooner than this from now
+PLANNER_LEAD_MINUTES = 5
+
+EPOCH = datetime(1970, 1, 1)
+# 1970-01-01 was a Thursday (Monday = 0)
+EPOCH_WEEKDAY = 3
+WEEKDAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+
+def _to_minutes(when):
+    """Naive UTC datetime -> minutes since the epoch"""
+    return int((when - EPOCH).total_seconds() // 60)
+
+
+def _from_minutes(minutes):
+    return EPOCH + timedelta(minutes=int(minutes))
+
+
+def _parse_clock(value):
+    hours, minutes = str(value).split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > 1440:
+        raise ValueError
+    return hours * 60 + minutes
+
+
+def parse_constraints(raw):
+    """Validate planner constraints. Returns (constraints, None) or (None, error message)."""
+    raw = raw or {}
+    try:
+        spacing = int(raw.get('min_spacing_minutes', PLANNER_MIN_SPACING_MINUTES))
+        days = int(raw.get('days', PLANNER_DEFAULT_DAYS))
+        cap = raw.get('per_day_cap')
+        cap = int(cap) if cap not in (None, '') else None
+    except (TypeError, ValueError):
+        return None, 'min_spacing_minutes, days and per_day_cap must be integers'
+    if not 5 <= spacing <= 1440:
+        return None, 'min_spacing_minutes must be between 5 and 1440'
+    if not 1 <= days <= PLANNER_MAX_DAYS:
+        return None, f'days must be between 1 and {PLANNER_MAX_DAYS}'
+    if cap is not None and cap < 1:
+        return None, 'per_day_cap must be at least 1'
+
+    tz_name = raw.get('timezone')
+    try:
+        tz = ZoneInfo(tz_name) if tz_name else None  # None = server local time
+    except (ZoneInfoNotFoundError, ValueError):
+        return None, f'Unknown timezone: {tz_name}'
+
+    blackout = []
+    for window in raw.get('blackout') or []:
+        try:
+            start, end = _parse_clock(window['start']), _parse_clock(window['end'])
+        except (KeyError, TypeError, ValueError):
+            return None, 'Blackout windows need start and end as HH:MM'
+        days_of_week = [d.lower()[:3] for d in window.get('days') or WEEKDAYS]
+        if any(d not in WEEKDAYS for d in days_of_week):
+            return None, f"Blackout days must be among {', '.join(WEEKDAYS)}"
+        blackout.append((start, end, [WEEKDAYS.index(d) for d in days_of_week]))
+
+    start_at = None
+    if raw.get('start'):
+        try:
+            start_at = datetime.fromisoformat(str(raw['start']).replace('Z', '+00:00'))
+        except ValueError:
+            return None, 'start must be an ISO date/time'
+        if start_at.tzinfo is None:
+            start_at = start_at.replace(tzinfo=tz) if tz else start_at.astimezone()
+        start_at = start_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return {'min_spacing_minutes': spacing, 'days': days, 'per_day_cap': cap, 'timezone': tz,
+            'blackout': blackout, 'start': start_at}, None
+
+
+def _local_minutes(minutes, tz):
+    """UTC epoch minutes -> local epoch minutes in tz (None = server local), one offset lookup per hour"""
+    hours, index = np.unique(minutes // 60, return_inverse=True)
+    offsets = np.array([
+        datetime.fromtimestamp(int(hour) * 3600, timezone.utc).astimezone(tz).utcoffset().total_seconds() // 60
+        for hour in hours
+    ], dtype=np.int64)
+    return minutes + offsets[index]
+
+
+def _slot_scores(business_id, platforms, server_minutes):
+    """(score, is_peak) of each candidate for a platform set, from the business's peak-hour models"""
+    slot = ((server_minutes // 1440 + EPOCH_WEEKDAY) % 7) * 24 + (server_minutes % 1440) // 60
+    score = np.zeros(len(slot))
+    peak = np.zeros(len(slot), dtype=bool)
+    for platform in platforms:
+        model = get_peak_model(business_id, platform)
+        scores = model.scores / max(float(model.scores.max()), 1e-9)
+        score += scores[slot]
+        peak |= model.peak[slot]
+    return score / max(len(platforms), 1), peak
+
+
+def plan_posts(business_id, posts, constraints, now=None, reserved=()):
+    """
+    Pick a due time (naive UTC) for each post - a dict with 'platforms'.
+    reserved: due times not queued yet that count as taken, e.g. earlier plans of the same transaction.
+    Returns a list aligned with posts: {'due_at', 'peak', 'score'} or None where nothing fit.
+    """
+    now = now or datetime.utcnow()
+    spacing = constraints['min_spacing_minutes']
+    tz = constraints['timezone']
+    cap = constraints['per_day_cap']
+
+    begin = _to_minutes(max(constraints['start'] or now, now + timedelta(minutes=PLANNER_LEAD_MINUTES)))
+    end = begin + constraints['days'] * 1440
+    # Grid anchored on the hour, so slots land on round times
+    first = begin // 60 * 60
+    grid = np.arange(first, end, spacing, dtype=np.int64)
+    grid = grid[grid >= begin]
+    if not len(grid):
+        return [None] * len(posts)
+
+    # Keep clear of posts already queued for the business
+    queued = [due_at for due_at, in db.session.query(ScheduledPost.due_at).filter(
+        ScheduledPost.business_id == business_id,
+        ScheduledPost.status.in_(['pending', 'dispatching']),
+        ScheduledPost.due_at >= _from_minutes(begin - spacing),
+        ScheduledPost.due_at < _from_minutes(end + spacing)
+    )]
+    queued = np.array(sorted(_to_minutes(due_at) for due_at in [*queued, *reserved]), dtype=np.int64)
+    free = np.ones(len(grid), dtype=bool)
+    if len(queued):
+        after = np.searchsorted(queued, grid)
+        next_gap = np.abs(queued[np.minimum(after, len(queued) - 1)] - grid)
+        prev_gap = np.abs(grid - queued[np.maximum(after - 1, 0)])
+        free &= np.minimum(next_gap, prev_gap) >= spacing
+
+    # Blackout windows and daily caps are in the requested timezone
+    local = _local_minutes(grid, tz)
+    local_day = local // 1440
+    minute_of_day = local % 1440
+    weekday = (local_day + EPOCH_WEEKDAY) % 7
+    for start, stop, days_of_week in constraints['blackout']:
+        if start <= stop:
+            inside = (minute_of_day >= start) & (minute_of_day < stop)
+        else:  # Wraps past midnight, e.g. 22:00-07:00
+            inside = (minute_of_day >= start) | (minute_of_day < stop)
+        free &= ~(inside & np.isin(weekday, days_of_week))
+
+    day_index = local_day - local_day.min()
+    remaining = np.full(day_index.max() + 1, np.iinfo(np.int64).max)
+    if cap is not None:
+        remaining[:] = cap
+        if len(queued):
+            queued_days = _local_minutes(queued, tz) // 1440 - local_day.min()
+            queued_days = queued_days[(queued_days >= 0) & (queued_days < len(remaining))]
+            remaining -= np.bincount(queued_days, minlength=len(remaining))
+
+    server_local = _local_minutes(grid, None)
+    order_of_posts = {}
+    for i, post in enumerate(posts):
+        order_of_posts.setdefault(tuple(p.lower() for p in post['platforms']), []).append(i)
+
+    plan = [None] * len(posts)
+    for platforms, indexes in order_of_posts.items():
+        score, peak = _slot_scores(business_id, platforms, server_local)
+        # Peak slots soonest first, then off-peak slots by score
+        priority = np.lexsort((np.where(peak, np.arange(len(grid)), -score), ~peak))
+        priority = priority[free[priority]]
+
+        # Rank each candidate within its day to apply the cap
+        by_day = priority[np.argsort(day_index[priority], kind='stable')]
+        days = day_index[by_day]
+        starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+        rank = np.arange(len(by_day)) - np.repeat(starts, np.diff(np.r_[starts, len(by_day)]))
+        allowed = np.zeros(len(grid), dtype=bool)
+        allowed[by_day[rank < np.maximum(remaining[days], 0)]] = True
+
+        chosen = np.sort(priority[allowed[priority]][:len(indexes)])
+        for post_index, candidate in zip(indexes, chosen):
+            plan[post_index] = {'due_at': _from_minutes(grid[candidate]), 'peak': bool(peak[candidate]),
+                                'score': round(float(score[candidate]), 3)}
+        free[chosen] = False
+        remaining -= np.bincount(day_index[chosen], minlength=len(remaining))
+    return plan
+
+
+def lock_business_schedule(business_id):
+    """
+    Serialize writers of one business's schedule so concurrent plans can't take the same slots.
+    Held until the caller commits or rolls back. Postgres locks the business row;
+    SQLite has no row locks, so a no-op write takes the database write lock instead,
+    which serializes every writer - keep the time between this and the commit short.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.query(BusinessProfile.id).filter_by(id=business_id).with_for_update().one()
+    else:
+        db.session.execute(text('UPDATE business_profile SET id = id WHERE id = :id'), {'id': business_id})
+
+
+def _queue_version(business_id):
+    """Changes whenever a post of the business is queued, claimed, re-queued or finished"""
+    return tuple(db.session.query(
+        func.count(), func.max(ScheduledPost.id), func.max(ScheduledPost.updated_at)
+    ).filter(
+        ScheduledPost.status.in_(['pending', 'dispatching']),
+        ScheduledPost.business_id == business_id
+    ).one())
+
+
+def plan_locked(business_id, plan):
+    """
+    Run plan() (which reads the business's queue) outside the write transaction, then
+    take the schedule lock. If the queue changed in between, plan() runs again under
+    the lock. Returns plan()'s result; the lock is held until the caller commits or rolls back.
+    """
+    version = _queue_version(business_id)
+    result = plan()
+    lock_business_schedule(business_id)
+    if _queue_version(business_id) != version:
+        result = plan()
+    return result
+
+
+def schedule_batch(business_id, user_id, posts, constraints, dry_run=False):
+    """
+    Plan posts ({'content', 'platforms', 'image_url', 'title'}) and queue them in one
+    transaction. Fails without queueing anything if not every post fits.
+    """
+    from scheduler_service import check_publish_config
+    import dispatcher_service
+
+    error = check_publish_config([p for post in posts for p in post['platforms']])
+    if error:
+        return {'success': False, 'error': error}
+
+    if dry_run:
+        plan = plan_posts(business_id, posts, constraints)
+    else:
+        plan = plan_locked(business_id, lambda: plan_posts(business_id, posts, constraints))
+    tz = constraints['timezone']
+    planned = []
+    for i, (post, slot) in enumerate(zip(posts, plan)):
+        if slot is None:
+            continue
+        local = slot['due_at'].replace(tzinfo=timezone.utc).astimezone(tz)
+        planned.append({'index': i, 'platforms': post['platforms'], 'scheduled_time': local.strftime('%Y-%m-%d %H:%M'),
+                        'due_at': slot['due_at'].isoformat() + 'Z', 'peak': slot['peak'], 'score': slot['score']})
+
+    unplaced = [i for i, slot in enumerate(plan) if slot is None]
+    if unplaced:
+        db.session.rollback()
+        return {'success': False, 'error': f'Only {len(planned)} of {len(posts)} posts fit - allow more days, '
+                                           f'a higher per_day_cap or shorter spacing', 'plan': planned, 'unplaced': unplaced}
+    if dry_run:
+        db.session.rollback()
+        return {'success': True, 'dry_run': True, 'plan': planned}
+
+    rows = [{'user_id': user_id, 'business_id': business_id, 'content': post['content'], 'platforms': post['platforms'],
+             'image_url': post.get('image_url'), 'title': post.get('title'), 'due_at': slot['due_at']}
+            for post, slot in zip(posts, plan)]
+    ids = db.session.execute(
+        insert(ScheduledPost).returning(ScheduledPost.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    db.session.commit()
+    for entry, post_id in zip(planned, ids):
+        entry['id'] = post_id
+    dispatcher_service.wake_if_due(min(row['due_at'] for row in rows))
+    return {'success': True, 'queued': len(ids), 'plan': planned}
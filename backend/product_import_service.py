@@ -0,0 +1,210 @@
+"""
+Bulk Product Import
+Streams a CSV or NDJSON catalog from the request body, validates each row and
+upserts products in batched transactions (one round trip per batch instead of
+one commit per product). Rows match an existing product of the business by id,
+else by name; everything else is inserted. Per-row errors are reported back.
+"""
+import os
+import csv
+import math
+import json
+import codecs
+from dotenv import load_dotenv
+from sqlalchemy import insert, update, or_
+from models import db, Product
+
+load_dotenv()
+
+PRODUCT_IMPORT_BATCH_SIZE = int(os.getenv('PRODUCT_IMPORT_BATCH_SIZE', 500))
+# Bytes read from the request body at a time
+IMPORT_CHUNK_BYTES = 64 * 1024
+# Errors listed in the response (the failed count always covers all of them)
+MAX_REPORTED_ERRORS = 100
+
+PRODUCT_FIELDS = ('id', 'name', 'description', 'offers', 'price')
+NAME_MAX_LENGTH = 100
+
+
+def iter_text_lines(stream, chunk_size=IMPORT_CHUNK_BYTES):
+    """Decode a binary stream as UTF-8 (BOM tolerated) and yield lines without buffering the body"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    pending = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        pending += decoder.decode(chunk or b'', final=not chunk)
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            yield line + '\n'
+        if not chunk:
+            break
+    if pending:
+        yield pending
+
+
+def iter_csv_rows(stream):
+    """Yield (row_number, dict) from a CSV body with a header row"""
+    reader = csv.DictReader(iter_text_lines(stream))
+    for row in reader:
+        # line_num is the physical line the row ended on (header is line 1)
+        yield reader.line_num, row
+
+
+def iter_ndjson_rows(stream):
+    """Yield (line_number, dict or error string) from an NDJSON body"""
+    for line_number, line in enumerate(iter_text_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, 'Invalid JSON'
+            continue
+        yield line_number, row if isinstance(row, dict) else 'Each line must be a JSON object'
+
+
+def validate_row(row):
+    """Returns (clean product dict, None) or (None, error message)"""
+    if not isinstance(row, dict):
+        return None, row
+    row = {key.strip().lower(): value for key, value in row.items() if key}
+
+    for field in ('name', 'description', 'offers'):
+        if isinstance(row.get(field), (dict, list)):
+            return None, f'{field} must be text'
+
+    name = str(row.get('name') or '').strip()
+    if not name:
+        return None, 'name is required'
+    if len(name) > NAME_MAX_LENGTH:
+        return None, f'name is longer than {NAME_MAX_LENGTH} characters'
+
+    clean = {'name': name}
+    for field in ('description', 'offers'):
+        if field in row:
+            clean[field] = str(row[field]).strip() if row[field] not in (None, '') else None
+
+    if 'price' in row:
+        price = row['price']
+        if price in (None, ''):
+            clean['price'] = None
+        else:
+            try:
+                if isinstance(price, bool):
+                    raise TypeError
+                clean['price'] = float(price)
+            except (TypeError, ValueError):
+                return None, f'price is not a number: {price}'
+            if not math.isfinite(clean['price']):
+                return None, f'price must be a finite number: {price}'
+            if clean['price'] < 0:
+                return None, 'price cannot be negative'
+
+    if row.get('id') not in (None, ''):
+        try:
+            if isinstance(row['id'], (bool, float)):
+                raise TypeError
+            clean['id'] = int(row['id'])
+        except (TypeError, ValueError):
+            return None, f"id is not an integer: {row['id']}"
+
+    return clean, None
+
+
+def _upsert_batch(business_id, batch):
+    """
+    Upsert one batch of (row_number, clean dict) in a single transaction.
+    Returns (created, updated, errors).
+    """
+    ids = {row['id'] for _, row in batch if 'id' in row}
+    names = {row['name'] for _, row in batch if 'id' not in row}
+
+    # One query resolves every id and name in the batch to existing products
+    existing = db.session.query(Product.id, Product.name).filter(
+        Product.business_id == business_id,
+        or_(Product.id.in_(ids), Product.name.in_(names))
+    ).order_by(Product.id).all()
+    existing_ids = {product.id for product in existing}
+    id_by_name = {}
+    for product in existing:
+        id_by_name.setdefault(product.name, product.id)
+
+    updates, inserts, errors = {}, {}, []
+    for row_number, row in batch:
+        product_id = row.get('id')
+        if product_id is not None:
+            if product_id not in existing_ids:
+                errors.append({'row': row_number, 'error': f'Product {product_id} not found in this business'})
+                continue
+        else:
+            product_id = id_by_name.get(row['name'])
+
+        if product_id is not None:
+            # A later row for the same product wins
+            updates[product_id] = {**updates.get(product_id, {}), **row, 'id': product_id}
+        else:
+            inserts[row['name']] = {**inserts.get(row['name'], {}), **row, 'business_id': business_id}
+
+    if updates:
+        db.session.execute(update(Product), list(updates.values()))
+    if inserts:
+        db.session.execute(insert(Product), list(inserts.values()))
+    db.session.commit()
+    return len(inserts), len(updates), errors
+
+
+def import_products(business_id, rows, batch_size=PRODUCT_IMPORT_BATCH_SIZE):
+    """
+    Import (row_number, raw row) pairs into a business's catalog.
+    Returns counts plus the first MAX_REPORTED_ERRORS per-row errors.
+    """
+    created = updated = failed = 0
+    errors = []
+
+    def record_errors(new_errors):
+        nonlocal failed
+        failed += len(new_errors)
+        errors.extend(new_errors[:MAX_REPORTED_ERRORS - len(errors)])
+
+    def flush(batch):
+        nonlocal created, updated
+        try:
+            batch_created, batch_updated, batch_errors = _upsert_batch(business_id, batch)
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) == 1:
+                print(f"❌ Product import row {batch[0][0]} failed: {e}")
+                record_errors([{'row': batch[0][0], 'error': f'Could not save product: {getattr(e, "orig", e)}'}])
+                return
+            # Retry row by row so the good rows are saved and only the bad ones are reported
+            print(f"⚠️ Product import batch of {len(batch)} failed, retrying row by row: {e}")
+            for item in batch:
+                flush([item])
+            return
+        created += batch_created
+        updated += batch_updated
+        record_errors(batch_errors)
+
+    batch = []
+    for row_number, raw in rows:
+        clean, error = validate_row(raw)
+        if error:
+            record_errors([{'row': row_number, 'error': error}])
+            continue
+        batch.append((row_number, clean))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    if created or updated:
+        print(f"📦 Imported products for business {business_id}: {created} created, {updated} updated, {failed} failed")
+
+    return {
+        'success': failed == 0,
+        'created': created,
+        'updated': updated,
+        'failed': failed,
+        'errors': sorted(errors, key=lambda e: e['row']),
+    }
@@ -0,0 +1,242 @@
+"""
+Publish Rate Limiting
+Every publishing call to a provider goes through one token bucket per
+(account, platform). Buckets start at PUBLISH_RATE_PER_MINUTE with bursts of
+PUBLISH_BURST and are re-seeded from the rate-limit headers of every response
+(X-RateLimit-* / RateLimit-*, Retry-After on a 429), so they track what the
+provider says is left rather than a guess.
+
+Callers wait in two lanes. Interactive "post now" requests are served before
+bulk traffic (the dispatcher, automation) waiting on the same bucket, and bulk
+traffic leaves PUBLISH_INTERACTIVE_RESERVE tokens untouched for them. A caller
+that would wait longer than its lane allows gets a rate-limited result instead;
+the dispatcher re-queues such posts. Buckets are per process - the provider's
+headers keep the processes in step.
+"""
+import os
+import time
+import itertools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from dotenv import load_dotenv
+import requests
+
+load_dotenv()
+
+PUBLISH_RATE_PER_MINUTE = float(os.getenv('PUBLISH_RATE_PER_MINUTE', 10))
+PUBLISH_BURST = int(os.getenv('PUBLISH_BURST', 5))
+PUBLISH_INTERACTIVE_RESERVE = int(os.getenv('PUBLISH_INTERACTIVE_RESERVE', 1))
+PUBLISH_INTERACTIVE_MAX_WAIT_SECONDS = float(os.getenv('PUBLISH_INTERACTIVE_MAX_WAIT_SECONDS', 15))
+PUBLISH_BULK_MAX_WAIT_SECONDS = float(os.getenv('PUBLISH_BULK_MAX_WAIT_SECONDS', 30))
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+LANES = {INTERACTIVE: (0, PUBLISH_INTERACTIVE_MAX_WAIT_SECONDS), BULK: (1, PUBLISH_BULK_MAX_WAIT_SECONDS)}
+# Account name of the Ayrshare key behind AYRSHARE_API_KEY
+AYRSHARE_ACCOUNT = 'ayrshare'
+# Pause after a 429 that came without Retry-After
+DEFAULT_RETRY_AFTER = 60
+
+_lane = ContextVar('publish_lane', default=INTERACTIVE)
+
+
+@contextmanager
+def publish_lane(lane):
+    """Publish calls made inside the block wait in `lane` (default: interactive)"""
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+class RateLimited(Exception):
+    """A publish call that can't (or couldn't) go out before the provider's limit resets"""
+
+    def __init__(self, platforms, retry_after):
+        from ai_model_router import translate_error
+
+        self.platforms = platforms
+        self.retry_after = max(int(retry_after + 0.999), 1)
+        super().__init__(f"{translate_error(429)} Retry in {self.retry_after}s ({', '.join(platforms)}).")
+
+    def to_result(self):
+        return {'success': False, 'error': str(self), 'rate_limited': True, 'retry_after': self.retry_after}
+
+
+class TokenBucket:
+    """
+    Tokens refill continuously at `rate` per second up to `capacity`. A rate seeded
+    from the provider's window only lasts until that window resets (`rate_until`),
+    then the configured rate applies again.
+    """
+
+    def __init__(self, rate=PUBLISH_RATE_PER_MINUTE / 60, capacity=PUBLISH_BURST):
+        self.default_rate = rate
+        self.rate = rate
+        self.rate_until = 0.0
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        if self.rate_until and now >= self.rate_until:
+            # The window the rate was seeded for is over: its rate up to the reset, the default after
+            self.tokens = min(self.capacity, self.tokens + max(self.rate_until - self.updated, 0) * self.rate)
+            self.updated = max(self.updated, self.rate_until)
+            self.rate, self.rate_until = self.default_rate, 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now, reserve=0):
+        """Seconds until a token is free while keeping `reserve` tokens back (0 = now)"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        needed = 1 + min(reserve, max(self.capacity - 1, 0))
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def seed(self, now, limit=None, remaining=None, reset_in=None, retry_after=None):
+        """Adopt what the provider reported about the current window"""
+        if limit:
+            self.capacity = max(int(limit), 1)
+        if remaining is not None:
+            self._refill(now)
+            self.tokens = min(self.tokens, float(remaining))
+            if reset_in and reset_in > 0:
+                if remaining <= 0:
+                    self.blocked_until = max(self.blocked_until, now + reset_in)
+                else:
+                    # Spread what is left evenly over the rest of the window
+                    self.rate = remaining / reset_in
+                    self.rate_until = now + reset_in
+        if retry_after is not None:
+            self.tokens = min(self.tokens, 0.0)
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def snapshot(self, now):
+        self._refill(now)
+        return {'tokens': round(self.tokens, 2), 'capacity': self.capacity, 'per_minute': round(self.rate * 60, 2),
+                'blocked_for': round(max(self.blocked_until - now, 0), 1)}
+
+
+class RateLimiter:
+    """Token buckets per (account, platform) with priority lanes for waiting callers"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._waiting = []  # (lane rank, seq, keys) of every waiting caller
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket()
+        return bucket
+
+    def _ahead(self, ticket):
+        """Is a caller with higher priority waiting on one of this caller's buckets?"""
+        return any(other[:2] < ticket[:2] and set(other[2]) & set(ticket[2]) for other in self._waiting)
+
+    def acquire(self, account, platforms, lane=None):
+        """Take a token for every platform, waiting up to the lane's limit. Raises RateLimited."""
+        lane = lane or _lane.get()
+        rank, max_wait = LANES[lane]
+        reserve = PUBLISH_INTERACTIVE_RESERVE if lane == BULK else 0
+        keys = tuple(sorted({(account, p.lower()) for p in platforms}))
+        with self._cond:
+            ticket = (rank, next(self._seq), keys)
+            self._waiting.append(ticket)
+            deadline = time.monotonic() + max_wait
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = max(self._bucket(key).wait_time(now, reserve) for key in keys)
+                    if wait == 0 and not self._ahead(ticket):
+                        for key in keys:
+                            self._buckets[key].take(now)
+                        return
+                    if now + wait > deadline:
+                        raise RateLimited([p for _, p in keys], max(wait, deadline - now, 1))
+                    # Woken early when another caller finishes or a bucket is re-seeded
+                    self._cond.wait(timeout=max(min(wait or max_wait, deadline - now), 0.01))
+            finally:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+
+    def observe(self, account, platforms, response):
+        """Seed the buckets from a provider response. Returns Retry-After seconds on a 429, else None."""
+        limit = _header_number(response.headers, 'X-RateLimit-Limit', 'RateLimit-Limit')
+        remaining = _header_number(response.headers, 'X-RateLimit-Remaining', 'RateLimit-Remaining')
+        reset = _header_number(response.headers, 'X-RateLimit-Reset', 'RateLimit-Reset')
+        # Reset is either seconds from now or a Unix timestamp (whole seconds, so allow one more)
+        reset_in = reset - time.time() + 1 if reset and reset > 1e9 else reset
+        retry_after = None
+        if response.status_code == 429:
+            retry_after = _retry_after(response.headers.get('Retry-After'))
+            if retry_after is None:
+                retry_after = reset_in if reset_in and reset_in > 0 else DEFAULT_RETRY_AFTER
+        if limit is None and remaining is None and retry_after is None:
+            return None
+        with self._cond:
+            now = time.monotonic()
+            for platform in platforms:
+                self._bucket((account, platform.lower())).seed(now, limit, remaining, reset_in, retry_after)
+            self._cond.notify_all()
+        return retry_after
+
+    def snapshot(self):
+        with self._cond:
+            now = time.monotonic()
+            return [{'account': account, 'platform': platform, **bucket.snapshot(now)}
+                    for (account, platform), bucket in sorted(self._buckets.items())]
+
+
+def _header_number(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(str(value).split(',')[0].strip())
+            except ValueError:
+                continue
+    return None
+
+
+def _retry_after(value):
+    """Retry-After as seconds - it may be a number or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+limiter = RateLimiter()
+
+
+def rate_limited_post(platforms, url, account=AYRSHARE_ACCOUNT, **kwargs):
+    """
+    requests.post() for a publishing call: waits for a token on every platform first and
+    feeds the response's rate-limit headers back. Raises RateLimited instead of waiting
+    past the caller's lane limit, or when the provider answers 429.
+    """
+    limiter.acquire(account, platforms)
+    response = requests.post(url, **kwargs)
+    retry_after = limiter.observe(account, platforms, response)
+    if response.status_code == 429:
+        raise RateLimited(platforms, retry_after or DEFAULT_RETRY_AFTER)
+    return response
@@ -1,5 +1,8 @@
-from flask import Blueprint, request, jsonify
-from models import db, BusinessProfile, GeneratedContent, Product, User, Campaign, CompetitorData, AudioFile
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from models import (
+    db, BusinessProfile, GeneratedContent, Product, User, Campaign, CompetitorData, AudioFile,
+    ContentTombstone, ArchivedRecord, PublishedPost, PublishOutbox
+)
 from ai_service import (
     generate_marketing_content, 
     generate_image_from_text,
@@ -18,7 +21,29 @@ from ai_service import (
     generate_multilingual_content,
     generate_content_with_brand_voice
 )
-from social_service import publish_content
+from outbox_service import publish, enqueue, payload_digest, payload_key, content_key
+from write_queue import save_record
+from analytics_service import get_content_stats, get_recent_posts, get_timeseries, MAX_TIMESERIES_DAYS
+from search_service import search_content
+from archive_service import load_archived, unpack_record, delete_archived_content
+from export_service import stream_export, EXPORT_TYPES, EXPORT_FORMATS
+from peak_model_service import describe_peak_models
+from metrics_service import get_engagement, get_post_metrics
+from planner_service import schedule_batch, parse_constraints, PLANNER_MAX_POSTS
+from campaign_service import launch_campaign, get_campaign_schedule, parse_platforms
+from rate_limit_service import limiter
+from product_import_service import import_products, iter_csv_rows, iter_ndjson_rows
+from pagination import (
+    encode_cursor,
+    decode_cursor,
+    keyset_filter,
+    keyset_after,
+    encode_token,
+    decode_token,
+    parse_datetime,
+    parse_id,
+    parse_limit
+)
 from scheduler_service import (
     post_immediately,
     schedule_post,
@@ -26,9 +51,13 @@ from scheduler_service import (
     get_scheduled_posts,
     get_peak_hours_info,
     start_auto_scheduler,
-    stop_auto_scheduler
+    stop_auto_scheduler,
+    get_automation_status
 )
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import func
+from datetime import datetime, timedelta
+import csv
 from pytrends.request import TrendReq
 
 
@@ -176,6 +205,33 @@ def create_product():
     db.session.commit()
     return jsonify(new_product.to_dict()), 201
 
+@api_bp.route('/business/<int:id>/products/import', methods=['POST'])
+@jwt_required()
+def import_business_products(id):
+    """
+    Bulk catalog import. The request body is the raw CSV (with header row) or NDJSON file,
+    streamed - not read into memory. Format comes from ?format=csv|ndjson or the Content-Type.
+    Rows with an id update that product; otherwise a product with the same name is updated
+    or a new one is created. Columns: id, name, description, offers, price.
+    """
+    current_user_id = get_jwt_identity()
+    business, error_resp, code = verify_business_access(id, int(current_user_id))
+    if error_resp:
+        return error_resp, code
+
+    fmt = request.args.get('format')
+    if not fmt:
+        fmt = 'ndjson' if 'ndjson' in (request.mimetype or '') or 'json' in (request.mimetype or '') else 'csv'
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': f"Unsupported format: {fmt}"}), 400
+
+    rows = iter_csv_rows(request.stream) if fmt == 'csv' else iter_ndjson_rows(request.stream)
+    try:
+        result = import_products(id, rows)
+    except (UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': f'Could not read {fmt} file: {e}'}), 400
+    return jsonify(result), 200
+
 @api_bp.route('/business/<int:id>/products/<int:pid>', methods=['DELETE'])
 @jwt_required()
 def delete_product(id, pid):
@@ -201,6 +257,41 @@ def get_business_products(id):
     products = Product.query.filter_by(business_id=id).all()
     return jsonify([p.to_dict() for p in products])
 
+@api_bp.route('/business/<int:id>/export', methods=['GET'])
+@jwt_required()
+def export_business(id):
+    """
+    Stream a business's history as NDJSON or CSV (chunked, constant memory).
+    Query: type=content|campaigns|competitors|all (default all, NDJSON only),
+           format=ndjson|csv, include_archived=true|false
+    """
+    current_user_id = get_jwt_identity()
+    business, error_resp, code = verify_business_access(id, int(current_user_id))
+    if error_resp:
+        return error_resp, code
+
+    fmt = request.args.get('format', 'ndjson')
+    export_type = request.args.get('type', 'all')
+    include_archived = request.args.get('include_archived', 'true').lower() != 'false'
+
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported format: {fmt}"}), 400
+    if export_type == 'all':
+        if fmt == 'csv':
+            return jsonify({'error': "CSV export needs a single type (content, campaigns or competitors)"}), 400
+        export_types = list(EXPORT_TYPES)
+    elif export_type in EXPORT_TYPES:
+        export_types = [export_type]
+    else:
+        return jsonify({'error': f"Unknown export type: {export_type}"}), 400
+
+    filename = f"business_{id}_{export_type}_{datetime.utcnow():%Y%m%d}.{fmt}"
+    return Response(
+        stream_with_context(stream_export(export_types, id, fmt, include_archived)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
 @api_bp.route('/generate-image', methods=['POST'])
 @jwt_required()
 def generate_image_route():
@@ -303,8 +394,7 @@ def generate_content():
         business_id=business_id,
         image_url=gen_image_url
     )
-    db.session.add(new_content)
-    db.session.commit()
+    save_record(new_content)
     
     return jsonify(new_content.to_dict()), 201
 
@@ -372,9 +462,7 @@ def generate_best_content_route():
             business_id=business_id,
             image_url=gen_image_url
         )
-        db.session.add(new_content)
-        db.session.commit()
-        content_id = new_content.id
+        content_id = save_record(new_content)
     else:
         content_id = None
     
@@ -389,38 +477,438 @@ def generate_best_content_route():
         'all_results': result.get('all_results', [])
     }), 201
 
+# Fields selectable via /content?fields=... ('preview' is a truncated 'content')
+CONTENT_FIELDS = ['id', 'platform', 'content', 'preview', 'image_url', 'video_url',
+                  'audio_url', 'model', 'created_at', 'business_id']
+CONTENT_PREVIEW_CHARS = 160
+
+
 @api_bp.route('/content', methods=['GET'])
 @jwt_required()
 def get_all_content():
+    """
+    Content history, newest first.
+    Without paging parameters the full list is returned (legacy behaviour).
+    With limit/cursor/fields a page is returned: {'items': [...], 'next_cursor': ...}
+    Filters: business_id, platform, since, until (ISO dates)
+    """
     current_user_id = get_jwt_identity()
-    # Filter content by user's businesses only
-    contents = GeneratedContent.query.join(BusinessProfile).filter(BusinessProfile.user_id == int(current_user_id)).order_by(GeneratedContent.created_at.desc()).all()
-    return jsonify([c.to_dict() for c in contents])
+    args = request.args
+
+    if not any(key in args for key in ('limit', 'cursor', 'fields')):
+        # Filter content by user's businesses only
+        contents = GeneratedContent.query.join(BusinessProfile).filter(BusinessProfile.user_id == int(current_user_id)).order_by(GeneratedContent.created_at.desc()).all()
+        archived = _owned_archived_content(int(current_user_id)).order_by(ArchivedRecord.created_at.desc()).all()
+        items = [c.to_dict() for c in contents] + [unpack_record(r) for r in archived]
+        # Archived posts are usually the oldest, but a stable sort keeps the merge exact
+        items.sort(key=lambda item: item['created_at'] or '', reverse=True)
+        return jsonify(items)
+
+    fields = args.get('fields', ','.join(f for f in CONTENT_FIELDS if f != 'preview')).split(',')
+    unknown = [f for f in fields if f not in CONTENT_FIELDS]
+    if unknown:
+        return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    try:
+        limit = parse_limit(args.get('limit'))
+        since = parse_datetime(args.get('since'))
+        until = parse_datetime(args.get('until'))
+        business_id = parse_id(args.get('business_id'), 'business_id')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Project only the requested columns; previews are truncated in SQL
+    columns = [GeneratedContent.id, GeneratedContent.created_at]
+    for field in fields:
+        if field == 'preview':
+            columns.append(func.substr(GeneratedContent.content, 1, CONTENT_PREVIEW_CHARS + 1).label('preview'))
+        elif field not in ('id', 'created_at'):
+            columns.append(getattr(GeneratedContent, field))
+
+    query = db.session.query(*columns).filter(
+        GeneratedContent.business_id.in_(
+            db.session.query(BusinessProfile.id).filter(BusinessProfile.user_id == int(current_user_id))
+        )
+    )
+    if business_id is not None:
+        query = query.filter(GeneratedContent.business_id == business_id)
+    if args.get('platform'):
+        query = query.filter(GeneratedContent.platform == args['platform'])
+    if since:
+        query = query.filter(GeneratedContent.created_at >= since)
+    if until:
+        query = query.filter(GeneratedContent.created_at < until)
+    if args.get('cursor'):
+        try:
+            query = query.filter(keyset_filter(GeneratedContent.created_at, GeneratedContent.id, args['cursor']))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    rows = query.order_by(GeneratedContent.created_at.desc(), GeneratedContent.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = []
+    for row in rows:
+        item = {}
+        for field in fields:
+            value = getattr(row, field)
+            if field == 'created_at':
+                value = value.isoformat() if value else None
+            elif field == 'preview' and value and len(value) > CONTENT_PREVIEW_CHARS:
+                value = value[:CONTENT_PREVIEW_CHARS].rstrip() + '…'
+            item[field] = value
+        items.append(item)
+
+    next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+
+@api_bp.route('/content/<int:content_id>', methods=['GET'])
+@jwt_required()
+def get_content(content_id):
+    """Get one post - served from the archive tier if it has been archived"""
+    current_user_id = int(get_jwt_identity())
+    
+    content = GeneratedContent.query.get(content_id)
+    if content:
+        data = content.to_dict()
+    else:
+        data = load_archived('generated_content', content_id)
+        if not data:
+            return jsonify({'error': 'Content not found'}), 404
+    
+    business = BusinessProfile.query.get(data['business_id'])
+    if not business or business.user_id != current_user_id:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    return jsonify(data)
+
+
+def _owned_archived_content(user_id):
+    """Query for the archived posts of a user's businesses"""
+    return ArchivedRecord.query.filter(
+        ArchivedRecord.source_table == 'generated_content',
+        ArchivedRecord.business_id.in_(
+            db.session.query(BusinessProfile.id).filter(BusinessProfile.user_id == user_id)
+        )
+    )
+
+
+@api_bp.route('/content/archive', methods=['GET'])
+@jwt_required()
+def get_archived_content():
+    """
+    Archived (older) posts, newest first, decompressed on read.
+    Query: limit, cursor, business_id, since, until - same paging as /content.
+    """
+    current_user_id = int(get_jwt_identity())
+    args = request.args
+    
+    try:
+        limit = parse_limit(args.get('limit'))
+        since = parse_datetime(args.get('since'))
+        until = parse_datetime(args.get('until'))
+        business_id = parse_id(args.get('business_id'), 'business_id')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = _owned_archived_content(current_user_id)
+    if business_id is not None:
+        query = query.filter(ArchivedRecord.business_id == business_id)
+    if since:
+        query = query.filter(ArchivedRecord.created_at >= since)
+    if until:
+        query = query.filter(ArchivedRecord.created_at < until)
+    if args.get('cursor'):
+        try:
+            query = query.filter(keyset_filter(ArchivedRecord.created_at, ArchivedRecord.record_id, args['cursor']))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    records = query.order_by(ArchivedRecord.created_at.desc(), ArchivedRecord.record_id.desc()).limit(limit + 1).all()
+    has_more = len(records) > limit
+    records = records[:limit]
+    
+    return jsonify({
+        'items': [unpack_record(r) for r in records],
+        'next_cursor': encode_cursor(records[-1].created_at, records[-1].record_id) if has_more else None
+    })
+
+
+SEARCH_MAX_PAGE_SIZE = 50
+SEARCH_MAX_OFFSET = 1000
+
+
+@api_bp.route('/content/search', methods=['GET'])
+@jwt_required()
+def search_history():
+    """
+    Full-text search over the user's posts and campaign strategies.
+    Query: q (required), type=content|campaign|all, limit, offset.
+    Results are ranked by relevance with <mark>-highlighted snippets.
+    """
+    current_user_id = int(get_jwt_identity())
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'error': 'Search query (q) required'}), 400
+    
+    doc_type = request.args.get('type', 'all')
+    if doc_type not in ('content', 'campaign', 'all'):
+        return jsonify({'error': 'type must be content, campaign or all'}), 400
+    doc_types = ('content', 'campaign') if doc_type == 'all' else (doc_type,)
+    
+    try:
+        limit = parse_limit(request.args.get('limit'), default=20, maximum=SEARCH_MAX_PAGE_SIZE)
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    if offset > SEARCH_MAX_OFFSET:
+        return jsonify({'error': f'offset too large (max {SEARCH_MAX_OFFSET}), refine the query'}), 400
+    
+    results = search_content(db.session, current_user_id, query, doc_types, limit + 1, offset)
+    return jsonify({
+        'results': results[:limit],
+        'next_offset': offset + limit if len(results) > limit else None
+    })
+
+
+# Rows younger than this are held back so a sync never skips an in-flight commit
+SYNC_SETTLE_SECONDS = 2
+# Tombstones are purged after this; older cursors must do a full resync
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+SYNC_MAX_PAGE_SIZE = 500
+
+
+def _sync_position(state, key):
+    ts, row_id = state[key]
+    return datetime.fromisoformat(ts), row_id
+
+
+@api_bp.route('/content/sync', methods=['GET'])
+@jwt_required()
+def sync_content():
+    """
+    Delta sync for client-side history caches.
+    Returns posts created or updated and posts deleted since the cursor from the
+    previous call. Omit the cursor for an initial full sync; keep calling while
+    has_more is true. Upserts should be applied idempotently by id.
+    """
+    current_user_id = int(get_jwt_identity())
+    now = datetime.utcnow()
+    horizon = now - timedelta(seconds=SYNC_SETTLE_SECONDS)
+
+    try:
+        limit = parse_limit(request.args.get('limit'), maximum=SYNC_MAX_PAGE_SIZE)
+        state = decode_token(request.args['cursor']) if request.args.get('cursor') else None
+        if state:
+            issued = datetime.fromisoformat(state['h'])
+            upsert_pos = _sync_position(state, 'u')
+            delete_pos = _sync_position(state, 'd')
+    except (ValueError, KeyError, TypeError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    if state and issued < now - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS):
+        return jsonify({'error': 'Sync cursor expired, full resync required'}), 410
+
+    # Created or updated posts, oldest change first
+    owned_businesses = db.session.query(BusinessProfile.id).filter(BusinessProfile.user_id == current_user_id)
+    upsert_query = GeneratedContent.query.filter(
+        GeneratedContent.business_id.in_(owned_businesses),
+        GeneratedContent.updated_at <= horizon
+    )
+    if state:
+        upsert_query = upsert_query.filter(keyset_after(GeneratedContent.updated_at, GeneratedContent.id, *upsert_pos))
+    upserts = upsert_query.order_by(GeneratedContent.updated_at, GeneratedContent.id).limit(limit + 1).all()
+
+    # Deletes only matter to a client that already holds a cache
+    deletes = []
+    if state:
+        deletes = ContentTombstone.query.filter(
+            ContentTombstone.user_id == current_user_id,
+            ContentTombstone.deleted_at <= horizon,
+            keyset_after(ContentTombstone.deleted_at, ContentTombstone.id, *delete_pos)
+        ).order_by(ContentTombstone.deleted_at, ContentTombstone.id).limit(limit + 1).all()
+
+    # A drained stream resumes after the horizon; a truncated one after its last row
+    more_upserts = len(upserts) > limit
+    more_deletes = len(deletes) > limit
+    upserts, deletes = upserts[:limit], deletes[:limit]
+    next_state = {
+        'h': (issued if state and (more_upserts or more_deletes) else horizon).isoformat(),
+        'u': [upserts[-1].updated_at.isoformat(), upserts[-1].id] if more_upserts else [horizon.isoformat(), None],
+        'd': [deletes[-1].deleted_at.isoformat(), deletes[-1].id] if more_deletes else [horizon.isoformat(), None],
+    }
+
+    return jsonify({
+        'upserts': [c.to_dict() for c in upserts],
+        'deletes': [t.to_dict() for t in deletes],
+        'cursor': encode_token(next_state),
+        'has_more': more_upserts or more_deletes
+    })
+
+
+def _delete_contents(contents, user_id):
+    """Delete posts in the current transaction, leaving tombstones for /content/sync clients"""
+    db.session.add_all([ContentTombstone(
+        content_id=content.id,
+        business_id=content.business_id,
+        user_id=user_id
+    ) for content in contents])
+    for content in contents:
+        db.session.delete(content)
+    ContentTombstone.query.filter(
+        ContentTombstone.user_id == user_id,
+        ContentTombstone.deleted_at < datetime.utcnow() - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS)
+    ).delete(synchronize_session=False)
 
 
 @api_bp.route('/content/<int:content_id>', methods=['DELETE'])
 @jwt_required()
 def delete_content(content_id):
-    """Delete a generated content post from history"""
+    """Delete a generated content post from history - archived posts included"""
     current_user_id = get_jwt_identity()
     
     # Find the content
     content = GeneratedContent.query.get(content_id)
     if not content:
-        return jsonify({'error': 'Content not found'}), 404
+        record = ArchivedRecord.query.filter_by(source_table='generated_content', record_id=content_id).first()
+        if not record:
+            return jsonify({'error': 'Content not found'}), 404
+        business = BusinessProfile.query.get(record.business_id)
+        if not business or business.user_id != int(current_user_id):
+            return jsonify({'error': 'Unauthorized'}), 403
+        delete_archived_content([record])
+        db.session.commit()
+        return jsonify({'success': True, 'message': 'Post deleted successfully'}), 200
     
     # Verify ownership through business
     business = BusinessProfile.query.get(content.business_id)
     if not business or business.user_id != int(current_user_id):
         return jsonify({'error': 'Unauthorized'}), 403
     
-    # Delete the content
-    db.session.delete(content)
+    _delete_contents([content], business.user_id)
     db.session.commit()
     
     return jsonify({'success': True, 'message': 'Post deleted successfully'}), 200
 
 
+BULK_MAX_ITEMS = 1000
+BULK_UPDATE_FIELDS = ('video_url', 'audio_url', 'model', 'image_url')
+
+
+@api_bp.route('/content/bulk', methods=['POST'])
+@jwt_required()
+def bulk_content():
+    """
+    Delete or update many posts in one transaction.
+    Body: {"action": "delete" | "update",
+           "ids": [1, 2, ...]                      - or -
+           "filter": {"business_id", "platform", "model", "since", "until"}, "cursor",
+           "fields": {"video_url", "audio_url", "model", "image_url"}}   (update only, strings or null)
+    Ownership is checked with a single joined query; ids that are missing or belong to
+    someone else are returned in not_found. Deleting by ids also removes archived posts
+    (updates and filters only touch live posts). Filters touch at most BULK_MAX_ITEMS posts
+    per call, oldest first: with has_more, call again with cursor=next_cursor.
+    """
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    ids = data.get('ids')
+    filters = data.get('filter')
+    
+    if action not in ('delete', 'update'):
+        return jsonify({'error': "action must be 'delete' or 'update'"}), 400
+    if (ids is None) == (filters is None):
+        return jsonify({'error': "Provide either 'ids' or 'filter'"}), 400
+    
+    fields = data.get('fields') or {}
+    next_cursor = None
+    if action == 'update':
+        if not isinstance(fields, dict) or not fields or any(f not in BULK_UPDATE_FIELDS for f in fields):
+            return jsonify({'error': f"fields must be a non-empty subset of: {', '.join(BULK_UPDATE_FIELDS)}"}), 400
+        for field, value in fields.items():
+            max_length = GeneratedContent.__table__.c[field].type.length
+            if value is not None and (not isinstance(value, str) or len(value) > max_length):
+                return jsonify({'error': f'{field} must be a string of at most {max_length} characters or null'}), 400
+    
+    # Posts the user owns - joined to business_profile, so one query covers the ownership check
+    query = GeneratedContent.query.join(
+        BusinessProfile, GeneratedContent.business_id == BusinessProfile.id
+    ).filter(BusinessProfile.user_id == current_user_id)
+    
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return jsonify({'error': 'ids must be a list of integers'}), 400
+        if len(ids) > BULK_MAX_ITEMS:
+            return jsonify({'error': f'At most {BULK_MAX_ITEMS} ids per request'}), 400
+        contents = query.filter(GeneratedContent.id.in_(ids)).all() if ids else []
+        has_more = False
+    else:
+        if not isinstance(filters, dict) or not filters:
+            return jsonify({'error': 'filter must be a non-empty object'}), 400
+        for key in ('platform', 'model'):
+            if filters.get(key) is not None and not isinstance(filters[key], str):
+                return jsonify({'error': f'filter.{key} must be a string'}), 400
+        if data.get('cursor') is not None and not isinstance(data['cursor'], str):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        try:
+            since = parse_datetime(filters.get('since'))
+            until = parse_datetime(filters.get('until'))
+            business_id = parse_id(filters.get('business_id'), 'business_id')
+            after = decode_cursor(data['cursor']) if data.get('cursor') else None
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        if business_id is not None:
+            query = query.filter(GeneratedContent.business_id == business_id)
+        if filters.get('platform'):
+            query = query.filter(GeneratedContent.platform == filters['platform'])
+        if filters.get('model'):
+            query = query.filter(GeneratedContent.model == filters['model'])
+        if since:
+            query = query.filter(GeneratedContent.created_at >= since)
+        if until:
+            query = query.filter(GeneratedContent.created_at < until)
+        if after:
+            # Updated posts still match the filter - the cursor moves past them
+            query = query.filter(keyset_after(GeneratedContent.created_at, GeneratedContent.id, *after))
+        contents = query.order_by(GeneratedContent.created_at, GeneratedContent.id).limit(BULK_MAX_ITEMS + 1).all()
+        has_more = len(contents) > BULK_MAX_ITEMS
+        contents = contents[:BULK_MAX_ITEMS]
+        if has_more:
+            next_cursor = encode_cursor(contents[-1].created_at, contents[-1].id)
+    
+    found_ids = {content.id for content in contents}
+    archived = []
+    if action == 'delete' and ids:
+        missing = [i for i in ids if i not in found_ids]
+        if missing:
+            archived = _owned_archived_content(current_user_id).filter(ArchivedRecord.record_id.in_(missing)).all()
+            found_ids.update(record.record_id for record in archived)
+    not_found = [i for i in ids if i not in found_ids] if ids is not None else []
+    
+    # ORM-level changes so rollups, search triggers, updated_at and tombstones all apply
+    if action == 'delete':
+        _delete_contents(contents, current_user_id)
+        delete_archived_content(archived)
+    else:
+        for content in contents:
+            for field, value in fields.items():
+                setattr(content, field, value)
+    db.session.commit()
+    
+    print(f"📦 Bulk {action}: {len(contents) + len(archived)} post(s) for user {current_user_id}")
+    return jsonify({
+        'success': True,
+        'action': action,
+        'affected': len(contents) + len(archived),
+        'ids': sorted(found_ids),
+        'not_found': not_found,
+        'has_more': has_more,
+        'next_cursor': next_cursor
+    }), 200
+
+
 @api_bp.route('/content/<int:content_id>', methods=['PATCH'])
 @jwt_required()
 def update_content(content_id):
@@ -522,6 +1010,52 @@ def create_campaign():
     
     return jsonify(new_campaign.to_dict()), 201
 
+@api_bp.route('/campaign/<int:id>/launch', methods=['POST'])
+@jwt_required()
+def api_launch_campaign(id):
+    """
+    Queue one post per strategy day, with images/narration/video pre-rendered ahead of each slot.
+    Body: platforms (overrides each day's Platform), video (render narrated videos),
+          tts (narrate every post, with or without video),
+          constraints {min_spacing_minutes, per_day_cap, timezone, blackout, start}, dry_run
+    """
+    current_user_id = int(get_jwt_identity())
+    data = request.json or {}
+    campaign = db.session.get(Campaign, id)
+    if not campaign:
+        return jsonify({'error': 'Campaign not found'}), 404
+    business, error_resp, code = verify_business_access(campaign.business_id, current_user_id)
+    if error_resp:
+        return error_resp, code
+
+    platforms = data.get('platforms')
+    if platforms is not None:
+        if not isinstance(platforms, list) or not parse_platforms(platforms):
+            return jsonify({'error': 'platforms must be a list of supported platform names'}), 400
+        platforms = parse_platforms(platforms)
+    constraints, error = parse_constraints(data.get('constraints'))
+    if error:
+        return jsonify({'error': error}), 400
+
+    video = data.get('video')
+    result = launch_campaign(campaign, current_user_id, constraints, platforms,
+                             None if video is None else bool(video), tts=bool(data.get('tts')),
+                             dry_run=bool(data.get('dry_run')))
+    return jsonify(result), 200 if result['success'] else 409
+
+@api_bp.route('/campaign/<int:id>/schedule', methods=['GET'])
+@jwt_required()
+def api_campaign_schedule(id):
+    """Scheduled posts of a launched campaign with their render status and assets"""
+    current_user_id = int(get_jwt_identity())
+    campaign = db.session.get(Campaign, id)
+    if not campaign:
+        return jsonify({'error': 'Campaign not found'}), 404
+    business, error_resp, code = verify_business_access(campaign.business_id, current_user_id)
+    if error_resp:
+        return error_resp, code
+    return jsonify({'campaign_id': id, 'posts': get_campaign_schedule(id)})
+
 @api_bp.route('/viral-doctor', methods=['POST'])
 @jwt_required()
 def viral_doctor():
@@ -558,8 +1092,7 @@ def competitor_spy():
         swot_analysis=analysis,
         business_id=business_id
     )
-    db.session.add(new_data)
-    db.session.commit()
+    save_record(new_data)
     
     return jsonify(new_data.to_dict())
 
@@ -588,8 +1121,7 @@ def audio_studio():
             original_text=text,
             business_id=business_id
         )
-        db.session.add(new_audio)
-        db.session.commit()
+        save_record(new_audio)
         return jsonify(new_audio.to_dict())
     
     return jsonify({'error': 'Audio generation failed'}), 500
@@ -608,12 +1140,19 @@ def publish_to_platform():
     """
     One-click publish content to social media platforms
     Supports: Twitter, LinkedIn, Email, Blog
+    Goes through the publish outbox: publishing the same content_id with the same payload (or the
+    same Idempotency-Key header) again never posts twice, and transient failures are retried
+    automatically (202 queued). An edited body or another email recipient/subject is a new publish.
+    With business_id and no content_id the content is saved first, in the same transaction -
+    once per Idempotency-Key, or per identical post without one.
     """
+    current_user_id = int(get_jwt_identity())
     data = request.json
     platform = data.get('platform')
     content = data.get('content')
     image_url = data.get('image_url')
     content_id = data.get('content_id')
+    business_id = data.get('business_id')
     
     # Extra data for specific platforms
     extra_data = {
@@ -626,21 +1165,47 @@ def publish_to_platform():
         return jsonify({'error': 'Platform and content required'}), 400
     
     video_url = data.get('video_url')
-    result = publish_content(platform, content, image_url, video_url, extra_data)
-    
-    # Update the content record if content_id provided
-    if content_id and result.get('success'):
+    key = request.headers.get('Idempotency-Key')
+    key = f'client:{current_user_id}:{key}' if key else None
+    if content_id:
         content_record = GeneratedContent.query.get(content_id)
-        if content_record:
-            # Mark as published (could add a published_platforms field)
-            pass
+        if not content_record:
+            return jsonify({'error': 'Content not found'}), 404
+        business, error_resp, code = verify_business_access(content_record.business_id, current_user_id)
+        if error_resp:
+            return error_resp, code
+        business_id = content_record.business_id
+        key = key or content_key(content_id, platform, payload_digest(content, image_url, video_url, extra=extra_data))
+    elif business_id is not None:
+        business, error_resp, code = verify_business_access(business_id, current_user_id)
+        if error_resp:
+            return error_resp, code
+        # Outbox row first, keyed on the payload: a repeat finds it and reuses its content record
+        key = key or payload_key(current_user_id, content, image_url, video_url, extra=extra_data)
+        row = enqueue('publish_content', platform, content, image_url, video_url, extra=extra_data,
+                      key=key, user_id=current_user_id, business_id=business_id)
+        if row.content_id is None:
+            # Committed together with the outbox row by publish()
+            content_record = GeneratedContent(platform=platform, content=content, image_url=image_url,
+                                              video_url=video_url, business_id=business_id)
+            db.session.add(content_record)
+            db.session.flush()
+            row.content_id = content_record.id
+        content_id = row.content_id
+
+    result = publish('publish_content', platform, content, image_url, video_url, extra=extra_data,
+                     key=key, content_id=content_id, user_id=current_user_id, business_id=business_id)
     
     if result.get('success'):
         return jsonify({
             'success': True,
             'message': f'Successfully published to {platform}',
-            'data': result.get('data')
+            'data': result.get('data'),
+            'content_id': content_id,
+            'already_sent': result.get('already_sent', False)
         })
+    elif result.get('queued'):
+        return jsonify({**result, 'content_id': content_id}), 202, {'Retry-After': str(result['retry_after'])}
     else:
         return jsonify({
             'success': False,
@@ -648,12 +1213,32 @@ def publish_to_platform():
         }), 400
 
 
+@api_bp.route('/publish/outbox', methods=['GET'])
+@jwt_required()
+def api_publish_outbox():
+    """The user's publish outbox, newest first. Query: status, content_id, limit"""
+    current_user_id = int(get_jwt_identity())
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        content_id = parse_id(request.args.get('content_id'), 'content_id')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    query = PublishOutbox.query.filter_by(user_id=current_user_id)
+    if request.args.get('status'):
+        query = query.filter_by(status=request.args['status'])
+    if content_id is not None:
+        query = query.filter_by(content_id=content_id)
+    rows = query.order_by(PublishOutbox.created_at.desc(), PublishOutbox.id.desc()).limit(limit).all()
+    return jsonify({'items': [row.to_dict() for row in rows]})
+
+
 # ============ AUTOMATED SCHEDULING ENDPOINTS ============
 
 @api_bp.route('/scheduler/post-now', methods=['POST'])
 @jwt_required()
 def api_post_immediately():
     """Post immediately to specified platforms (Ayrshare for social, Blogger for blog)"""
+    current_user_id = int(get_jwt_identity())
     data = request.json
     content = data.get('content')
     platforms = data.get('platforms', ['twitter'])
@@ -663,27 +1248,89 @@ def api_post_immediately():
     if not content:
         return jsonify({'error': 'Content required'}), 400
     
-    result = post_immediately(content, platforms, image_url, title)
+    key = request.headers.get('Idempotency-Key')
+    result = post_immediately(content, platforms, image_url, title,
+                              idempotency_key=f'client:{current_user_id}:{key}' if key else None,
+                              user_id=current_user_id)
+    if result.get('queued'):
+        return jsonify(result), 202, {'Retry-After': str(result['retry_after'])}
     return jsonify(result)
 
 
+@api_bp.route('/publish/limits', methods=['GET'])
+@jwt_required()
+def api_publish_limits():
+    """Token buckets of this process's publish rate limiter, per account and platform"""
+    return jsonify({'buckets': limiter.snapshot()})
+
+
 @api_bp.route('/scheduler/schedule', methods=['POST'])
 @jwt_required()
 def api_schedule_post():
     """Schedule a post for next peak hour or specific time"""
+    current_user_id = int(get_jwt_identity())
     data = request.json
     content = data.get('content')
     platforms = data.get('platforms', ['twitter'])
     image_url = data.get('image_url')
     hours_from_now = data.get('hours_from_now')  # Optional
+    business_id = data.get('business_id')  # Optional
     
     if not content:
         return jsonify({'error': 'Content required'}), 400
+    if business_id is not None:
+        business, error_resp, code = verify_business_access(business_id, current_user_id)
+        if error_resp:
+            return error_resp, code
     
-    result = schedule_post(content, platforms, image_url, hours_from_now)
+    result = schedule_post(content, platforms, image_url, hours_from_now,
+                           business_id=business_id, user_id=current_user_id, title=data.get('title'))
     return jsonify(result)
 
 
+@api_bp.route('/scheduler/plan', methods=['POST'])
+@jwt_required()
+def api_plan_posts():
+    """
+    Spread a batch of posts over the coming days and queue them in one go.
+    Body: business_id, posts [{content, platforms?, image_url?, title?}], platforms (default for posts),
+          constraints {min_spacing_minutes, per_day_cap, timezone, blackout [{start, end, days?}], start, days},
+          dry_run (plan only)
+    """
+    current_user_id = int(get_jwt_identity())
+    data = request.json or {}
+    business_id = data.get('business_id')
+    posts = data.get('posts')
+    default_platforms = data.get('platforms') or ['twitter']
+
+    if not business_id:
+        return jsonify({'error': 'business_id required'}), 400
+    business, error_resp, code = verify_business_access(business_id, current_user_id)
+    if error_resp:
+        return error_resp, code
+    if not isinstance(posts, list) or not posts:
+        return jsonify({'error': 'posts must be a non-empty list'}), 400
+    if len(posts) > PLANNER_MAX_POSTS:
+        return jsonify({'error': f'At most {PLANNER_MAX_POSTS} posts per plan'}), 400
+
+    batch = []
+    for i, post in enumerate(posts):
+        if not isinstance(post, dict) or not str(post.get('content') or '').strip():
+            return jsonify({'error': f'Post {i}: content required'}), 400
+        platforms = post.get('platforms') or default_platforms
+        if not isinstance(platforms, list) or not all(isinstance(p, str) and p for p in platforms):
+            return jsonify({'error': f'Post {i}: platforms must be a list of names'}), 400
+        batch.append({'content': post['content'], 'platforms': platforms,
+                      'image_url': post.get('image_url'), 'title': post.get('title')})
+
+    constraints, error = parse_constraints(data.get('constraints'))
+    if error:
+        return jsonify({'error': error}), 400
+
+    result = schedule_batch(business_id, current_user_id, batch, constraints, dry_run=bool(data.get('dry_run')))
+    return jsonify(result), 200 if result['success'] else 409
+
+
 @api_bp.route('/scheduler/auto-trending/<int:business_id>', methods=['POST'])
 @jwt_required()
 def api_auto_post_trending(business_id):
@@ -703,8 +1350,9 @@ def api_auto_post_trending(business_id):
 @api_bp.route('/scheduler/queue', methods=['GET'])
 @jwt_required()
 def api_get_scheduled_posts():
-    """Get all scheduled posts in queue"""
-    posts = get_scheduled_posts()
+    """Get the user's scheduled posts (optionally ?status=pending|dispatching|sent|failed)"""
+    current_user_id = int(get_jwt_identity())
+    posts = get_scheduled_posts(current_user_id, status=request.args.get('status'))
     return jsonify({'scheduled_posts': posts})
 
 
@@ -790,28 +1438,106 @@ def api_get_peak_hours():
     return jsonify({'peak_hours': get_peak_hours_info()})
 
 
+@api_bp.route('/business/<int:id>/peak-hours', methods=['GET'])
+@jwt_required()
+def api_business_peak_hours(id):
+    """Peak hours per weekday learned from this business's engagement (configured hours until it has data)"""
+    current_user_id = get_jwt_identity()
+    business, error_resp, code = verify_business_access(id, int(current_user_id))
+    if error_resp:
+        return error_resp, code
+
+    platform = request.args.get('platform')
+    return jsonify({'success': True, 'platforms': describe_peak_models(id, [platform] if platform else None)})
+
+
+@api_bp.route('/business/<int:id>/engagement', methods=['GET'])
+@jwt_required()
+def api_business_engagement(id):
+    """
+    Recently published posts with their latest engagement.
+    Query: days (default 30), limit (default 100), post_id (adds that post's metric history)
+    """
+    current_user_id = get_jwt_identity()
+    business, error_resp, code = verify_business_access(id, int(current_user_id))
+    if error_resp:
+        return error_resp, code
+
+    days = min(request.args.get('days', 30, type=int), 365)
+    limit = min(request.args.get('limit', 100, type=int), 500)
+    response = {'success': True, 'posts': get_engagement(id, days, limit)}
+
+    post_id = request.args.get('post_id', type=int)
+    if post_id:
+        post = PublishedPost.query.get(post_id)
+        if not post or post.business_id != id:
+            return jsonify({'error': 'Published post not found'}), 404
+        response['history'] = get_post_metrics(post_id)
+    return jsonify(response)
+
+
 @api_bp.route('/scheduler/start/<int:business_id>', methods=['POST'])
 @jwt_required()
 def api_start_automation(business_id):
-    """Start automatic posting scheduler"""
-    user_id = get_jwt_identity()
+    """Start automatic posting for one business (other businesses keep running)"""
+    user_id = int(get_jwt_identity())
     
-    if not verify_business_access(business_id, user_id):
-        return jsonify({'error': 'Access denied'}), 403
+    business, error_resp, code = verify_business_access(business_id, user_id)
+    if error_resp:
+        return error_resp, code
     
     data = request.json or {}
     interval_hours = data.get('interval_hours', 4)
+    platforms = data.get('platforms', ['twitter', 'linkedin'])
     
-    result = start_auto_scheduler(business_id, interval_hours)
+    if not isinstance(interval_hours, (int, float)) or not 0 < interval_hours <= 168:
+        return jsonify({'error': 'interval_hours must be a number between 0 and 168'}), 400
+    if not isinstance(platforms, list) or not platforms:
+        return jsonify({'error': 'platforms must be a non-empty list'}), 400
+    
+    result = start_auto_scheduler(business_id, interval_hours, platforms)
     return jsonify(result)
 
 
 @api_bp.route('/scheduler/stop', methods=['POST'])
 @jwt_required()
 def api_stop_automation():
-    """Stop automatic posting scheduler"""
-    result = stop_auto_scheduler()
-    return jsonify(result)
+    """Stop automatic posting for {"business_id": ...}, or for all of the user's businesses"""
+    user_id = int(get_jwt_identity())
+    data = request.get_json(silent=True) or {}
+    business_id = data.get('business_id')
+    
+    if business_id is not None:
+        business, error_resp, code = verify_business_access(business_id, user_id)
+        if error_resp:
+            return error_resp, code
+        return jsonify(stop_auto_scheduler(business_id))
+    
+    business_ids = [b.id for b in BusinessProfile.query.filter_by(user_id=user_id).with_entities(BusinessProfile.id)]
+    stopped = [r['job'] for r in (stop_auto_scheduler(bid) for bid in business_ids) if r.get('success')]
+    return jsonify({'success': True, 'message': f'Auto-scheduler stopped for {len(stopped)} business(es)', 'jobs': stopped})
+
+
+@api_bp.route('/scheduler/status', methods=['GET'])
+@jwt_required()
+def api_automation_status():
+    """Running automation jobs for the user's businesses (?business_id= for one)"""
+    user_id = int(get_jwt_identity())
+    try:
+        business_id = parse_id(request.args.get('business_id'), 'business_id')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if business_id is not None:
+        business, error_resp, code = verify_business_access(business_id, user_id)
+        if error_resp:
+            return error_resp, code
+        business_ids = [business_id]
+    else:
+        business_ids = [b.id for b in BusinessProfile.query.filter_by(user_id=user_id).with_entities(BusinessProfile.id)]
+    
+    jobs = get_automation_status(business_ids)
+    return jsonify({'success': True, 'running': bool(jobs), 'jobs': jobs})
 
 
 @api_bp.route('/scheduler/peak-hours', methods=['PUT'])
@@ -1223,48 +1949,33 @@ def analytics_summary():
     📊 Analytics Dashboard: Get summary of all content generation and performance.
     Visual appeal + analytics = enterprise credibility!
     """
-    current_user_id = get_jwt_identity()
-    
-    # Get all user's content
-    contents = GeneratedContent.query.join(BusinessProfile).filter(
-        BusinessProfile.user_id == int(current_user_id)
-    ).all()
-    
-    # Calculate stats
-    total_posts = len(contents)
-    platforms = {}
-    for c in contents:
-        p = c.platform or 'Unknown'
-        platforms[p] = platforms.get(p, 0) + 1
+    current_user_id = int(get_jwt_identity())
     
-    # Get content with images, videos, audio
-    with_images = sum(1 for c in contents if c.image_url)
-    with_videos = sum(1 for c in contents if c.video_url)
-    with_audio = sum(1 for c in contents if c.audio_url)
+    # Totals and platform mix come from the incrementally maintained rollups
+    totals, platforms = get_content_stats(current_user_id)
+    total_posts = totals['total_posts']
     
-    # Get businesses
-    businesses = BusinessProfile.query.filter_by(user_id=int(current_user_id)).all()
+    owned_businesses = db.session.query(BusinessProfile.id).filter(BusinessProfile.user_id == current_user_id)
+    business_count = owned_businesses.count()
+    total_products = db.session.query(func.count(Product.id)).filter(
+        Product.business_id.in_(owned_businesses)
+    ).scalar()
     
-    # Get products count
-    total_products = sum(len(Product.query.filter_by(business_id=b.id).all()) for b in businesses)
-    
-    # Recent activity (last 7 days)
-    from datetime import datetime, timedelta
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    recent_posts = [c for c in contents if c.created_at and c.created_at > week_ago]
+    # Recent activity (today and the 6 days before) from the daily rollups
+    posts_this_week = get_recent_posts(owned_businesses)
     
     return jsonify({
         'success': True,
         'analytics': {
             'total_posts': total_posts,
-            'posts_this_week': len(recent_posts),
+            'posts_this_week': posts_this_week,
             'platforms': platforms,
             'media_stats': {
-                'with_images': with_images,
-                'with_videos': with_videos,
-                'with_audio': with_audio
+                'with_images': totals['with_images'],
+                'with_videos': totals['with_videos'],
+                'with_audio': totals['with_audio']
             },
-            'businesses': len(businesses),
+            'businesses': business_count,
             'products': total_products,
             'engagement_estimate': {
                 'total_reach': total_posts * 2500,  # Estimated
@@ -1275,6 +1986,46 @@ def analytics_summary():
     })
 
 
+@api_bp.route('/analytics/timeseries', methods=['GET'])
+@jwt_required()
+def analytics_timeseries():
+    """
+    Daily posts per platform, model usage and media mix for charts.
+    Query: from, to (YYYY-MM-DD, default last 30 days), optional business_id.
+    Served from the daily rollup table without touching generated_content.
+    """
+    current_user_id = int(get_jwt_identity())
+    
+    try:
+        end = parse_datetime(request.args.get('to'))
+        end = end.date() if end else datetime.now().date()
+        start = parse_datetime(request.args.get('from'))
+        start = start.date() if start else end - timedelta(days=29)
+        business_id = parse_id(request.args.get('business_id'), 'business_id')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if start > end:
+        return jsonify({'error': "'from' must not be after 'to'"}), 400
+    if (end - start).days >= MAX_TIMESERIES_DAYS:
+        return jsonify({'error': f'Range too large (max {MAX_TIMESERIES_DAYS} days)'}), 400
+    
+    if business_id is not None:
+        business, error_resp, code = verify_business_access(business_id, current_user_id)
+        if error_resp:
+            return error_resp, code
+        business_ids = [business_id]
+    else:
+        business_ids = [b.id for b in db.session.query(BusinessProfile.id).filter_by(user_id=current_user_id)]
+    
+    return jsonify({
+        'success': True,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'series': get_timeseries(business_ids, start, end)
+    })
+
+
 @api_bp.route('/demo-mode', methods=['POST'])
 @jwt_required()
 def demo_mode():
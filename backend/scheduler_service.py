@@ -3,18 +3,26 @@ Automated Post Scheduler Service
 Generates trend-based content and posts at optimal peak hours
 """
 import os
-import threading
-import time
 import json
-from datetime import datetime, timedelta
+import heapq
+import atexit
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 import requests
+from sqlalchemy import func, update
+from peak_model_service import next_peak_slot, is_peak_slot
+from rate_limit_service import rate_limited_post, RateLimited
+from outbox_service import maybe_delivered
+from social_service import ayrshare_error
 
 load_dotenv()
 
 # Ayrshare API
 AYRSHARE_API_KEY = os.getenv('AYRSHARE_API_KEY')
-AYRSHARE_BASE_URL = 'https://api.ayrshare.com/api'
+AYRSHARE_BASE_URL = os.getenv('AYRSHARE_BASE_URL', 'https://api.ayrshare.com/api').rstrip('/')
 
 # Default peak hours by platform (24-hour format)
 # Based on industry research: Sprout Social, Hootsuite, Buffer studies
@@ -28,17 +36,31 @@ DEFAULT_PEAK_HOURS = {
 # Peak hours config file path
 PEAK_HOURS_FILE = os.path.join(os.path.dirname(__file__), 'peak_hours_config.json')
 
-# Scheduler state
-scheduler_running = False
-scheduled_posts = []
+# Automation engine: threads that pre-generate trending posts for upcoming peak slots
+AUTOMATION_WORKERS = int(os.getenv('AUTOMATION_WORKERS', 4))
+# Content is generated this long before each peak slot, so slow providers can't push a post past its peak
+AUTOMATION_PREGENERATE_MINUTES = int(os.getenv('AUTOMATION_PREGENERATE_MINUTES', 20))
+# A staged post not published this long after its slot is skipped - the peak (and the news) has passed
+AUTOMATION_STAGE_TTL_MINUTES = int(os.getenv('AUTOMATION_STAGE_TTL_MINUTES', 60))
+# How often the leader picks up jobs started or stopped through other workers
+AUTOMATION_SYNC_SECONDS = int(os.getenv('AUTOMATION_SYNC_SECONDS', 5))
+# Incremental syncs re-read this much before the last one - absorbs clock skew between workers
+AUTOMATION_SYNC_OVERLAP = timedelta(seconds=30)
+
+
+_peak_hours_cache = {'mtime': None, 'hours': None}
 
 
 def load_peak_hours():
-    """Load custom peak hours from config file, or use defaults"""
+    """Load custom peak hours from config file, or use defaults (cached until the file changes)"""
     try:
         if os.path.exists(PEAK_HOURS_FILE):
-            with open(PEAK_HOURS_FILE, 'r') as f:
-                return json.load(f)
+            mtime = os.stat(PEAK_HOURS_FILE).st_mtime_ns
+            if mtime != _peak_hours_cache['mtime']:
+                with open(PEAK_HOURS_FILE, 'r') as f:
+                    _peak_hours_cache['hours'] = json.load(f)
+                _peak_hours_cache['mtime'] = mtime
+            return _peak_hours_cache['hours']
     except Exception as e:
         print(f"Error loading peak hours config: {e}")
     return DEFAULT_PEAK_HOURS.copy()
@@ -49,6 +71,7 @@ def save_peak_hours(peak_hours):
     try:
         with open(PEAK_HOURS_FILE, 'w') as f:
             json.dump(peak_hours, f, indent=2)
+        _peak_hours_cache['mtime'] = None
         return True
     except Exception as e:
         print(f"Error saving peak hours config: {e}")
@@ -57,31 +80,21 @@ def save_peak_hours(peak_hours):
 
 def update_peak_hours(platform, hours):
     """Update peak hours for a specific platform"""
-    peak_hours = load_peak_hours()
+    peak_hours = dict(load_peak_hours())  # Don't touch the cached copy
     peak_hours[platform.lower()] = sorted(list(set(hours)))  # Remove duplicates, sort
     save_peak_hours(peak_hours)
     return peak_hours
 
 
-def is_peak_hour(platform):
-    """Check if current hour is peak for the platform"""
-    current_hour = datetime.now().hour
-    peak_hours = load_peak_hours()
-    return current_hour in peak_hours.get(platform.lower(), [])
-
+def is_peak_hour(platform, business_id=None):
+    """Check if current hour is peak for the platform (the business's learned hours if it has any)"""
+    return is_peak_slot(platform, datetime.now(), business_id)
 
 
-def get_next_peak_hour(platform):
+def get_next_peak_hour(platform, business_id=None):
     """Get the next peak hour for scheduling"""
-    current_hour = datetime.now().hour
-    peak_hours = load_peak_hours().get(platform.lower(), [9, 12, 18])
-    
-    for hour in sorted(peak_hours):
-        if hour > current_hour:
-            return hour
-    
-    # Next day's first peak hour
-    return sorted(peak_hours)[0]
+    next_hour = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    return next_peak_slot([platform], next_hour, business_id).hour
 
 
 def post_to_ayrshare(content, platforms, image_url=None, schedule_time=None):
@@ -119,7 +132,8 @@ def post_to_ayrshare(content, platforms, image_url=None, schedule_time=None):
         payload['scheduledDate'] = schedule_time
     
     try:
-        response = requests.post(
+        response = rate_limited_post(
+            platforms_list,
             f'{AYRSHARE_BASE_URL}/post',
             headers=headers,
             json=payload,
@@ -130,9 +144,12 @@ def post_to_ayrshare(content, platforms, image_url=None, schedule_time=None):
         if response.status_code in [200, 201]:
             return {'success': True, 'data': result}
         else:
-            return {'success': False, 'error': result.get('message', str(result))}
+            return ayrshare_error(response, result)
+    except RateLimited as e:
+        return e.to_result()
     except Exception as e:
-        return {'success': False, 'error': str(e)}
+        # Timeouts, dropped connections, non-JSON error pages - worth retrying
+        return {'success': False, 'error': str(e), 'transient': True}
 
 
 def post_to_blogger(title, content, image_url=None):
@@ -174,48 +191,100 @@ def post_to_blogger(title, content, image_url=None):
             return {'success': True, 'data': {'id': result.get('id'), 'url': result.get('url')}}
         else:
             error_msg = result.get('error', {}).get('message', str(result))
-            return {'success': False, 'error': error_msg}
+            return {'success': False, 'error': error_msg, 'status_code': response.status_code}
     except Exception as e:
-        return {'success': False, 'error': str(e)}
+        return {'success': False, 'error': str(e), 'transient': True, 'maybe_delivered': maybe_delivered(e)}
+
 
+def check_publish_config(platforms):
+    """Error message if the platforms can't be published with this configuration, else None"""
+    if not AYRSHARE_API_KEY and any(p.lower() not in ('blog', 'email') for p in platforms):
+        return 'Ayrshare API key not configured'
+    return None
 
-def schedule_post(content, platforms, image_url=None, hours_from_now=None):
+
+def schedule_post(content, platforms, image_url=None, hours_from_now=None,
+                  business_id=None, user_id=None, title=None):
     """
-    Schedule a post for the next peak hour or specific time
+    Schedule a post for the next peak hour or specific time.
+    The post is stored in the scheduled_post queue and published by the dispatcher.
     """
+    from models import db, ScheduledPost
+    import dispatcher_service
+
+    platforms = platforms if isinstance(platforms, list) else [platforms]
+    error = check_publish_config(platforms)
+    if error:
+        return {'success': False, 'error': error}
+
     if hours_from_now:
         schedule_time = datetime.now() + timedelta(hours=hours_from_now)
+    elif business_id:
+        # Next peak slot of any of the platforms that is clear of the business's queued posts
+        from planner_service import plan_posts, parse_constraints, plan_locked
+        constraints = parse_constraints({})[0]
+        slot = plan_locked(business_id, lambda: plan_posts(business_id, [{'platforms': platforms}], constraints)[0])
+        if slot is None:
+            db.session.rollback()
+            return {'success': False, 'error': 'No free slot in the coming days'}
+        schedule_time = slot['due_at'].replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
     else:
-        # Find next peak hour
-        platform = platforms[0] if isinstance(platforms, list) else platforms
-        next_peak = get_next_peak_hour(platform)
-        schedule_time = datetime.now().replace(hour=next_peak, minute=0, second=0)
-        
-        # If peak hour passed, schedule for tomorrow
-        if schedule_time <= datetime.now():
-            schedule_time += timedelta(days=1)
-    
-    # Format for Ayrshare (ISO 8601)
-    schedule_iso = schedule_time.strftime('%Y-%m-%dT%H:%M:%SZ')
-    
-    result = post_to_ayrshare(content, platforms, image_url, schedule_iso)
+        # Start of the next peak hour (configured hours)
+        next_hour = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        schedule_time = next_peak_slot(platforms, next_hour)
     
-    if result.get('success'):
-        scheduled_posts.append({
-            'content': content[:100] + '...' if len(content) > 100 else content,
-            'platforms': platforms,
-            'scheduled_time': schedule_time.strftime('%Y-%m-%d %H:%M'),
-            'status': 'scheduled'
-        })
-    
-    return result
+    post = ScheduledPost(
+        user_id=user_id,
+        business_id=business_id,
+        content=content,
+        platforms=platforms,
+        image_url=image_url,
+        title=title,
+        # Naive local time -> naive UTC, the queue's clock
+        due_at=schedule_time.astimezone(timezone.utc).replace(tzinfo=None)
+    )
+    db.session.add(post)
+    db.session.commit()
+    dispatcher_service.wake_if_due(post.due_at)
+
+    return {
+        'success': True,
+        'message': f"Scheduled for {schedule_time.strftime('%Y-%m-%d %H:%M')}",
+        'data': post.to_dict()
+    }
+
+
+def generate_trending_posts(business, platforms):
+    """
+    News fetch + LLM copy + image URL for each platform - the slow part of automation.
+    Returns ([{'platform', 'content', 'image_url', 'topic'}], None) or (None, error).
+    """
+    from ai_service import fetch_latest_news, generate_marketing_content, generate_image_from_text
+
+    # Get trending news
+    news = fetch_latest_news(business.industry)
+    if not news:
+        return None, 'No trending topics found'
+    topic = news[0].get('title') if isinstance(news[0], dict) else news[0]
+
+    # Generate content for each platform
+    posts = []
+    for platform in platforms:
+        gen_result = generate_marketing_content(platform, business.to_dict(), topic=f"Trending: {topic}")
+
+        content = gen_result.get('post_content') if isinstance(gen_result, dict) else str(gen_result)
+        image_prompt = gen_result.get('image_prompt') if isinstance(gen_result, dict) else None
+        if content:
+            # Generate AI Image for the trending post
+            image_url = generate_image_from_text(image_prompt) if image_prompt else None
+            posts.append({'platform': platform, 'content': content, 'image_url': image_url, 'topic': topic})
+    return posts, None
 
 
 def auto_post_trending(business_id, platforms=['twitter', 'linkedin']):
     """
     Automatically generate and post content based on trending topics
     """
-    from ai_service import fetch_latest_news, generate_marketing_content, generate_image_from_text
     from models import BusinessProfile
     
     try:
@@ -223,37 +292,20 @@ def auto_post_trending(business_id, platforms=['twitter', 'linkedin']):
         business = BusinessProfile.query.get(business_id)
         if not business:
             return {'success': False, 'error': 'Business not found'}
-        
-        # Get trending news
-        news = fetch_latest_news(business.industry)
-        
-        if not news:
-            return {'success': False, 'error': 'No trending topics found'}
-        
-        # Generate content for each platform
+
+        posts, error = generate_trending_posts(business, platforms)
+        if error:
+            return {'success': False, 'error': error}
+
         results = []
-        for platform in platforms:
-            gen_result = generate_marketing_content(
-                platform,
-                business.to_dict(),
-                topic=f"Trending: {news[0].get('title') if isinstance(news[0], dict) else news[0]}"
-            )
-            
-            content = gen_result.get('post_content') if isinstance(gen_result, dict) else str(gen_result)
-            image_prompt = gen_result.get('image_prompt') if isinstance(gen_result, dict) else None
-            
-            if content:
-                # Generate AI Image for the trending post
-                image_url = None
-                if image_prompt:
-                    image_url = generate_image_from_text(image_prompt)
-                
-                # Schedule for next peak hour
-                result = schedule_post(content, [platform], image_url=image_url)
-                results.append({
-                    'platform': platform,
-                    'result': result
-                })
+        for post in posts:
+            # Schedule for next peak hour
+            result = schedule_post(post['content'], [post['platform']], image_url=post['image_url'],
+                                   business_id=business_id, user_id=business.user_id)
+            results.append({
+                'platform': post['platform'],
+                'result': result
+            })
         
         return {'success': True, 'posts': results}
     
@@ -261,9 +313,63 @@ def auto_post_trending(business_id, platforms=['twitter', 'linkedin']):
         return {'success': False, 'error': str(e)}
 
 
-def get_scheduled_posts():
-    """Return list of scheduled posts"""
-    return scheduled_posts
+def stage_trending_posts(business_id, platforms, slot):
+    """
+    Pre-generate trending posts for an upcoming peak slot (naive local time) and queue
+    them due exactly at the slot. The dispatcher re-checks them before publishing and
+    skips any that expired or whose automation was stopped in the meantime.
+    """
+    from models import db, BusinessProfile, ScheduledPost
+    import dispatcher_service
+
+    try:
+        business = db.session.get(BusinessProfile, business_id)
+        if not business:
+            return {'success': False, 'error': 'Business not found'}
+
+        due_at = slot.astimezone(timezone.utc).replace(tzinfo=None)
+        # A slot already staged (e.g. before a leader handover) is not generated twice
+        staged = {platform for post_platforms, in db.session.query(ScheduledPost.platforms).filter(
+            ScheduledPost.business_id == business_id,
+            ScheduledPost.source == 'automation',
+            ScheduledPost.due_at == due_at
+        ) for platform in post_platforms}
+        platforms = [p for p in platforms if p not in staged]
+        if not platforms:
+            return {'success': True, 'posts': []}
+
+        posts, error = generate_trending_posts(business, platforms)
+        if error:
+            return {'success': False, 'error': error}
+
+        expires_at = due_at + timedelta(minutes=AUTOMATION_STAGE_TTL_MINUTES)
+        rows = [ScheduledPost(user_id=business.user_id, business_id=business_id, content=post['content'],
+                              platforms=[post['platform']], image_url=post['image_url'], due_at=due_at,
+                              source='automation', expires_at=expires_at)
+                for post in posts]
+        db.session.add_all(rows)
+        db.session.commit()
+
+        if dispatcher_service.dispatcher:
+            dispatcher_service.dispatcher.wake()
+        return {'success': True, 'posts': [{'platform': row.platforms[0], 'topic': post['topic'], 'id': row.id}
+                                           for row, post in zip(rows, posts)]}
+    except Exception as e:
+        db.session.rollback()
+        return {'success': False, 'error': str(e)}
+
+
+def get_scheduled_posts(user_id=None, status=None, limit=100):
+    """Return the user's scheduled posts, newest due time first"""
+    from models import ScheduledPost
+
+    query = ScheduledPost.query
+    if user_id is not None:
+        query = query.filter(ScheduledPost.user_id == user_id)
+    if status:
+        query = query.filter(ScheduledPost.status == status)
+    posts = query.order_by(ScheduledPost.due_at.desc()).limit(limit).all()
+    return [post.to_dict() for post in posts]
 
 
 def get_peak_hours_info():
@@ -271,32 +377,38 @@ def get_peak_hours_info():
     return load_peak_hours()
 
 
-def post_immediately(content, platforms, image_url=None, title=None):
+def post_to_platform(platform, content, image_url=None, title=None):
+    """
+    One provider call for one platform: blog posts go to the Blogger API, others to Ayrshare.
+    Used by the publish outbox - callers go through post_immediately.
+    """
+    platform_lower = platform.lower()
+    if platform_lower == 'blog':
+        # Use Blogger API for blog posts
+        return post_to_blogger(title or 'AutoMarketer Post', content, image_url)
+    if platform_lower == 'email':
+        # For email, we need a recipient - use a default or skip
+        return {'success': False, 'error': 'Email requires a recipient. Use the publish endpoint with recipient parameter.'}
+    # Use Ayrshare for social media (twitter, linkedin, instagram, facebook)
+    return post_to_ayrshare(content, [platform], image_url)
+
+
+def post_immediately(content, platforms, image_url=None, title=None, idempotency_key=None,
+                     user_id=None, business_id=None):
     """
     Post immediately to specified platforms
-    Routes blog posts to Blogger API, others to Ayrshare
+    Each platform goes through the publish outbox: a publish with the same idempotency key
+    (e.g. a retry) never posts twice, and transient failures are retried in the background.
     """
+    from outbox_service import publish
+
     results = []
     platforms_list = platforms if isinstance(platforms, list) else [platforms]
     
     for platform in platforms_list:
-        platform_lower = platform.lower()
-        
-        if platform_lower == 'blog':
-            # Use Blogger API for blog posts
-            post_title = title or 'AutoMarketer Post'
-            result = post_to_blogger(post_title, content, image_url)
-            results.append({'platform': platform, 'result': result})
-        elif platform_lower == 'email':
-            # Use Brevo for email
-            from social_service import send_email_campaign
-            # For email, we need a recipient - use a default or skip
-            result = {'success': False, 'error': 'Email requires a recipient. Use the publish endpoint with recipient parameter.'}
-            results.append({'platform': platform, 'result': result})
-        else:
-            # Use Ayrshare for social media (twitter, linkedin, instagram, facebook)
-            result = post_to_ayrshare(content, [platform], image_url)
-            results.append({'platform': platform, 'result': result})
+        result = publish('post_immediately', platform, content, image_url=image_url, title=title,
+                         key=idempotency_key, user_id=user_id, business_id=business_id)
+        results.append({'platform': platform, 'result': result})
     
     # If single platform, return single result
     if len(results) == 1:
@@ -304,36 +416,313 @@ def post_immediately(content, platforms, image_url=None, title=None):
     
     # For multiple platforms, return aggregated
     success = all(r['result'].get('success') for r in results)
-    return {
+    aggregated = {
         'success': success,
         'data': results,
         'message': f"Posted to {len([r for r in results if r['result'].get('success')])} platforms"
     }
+    queued = [r['result'] for r in results if r['result'].get('queued')]
+    if queued:
+        # The rest is retried by the outbox - the caller can check back after this long
+        aggregated['queued'] = True
+        aggregated['retry_after'] = max(r.get('retry_after') or 0 for r in queued)
+    return aggregated
+
+
+class EngineJob:
+    """In-memory run state for one business's automation (settings live in automation_job)"""
+
+    def __init__(self, business_id, platforms, interval_hours):
+        self.business_id = business_id
+        self.platforms = platforms
+        self.interval_hours = interval_hours
+        self.next_run = None
+        self.last_run = None
+        self.last_result = None
+        self.runs = 0
+        self.running = False
+        # Bumped on every reschedule/stop - heap entries with an older version are stale
+        self.version = 0
+
+    @property
+    def settings(self):
+        return tuple(self.platforms), self.interval_hours
+
+
+class AutomationEngine:
+    """
+    One timer thread for every business's automation: jobs sit in a min-heap keyed
+    by AUTOMATION_PREGENERATE_MINUTES before their next peak slot and the thread
+    sleeps exactly until the earliest one. Due jobs are handed to a small worker
+    pool that generates the posts and stages them in the queue due at the slot, so
+    publishing at the peak is just a dispatcher pop. Only the leader process runs
+    jobs (see leader_service); it loads them from the automation_job table, picks
+    up jobs started or stopped through other workers every AUTOMATION_SYNC_SECONDS
+    on its own sync thread, and writes run results back.
+    """
+
+    def __init__(self, app, max_workers=AUTOMATION_WORKERS):
+        self.app = app
+        self.active = False
+        self._jobs = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='automation')
+        self._thread = None
+        self._stopped = False
+        # updated_at high-water mark of the last sync; None loads every job
+        self._synced_at = None
+        self._sync_stop = threading.Event()
+
+    def activate(self):
+        """This process became the leader: load every job from the database"""
+        self.active = True
+        self._synced_at = None
+        self.sync_jobs()
+        self._sync_stop = threading.Event()
+        threading.Thread(target=self._sync_loop, args=(self._sync_stop,), name='automation-sync',
+                         daemon=True).start()
+
+    def deactivate(self):
+        """Leadership lost: drop all jobs (the new leader reloads them)"""
+        self.active = False
+        self._sync_stop.set()
+        with self._cond:
+            for job in self._jobs.values():
+                job.version += 1
+            self._jobs.clear()
+            self._cond.notify()
+
+    def sync_jobs(self):
+        """
+        Match the in-memory jobs to the automation_job table (needs an app context).
+        After the first load only rows updated since the last sync are read; the full
+        id list is read only when the row count shows a job was stopped elsewhere.
+        """
+        from models import db, AutomationJob
+
+        if not self.active:
+            return
+        started = datetime.utcnow()
+        query = AutomationJob.query
+        if self._synced_at is not None:
+            query = query.filter(AutomationJob.updated_at >= self._synced_at - AUTOMATION_SYNC_OVERLAP)
+        rows = {row.business_id: row for row in query.all()}
+        with self._cond:
+            known = set(self._jobs) | set(rows)
+        if self._synced_at is None:
+            existing = set(rows)
+        elif db.session.query(func.count()).select_from(AutomationJob).scalar() != len(known):
+            existing = {business_id for business_id, in db.session.query(AutomationJob.business_id)}
+        else:
+            existing = known
+
+        now = datetime.now()
+        changed = []
+        with self._cond:
+            if not self.active:
+                return
+            for business_id in set(self._jobs) - existing:
+                self.stop_job(business_id)
+            for business_id, row in rows.items():
+                job = self._jobs.get(business_id)
+                if job and job.settings == (tuple(row.platforms), row.interval_hours):
+                    continue
+                # Resume the cadence across restarts and leader changes
+                after = now
+                if row.last_run_at:
+                    after = max(now, row.last_run_at + timedelta(hours=row.interval_hours))
+                job = self.start_job(business_id, row.platforms, row.interval_hours, after=after)
+                job.last_run, job.runs = row.last_run_at, row.runs
+                changed.append({'business_id': business_id, 'next_run_at': job.next_run})
+        if changed:
+            db.session.execute(update(AutomationJob), changed)
+        db.session.commit()
+        self._synced_at = started
+
+    def start_job(self, business_id, platforms, interval_hours, after=None):
+        """Start (or reconfigure) automation for a business. Returns the job."""
+        with self._cond:
+            job = self._jobs.get(business_id)
+            if job is None:
+                job = self._jobs[business_id] = EngineJob(business_id, platforms, interval_hours)
+            else:
+                job.platforms, job.interval_hours = platforms, interval_hours
+            self._push(job, next_peak_slot(platforms, after or datetime.now(), business_id))
+            self._ensure_started()
+            self._cond.notify()
+            return job
+
+    def stop_job(self, business_id):
+        """Stop automation for a business. Returns the job, or None if it was not running."""
+        with self._cond:
+            job = self._jobs.pop(business_id, None)
+            if job is None:
+                return None
+            job.version += 1
+            job.next_run = None
+            self._cond.notify()
+            return job
+
+    def _sync_loop(self, stop):
+        from models import db
+
+        while not stop.wait(AUTOMATION_SYNC_SECONDS):
+            with self.app.app_context():
+                try:
+                    self.sync_jobs()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"❌ Automation sync error: {e}")
+                finally:
+                    db.session.remove()
+
+    def job_count(self):
+        with self._cond:
+            return len(self._jobs)
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._executor.shutdown(wait=False)
+
+    def _push(self, job, slot):
+        job.version += 1
+        job.next_run = slot
+        fire_at = slot - timedelta(minutes=AUTOMATION_PREGENERATE_MINUTES)
+        heapq.heappush(self._heap, (fire_at, next(self._seq), job.business_id, job.version, slot))
+
+    def _ensure_started(self):
+        # Started lazily so each gunicorn worker gets its own thread after fork
+        if not (self._thread and self._thread.is_alive()):
+            self._thread = threading.Thread(target=self._run, name='automation-engine', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        with self._cond:
+            while not self._stopped:
+                # Drop entries for stopped or rescheduled jobs
+                while self._heap:
+                    _, _, business_id, version, _ = self._heap[0]
+                    job = self._jobs.get(business_id)
+                    if job and job.version == version:
+                        break
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                delay = (self._heap[0][0] - datetime.now()).total_seconds()
+                if delay > 0:
+                    self._cond.wait(timeout=delay)
+                    continue
+
+                _, _, business_id, _, slot = heapq.heappop(self._heap)
+                job = self._jobs[business_id]
+                self._push(job, next_peak_slot(job.platforms, slot + timedelta(hours=job.interval_hours), business_id))
+                if job.running:
+                    print(f"⚠️ Automation for business {business_id} still running, skipping slot {slot:%H:%M}")
+                    continue
+                job.running = True
+                self._executor.submit(self._execute, job, slot)
+
+    def _execute(self, job, slot):
+        from models import db, AutomationJob
+
+        platforms = [p for p in job.platforms if is_peak_slot(p, slot, job.business_id)]
+        with self.app.app_context():
+            try:
+                result = stage_trending_posts(job.business_id, platforms, slot) if platforms else {
+                    'success': True, 'posts': []}
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+
+            last_result = {'success': result.get('success'), 'error': result.get('error'), 'platforms': platforms}
+            with self._cond:
+                job.running = False
+                job.last_run = slot
+                job.runs += 1
+                job.last_result = last_result
+                next_run = job.next_run
+            try:
+                db.session.execute(
+                    update(AutomationJob).where(AutomationJob.business_id == job.business_id).values(
+                        last_run_at=slot, next_run_at=next_run, runs=AutomationJob.runs + 1,
+                        last_result=last_result)
+                )
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"⚠️ Could not record automation run for business {job.business_id}: {e}")
+            finally:
+                db.session.remove()
+
+        print(f"🤖 Automation staged posts for business {job.business_id} at {slot:%H:%M} "
+              f"({', '.join(platforms) or 'no peak platforms'}): {'ok' if result.get('success') else result.get('error')}")
+
+
+automation_engine = None
+
+
+def init_automation(app):
+    """Create the automation engine - activated by leader election (leader_service)"""
+    global automation_engine
+    if automation_engine is None:
+        automation_engine = AutomationEngine(app)
+        atexit.register(automation_engine.shutdown)
+    return automation_engine
+
+
+def start_auto_scheduler(business_id, interval_hours=4, platforms=None):
+    """
+    Start background automation for one business (other businesses are unaffected).
+    The setting is stored; the leader process picks it up on its next sync.
+    """
+    from models import db, AutomationJob
+
+    platforms = platforms or ['twitter', 'linkedin']
+    job = db.session.get(AutomationJob, business_id)
+    if job is None:
+        job = AutomationJob(business_id=business_id)
+        db.session.add(job)
+    job.platforms = platforms
+    job.interval_hours = interval_hours
+    db.session.commit()
+
+    if automation_engine and automation_engine.active:
+        automation_engine.sync_jobs()
+        db.session.refresh(job)
+    when = f"next run {job.next_run_at:%Y-%m-%d %H:%M}" if job.next_run_at else 'starting shortly'
+    return {
+        'success': True,
+        'message': f"Auto-scheduler started (every {interval_hours} hours, {when})",
+        'job': job.to_dict()
+    }
 
 
-# Background scheduler (optional - for continuous automation)
-def start_auto_scheduler(business_id, interval_hours=4):
-    """Start background scheduler for automatic posting"""
-    global scheduler_running
-    scheduler_running = True
-    
-    def scheduler_loop():
-        while scheduler_running:
-            # Only post during peak hours
-            for platform in ['twitter', 'linkedin']:
-                if is_peak_hour(platform):
-                    auto_post_trending(business_id, [platform])
-            
-            # Wait for next interval
-            time.sleep(interval_hours * 3600)
-    
-    thread = threading.Thread(target=scheduler_loop, daemon=True)
-    thread.start()
-    return {'success': True, 'message': f'Auto-scheduler started (every {interval_hours} hours)'}
+def stop_auto_scheduler(business_id):
+    """Stop background automation for one business"""
+    from models import db, AutomationJob
+
+    job = db.session.get(AutomationJob, business_id)
+    if job is None:
+        return {'success': False, 'error': 'Automation is not running for this business'}
+    status = job.to_dict()
+    db.session.delete(job)
+    db.session.commit()
+
+    if automation_engine and automation_engine.active:
+        automation_engine.stop_job(business_id)
+    return {'success': True, 'message': 'Auto-scheduler stopped', 'job': status}
+
 
+def get_automation_status(business_ids):
+    """Automation status for the given businesses (only running jobs are listed)"""
+    from models import AutomationJob
 
-def stop_auto_scheduler():
-    """Stop the background scheduler"""
-    global scheduler_running
-    scheduler_running = False
-    return {'success': True, 'message': 'Auto-scheduler stopped'}
+    if not business_ids:
+        return []
+    jobs = AutomationJob.query.filter(AutomationJob.business_id.in_(business_ids)).all()
+    return [job.to_dict() for job in jobs]
@@ -0,0 +1,225 @@
+"""
+Full-Text Search
+SQLite FTS5 indexes over generated posts and campaign strategies, kept in sync by
+triggers, so every insert/update/delete path - ORM, write queue or raw SQL - stays
+indexed. Posts are an external-content table (no duplicate copy of the text);
+campaigns index the title and the string values of the strategy JSON, not its keys.
+On Postgres the same search runs on tsvector expression indexes (GIN).
+"""
+import re
+import html
+from datetime import datetime
+from sqlalchemy import text
+
+def _strategy_values(row):
+    """SQLite: every string value in a campaign row's strategy JSON, space separated"""
+    return (f"(SELECT group_concat(value, ' ') FROM json_tree(CASE WHEN json_valid({row}.strategy) "
+            f"THEN {row}.strategy ELSE '[]' END) WHERE type = 'text')")
+
+
+SEARCH_SCHEMA = [
+    # Generated posts
+    """CREATE VIRTUAL TABLE IF NOT EXISTS content_fts USING fts5(
+        content, content='generated_content', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS generated_content_fts_insert AFTER INSERT ON generated_content BEGIN
+        INSERT INTO content_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS generated_content_fts_delete AFTER DELETE ON generated_content BEGIN
+        INSERT INTO content_fts(content_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS generated_content_fts_update AFTER UPDATE OF content ON generated_content BEGIN
+        INSERT INTO content_fts(content_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO content_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    # Campaign titles and the text values of their 7-day strategies (not the JSON keys,
+    # which every strategy shares). A regular FTS table, since the indexed text isn't a column
+    """CREATE VIRTUAL TABLE IF NOT EXISTS campaign_fts USING fts5(
+        title, strategy, tokenize='porter unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS campaign_fts_insert AFTER INSERT ON campaign BEGIN
+        INSERT INTO campaign_fts(rowid, title, strategy) VALUES (new.id, new.title, {_strategy_values('new')});
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS campaign_fts_delete AFTER DELETE ON campaign BEGIN
+        DELETE FROM campaign_fts WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS campaign_fts_update AFTER UPDATE OF title, strategy ON campaign BEGIN
+        DELETE FROM campaign_fts WHERE rowid = old.id;
+        INSERT INTO campaign_fts(rowid, title, strategy) VALUES (new.id, new.title, {_strategy_values('new')});
+    END""",
+]
+
+# Postgres: strategy string values only (jsonb_to_tsvector skips keys)
+PG_CAMPAIGN_VECTOR = "to_tsvector('english', {row}title) || jsonb_to_tsvector('english', {row}strategy, '[\"string\"]')"
+# Postgres: GIN indexes on the same expressions the search queries use
+PG_SEARCH_SCHEMA = [
+    "CREATE INDEX IF NOT EXISTS ix_generated_content_search ON generated_content "
+    "USING GIN (to_tsvector('english', content))",
+    f"CREATE INDEX IF NOT EXISTS ix_campaign_search ON campaign USING GIN (({PG_CAMPAIGN_VECTOR.format(row='')}))",
+]
+
+SNIPPET_TOKENS = 16
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+# The database marks matches with these private-use characters; the snippet is HTML-escaped
+# before they become <mark> tags, so post text can't inject markup
+MATCH_START = '\ue000'
+MATCH_END = '\ue001'
+
+
+def create_search_index(connection):
+    """Create the FTS tables and sync triggers, then index existing rows"""
+    if connection.dialect.name == 'postgresql':
+        for statement in PG_SEARCH_SCHEMA:
+            connection.execute(text(statement))
+        return
+    for statement in SEARCH_SCHEMA:
+        connection.execute(text(statement))
+    rebuild_search_index(connection)
+
+
+def rebuild_search_index(connection):
+    """Re-read every row from the source tables into the FTS indexes"""
+    connection.execute(text("INSERT INTO content_fts(content_fts) VALUES ('rebuild')"))
+    connection.execute(text('DELETE FROM campaign_fts'))
+    connection.execute(text(
+        f"INSERT INTO campaign_fts(rowid, title, strategy) SELECT c.id, c.title, {_strategy_values('c')} FROM campaign c"
+    ))
+
+
+def drop_campaign_search_index(connection):
+    """Drop the campaign index so create_search_index can build it again (schema changes)"""
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('DROP INDEX IF EXISTS ix_campaign_search'))
+        return
+    for trigger in ('insert', 'delete', 'update'):
+        connection.execute(text(f'DROP TRIGGER IF EXISTS campaign_fts_{trigger}'))
+    connection.execute(text('DROP TABLE IF EXISTS campaign_fts'))
+
+
+def _search_words(query):
+    return re.findall(r'\w+', query or '')
+
+
+def build_match_query(query):
+    """
+    Turn free text into a safe FTS5 MATCH expression: every word must appear,
+    and the last word also matches as a prefix (search-as-you-type).
+    Returns None when there is nothing searchable.
+    """
+    words = _search_words(query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def build_tsquery(query):
+    """Postgres equivalent of build_match_query: 'word1 & word2:*'"""
+    words = _search_words(query)
+    if not words:
+        return None
+    return ' & '.join(words[:-1] + [words[-1] + ':*'])
+
+
+def _isoformat(value):
+    # Raw SQL returns SQLite datetimes as strings
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.isoformat() if value else None
+
+
+def render_snippet(snippet):
+    """Escape a database snippet as HTML and turn its match markers into <mark> tags"""
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(MATCH_START, HIGHLIGHT_START).replace(MATCH_END, HIGHLIGHT_END)
+
+
+def _sqlite_search_parts(doc_types):
+    # bm25 is negative (more negative = better), flipped so higher score = better
+    parts = []
+    if 'content' in doc_types:
+        parts.append(f"""
+            SELECT 'content' AS type, c.id AS id, c.business_id AS business_id, c.platform AS label,
+                   c.created_at AS created_at, -bm25(content_fts) AS score,
+                   snippet(content_fts, 0, '{MATCH_START}', '{MATCH_END}', '…', {SNIPPET_TOKENS}) AS snippet
+            FROM content_fts JOIN generated_content c ON c.id = content_fts.rowid
+            WHERE content_fts MATCH :match AND c.business_id IN (
+                SELECT id FROM business_profile WHERE user_id = :user_id)
+        """)
+    if 'campaign' in doc_types:
+        parts.append(f"""
+            SELECT 'campaign' AS type, c.id AS id, c.business_id AS business_id, c.title AS label,
+                   c.created_at AS created_at, -bm25(campaign_fts, 2.0, 1.0) AS score,
+                   snippet(campaign_fts, -1, '{MATCH_START}', '{MATCH_END}', '…', {SNIPPET_TOKENS}) AS snippet
+            FROM campaign_fts JOIN campaign c ON c.id = campaign_fts.rowid
+            WHERE campaign_fts MATCH :match AND c.business_id IN (
+                SELECT id FROM business_profile WHERE user_id = :user_id)
+        """)
+    return parts
+
+
+def _postgres_search_parts(doc_types):
+    headline = f"'StartSel={MATCH_START}, StopSel={MATCH_END}, MaxWords={SNIPPET_TOKENS}, MinWords=5'"
+    campaign_vector = PG_CAMPAIGN_VECTOR.format(row='c.')
+    # The text the vector was built from, for the headline
+    campaign_text = ("c.title || ' ' || COALESCE((SELECT string_agg(v #>> '{}', ' ') FROM "
+                     "jsonb_path_query(c.strategy, 'strict $.** ? (@.type() == \"string\")') v), '')")
+    parts = []
+    if 'content' in doc_types:
+        parts.append(f"""
+            SELECT 'content' AS type, c.id AS id, c.business_id AS business_id, c.platform AS label,
+                   c.created_at AS created_at, ts_rank(to_tsvector('english', c.content), q) AS score,
+                   ts_headline('english', c.content, q, {headline}) AS snippet
+            FROM generated_content c, to_tsquery('english', :match) q
+            WHERE to_tsvector('english', c.content) @@ q AND c.business_id IN (
+                SELECT id FROM business_profile WHERE user_id = :user_id)
+        """)
+    if 'campaign' in doc_types:
+        parts.append(f"""
+            SELECT 'campaign' AS type, c.id AS id, c.business_id AS business_id, c.title AS label,
+                   c.created_at AS created_at, ts_rank({campaign_vector}, q) AS score,
+                   ts_headline('english', {campaign_text}, q, {headline}) AS snippet
+            FROM campaign c, to_tsquery('english', :match) q
+            WHERE {campaign_vector} @@ q AND c.business_id IN (
+                SELECT id FROM business_profile WHERE user_id = :user_id)
+        """)
+    return parts
+
+
+def search_content(session, user_id, query, doc_types=('content', 'campaign'), limit=20, offset=0):
+    """
+    Ranked search (bm25 on SQLite, ts_rank on Postgres) over the user's posts and campaigns.
+    Posts and campaigns are scored by different indexes, so each source's scores are scaled
+    to its best match (0-1] before the two are merged.
+    Returns a list of dicts with type, id, business_id, created_at, snippet (escaped HTML with
+    <mark> around matches) and score.
+    """
+    if session.get_bind().dialect.name == 'postgresql':
+        match, parts = build_tsquery(query), _postgres_search_parts(doc_types)
+    else:
+        match, parts = build_match_query(query), _sqlite_search_parts(doc_types)
+    if not match or not parts:
+        return []
+
+    normalized = [f"""
+        SELECT type, id, business_id, label, created_at, snippet,
+               COALESCE(score / NULLIF(MAX(score) OVER (), 0), 0) AS score
+        FROM ({part}) matches
+    """ for part in parts]
+    sql = ' UNION ALL '.join(normalized) + ' ORDER BY score DESC, created_at DESC LIMIT :limit OFFSET :offset'
+    rows = session.execute(text(sql), {
+        'match': match, 'user_id': user_id, 'limit': limit, 'offset': offset
+    }).mappings().all()
+
+    return [{
+        'type': row['type'],
+        'id': row['id'],
+        'business_id': row['business_id'],
+        'label': row['label'],
+        'created_at': _isoformat(row['created_at']),
+        'snippet': render_snippet(row['snippet']),
+        'score': round(row['score'], 4),
+    } for row in rows]
@@ -5,14 +5,17 @@ Integrates with Ayrshare (Twitter/LinkedIn), Brevo (Email), and WordPress (Blog)
 import os
 import requests
 import json
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from rate_limit_service import rate_limited_post, RateLimited
+from outbox_service import maybe_delivered
 
 # Load environment variables
 load_dotenv()
 
 # Ayrshare API for Twitter/X and LinkedIn
 AYRSHARE_API_KEY = os.getenv('AYRSHARE_API_KEY')
-AYRSHARE_BASE_URL = 'https://api.ayrshare.com/api'
+AYRSHARE_BASE_URL = os.getenv('AYRSHARE_BASE_URL', 'https://api.ayrshare.com/api').rstrip('/')
 
 # Brevo API for Email
 BREVO_API_KEY = os.getenv('BREVO_API_KEY')
@@ -24,6 +27,58 @@ WP_USERNAME = os.getenv('WP_USERNAME')
 WP_APP_PASSWORD = os.getenv('WP_APP_PASSWORD')
 
 
+def ayrshare_error(response, result):
+    """Failed Ayrshare call -> error result with the HTTP status and Ayrshare error code (137 = duplicate)"""
+    errors = result.get('errors') if isinstance(result, dict) else None
+    first = errors[0] if isinstance(errors, list) and errors and isinstance(errors[0], dict) else {}
+    if not isinstance(result, dict):
+        return {'success': False, 'error': str(result), 'status_code': response.status_code, 'code': None}
+    return {'success': False, 'error': result.get('message') or first.get('message') or str(result),
+            'status_code': response.status_code, 'code': result.get('code', first.get('code'))}
+
+
+def find_ayrshare_post(platform, content, since):
+    """
+    Id of a post with this text that Ayrshare published on the platform since `since`
+    (naive UTC), from the account's post history - or None if there is none or it can't be read
+    """
+    if not AYRSHARE_API_KEY:
+        return None
+    days = max(1, (datetime.utcnow() - since).days + 1)
+    try:
+        response = requests.get(
+            f'{AYRSHARE_BASE_URL}/history',
+            headers={'Authorization': f'Bearer {AYRSHARE_API_KEY}'},
+            params={'lastDays': days, 'platforms': platform.lower()},
+            timeout=30
+        )
+        if response.status_code != 200:
+            return None
+        history = response.json()
+    except Exception as e:
+        print(f"⚠️ Could not read the Ayrshare post history: {e}")
+        return None
+
+    # Twitter posts are sent cut to 280 characters; the history has whole seconds at best
+    texts = {content.strip(), content[:280].strip()}
+    since = since.replace(microsecond=0)
+    for item in history.get('history', []) if isinstance(history, dict) else history:
+        if not isinstance(item, dict) or str(item.get('post', '')).strip() not in texts:
+            continue
+        if platform.lower() not in [str(p).lower() for p in item.get('platforms') or []]:
+            continue
+        try:
+            created = datetime.fromisoformat(str(item.get('created') or '').replace('Z', '+00:00'))
+            if created.tzinfo:
+                created = created.astimezone(timezone.utc).replace(tzinfo=None)
+            if created < since:
+                continue
+        except ValueError:
+            pass
+        return item.get('id')
+    return None
+
+
 def post_to_twitter(content, image_url=None, video_url=None):
     """
     Post to Twitter/X via Ayrshare API
@@ -51,7 +106,8 @@ def post_to_twitter(content, image_url=None, video_url=None):
     
     try:
         print(f"📤 Posting to Twitter: {payload}")
-        response = requests.post(
+        response = rate_limited_post(
+            ['twitter'],
             f'{AYRSHARE_BASE_URL}/post',
             headers=headers,
             json=payload
@@ -62,9 +118,12 @@ def post_to_twitter(content, image_url=None, video_url=None):
         if response.status_code == 200:
             return {'success': True, 'data': result}
         else:
-            return {'success': False, 'error': result.get('message', str(result))}
+            return ayrshare_error(response, result)
+    except RateLimited as e:
+        return e.to_result()
     except Exception as e:
-        return {'success': False, 'error': str(e)}
+        # Timeouts, dropped connections, non-JSON error pages - worth retrying
+        return {'success': False, 'error': str(e), 'transient': True}
 
 
 def post_to_linkedin(content, image_url=None, video_url=None):
@@ -94,7 +153,8 @@ def post_to_linkedin(content, image_url=None, video_url=None):
     
     try:
         print(f"📤 Posting to LinkedIn: {payload}")
-        response = requests.post(
+        response = rate_limited_post(
+            ['linkedin'],
             f'{AYRSHARE_BASE_URL}/post',
             headers=headers,
             json=payload
@@ -105,9 +165,12 @@ def post_to_linkedin(content, image_url=None, video_url=None):
         if response.status_code == 200:
             return {'success': True, 'data': result}
         else:
-            return {'success': False, 'error': result.get('message', str(result))}
+            return ayrshare_error(response, result)
+    except RateLimited as e:
+        return e.to_result()
     except Exception as e:
-        return {'success': False, 'error': str(e)}
+        # Timeouts, dropped connections, non-JSON error pages - worth retrying
+        return {'success': False, 'error': str(e), 'transient': True}
 
 
 def send_email_campaign(subject, content, recipient_email):
@@ -143,9 +206,9 @@ def send_email_campaign(subject, content, recipient_email):
         if response.status_code in [200, 201]:
             return {'success': True, 'data': result}
         else:
-            return {'success': False, 'error': result.get('message', 'Unknown error')}
+            return {'success': False, 'error': result.get('message', 'Unknown error'), 'status_code': response.status_code}
     except Exception as e:
-        return {'success': False, 'error': str(e)}
+        return {'success': False, 'error': str(e), 'transient': True, 'maybe_delivered': maybe_delivered(e)}
 
 
 def post_to_blogger(title, content, image_url=None):
@@ -220,14 +283,16 @@ def publish_content(platform, content, image_url=None, video_url=None, extra_dat
             payload['mediaUrls'] = [image_url]
         
         try:
-            response = requests.post(f'{AYRSHARE_BASE_URL}/post', headers=headers, json=payload)
+            response = rate_limited_post(['instagram'], f'{AYRSHARE_BASE_URL}/post', headers=headers, json=payload)
             result = response.json()
             print(f"📥 Instagram response: {result}")
             if response.status_code == 200:
                 return {'success': True, 'data': result}
-            return {'success': False, 'error': result.get('message', str(result))}
+            return ayrshare_error(response, result)
+        except RateLimited as e:
+            return e.to_result()
         except Exception as e:
-            return {'success': False, 'error': str(e)}
+            return {'success': False, 'error': str(e), 'transient': True}
     else:
         return {'success': False, 'error': f'Platform {platform} not supported'}
 
@@ -0,0 +1,136 @@
+"""
+Group-Commit Write Queue
+SQLite allows a single writer, so concurrent requests that each commit their own
+insert end up serialized behind one fsync apiece. This queue funnels append-only
+inserts (generated content, audio files, competitor reports, metric rows) through
+one writer thread that commits them in batches and hands ids back via futures.
+Disabled by default - enable with DB_WRITE_QUEUE_ENABLED=true.
+"""
+import os
+import queue
+import threading
+import atexit
+from concurrent.futures import Future
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+from models import db
+
+load_dotenv()
+
+WRITE_QUEUE_ENABLED = os.getenv('DB_WRITE_QUEUE_ENABLED', 'false').lower() == 'true'
+WRITE_QUEUE_MAX_BATCH = int(os.getenv('DB_WRITE_QUEUE_MAX_BATCH', 50))
+WRITE_QUEUE_MAX_WAIT_MS = int(os.getenv('DB_WRITE_QUEUE_MAX_WAIT_MS', 5))
+WRITE_QUEUE_RESULT_TIMEOUT = int(os.getenv('DB_WRITE_QUEUE_RESULT_TIMEOUT', 30))
+
+_STOP = object()
+
+
+class WriteQueue:
+    """Single writer thread that batches inserts into one transaction each"""
+
+    def __init__(self, app, max_batch=WRITE_QUEUE_MAX_BATCH, max_wait_ms=WRITE_QUEUE_MAX_WAIT_MS):
+        self.app = app
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, record):
+        """Queue a new (transient) model instance. Returns a Future resolving to its id."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((record, future))
+        return future
+
+    def _ensure_started(self):
+        # Started lazily so each gunicorn worker gets its own writer after fork
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name='db-write-queue', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=5):
+        """Flush pending writes and stop the writer thread"""
+        if self._thread and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _next_batch(self):
+        """Block for the first item, then collect more for up to max_wait"""
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=self.max_wait)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        # expire_on_commit=False keeps ids and defaults readable by the caller
+        session = Session(bind=db.engine, expire_on_commit=False)
+        try:
+            session.add_all([record for record, _ in batch])
+            session.commit()
+            session.expunge_all()
+            for record, future in batch:
+                future.set_result(record.id)
+        except Exception as e:
+            session.rollback()
+            session.expunge_all()
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+            else:
+                # One bad row should not fail everyone else's insert
+                print(f"⚠️ Write queue batch of {len(batch)} failed ({e}), retrying individually")
+                for item in batch:
+                    self._commit_batch([item])
+        finally:
+            session.close()
+
+
+write_queue = None
+
+
+def init_write_queue(app):
+    """Create the write queue for this app if enabled in the environment"""
+    global write_queue
+    if WRITE_QUEUE_ENABLED and write_queue is None:
+        write_queue = WriteQueue(app)
+        atexit.register(write_queue.stop)
+        print(f"✅ Write queue enabled (batch={write_queue.max_batch}, wait={WRITE_QUEUE_MAX_WAIT_MS}ms)")
+    return write_queue
+
+
+def save_record(record, wait=True):
+    """
+    Insert an append-only record.
+    Goes through the group-commit queue when enabled, otherwise commits directly.
+    With wait=False the queued Future is returned instead of the id (fire-and-forget).
+    """
+    if write_queue is None:
+        db.session.add(record)
+        db.session.commit()
+        return record.id
+
+    future = write_queue.submit(record)
+    if not wait:
+        return future
+    return future.result(timeout=WRITE_QUEUE_RESULT_TIMEOUT)